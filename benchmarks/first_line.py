@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+"""
+First line parser benchmark.
+
+Compares the built-in split based first line parsers of the request and
+response readers with the generic first_line_re based parser on typical and
+pathological (very long URL) inputs.
+
+Usage: python benchmarks/first_line.py [--number N]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from protocolparser.http import HttpRequestReader, HttpResponseReader  # noqa: E402
+from protocolparser.protocol import HttpLikeMessageReader  # noqa: E402
+from protocolparser.rtsp import RtspRequestReader  # noqa: E402
+
+CASES = [
+    ("request", HttpRequestReader, b"GET /index.html HTTP/1.1"),
+    ("response", HttpResponseReader, b"HTTP/1.1 200 OK"),
+    ("rtsp", RtspRequestReader, b"DESCRIBE rtsp://10.0.0.1:554/stream1 RTSP/1.0"),
+    ("long-url", HttpRequestReader, b"GET /" + b"a" * 8000 + b" HTTP/1.1"),
+    ("query", HttpRequestReader, b"GET /snapshot.cgi?" + b"&".join(b"p%d=v%d" % (i, i) for i in range(200))
+     + b" HTTP/1.1"),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--number', type=int, default=100000, help='number of parsed lines per case')
+    args = parser.parse_args()
+
+    print("%-10s %8s %14s %14s %8s" % ("case", "length", "regex [ns]", "split [ns]", "speedup"))
+    for name, cls, line in CASES:
+        reader = cls()
+        regex = min(timeit.repeat(lambda: HttpLikeMessageReader.first_line_received(reader, line),
+                                  number=args.number, repeat=3))
+        split = min(timeit.repeat(lambda: reader.first_line_received(line), number=args.number, repeat=3))
+        print("%-10s %8d %14.1f %14.1f %8.2f" % (name, len(line), regex * 1e9 / args.number,
+                                                 split * 1e9 / args.number, regex / split))
+
+
+if __name__ == '__main__':
+    main()
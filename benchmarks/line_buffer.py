@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Line buffer microbenchmark covering the worst cases of the line scanner.
+
+* byte: a header block with a long header line received one byte at a time
+* lines: hundreds of short header lines received in a single packet
+* segments: a long line received in small TCP segments
+
+Every case is run with increasing input size. The time per byte should stay
+roughly constant as the size grows.
+
+Usage: python benchmarks/line_buffer.py [--repeat N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from protocolparser.protocol import LineReader  # noqa: E402
+
+
+class Reader(LineReader):
+
+    def __init__(self):
+        super().__init__(buffer_limit=1 << 20)
+        self.lines = 0
+
+    def line_received(self, line):
+        self.lines += 1
+
+
+def byte_case(size):
+    data = b'Cookie: ' + b'c' * (size // 2) + b'\r\n'
+    data += b''.join(b'X-Header-%d: value\r\n' % i for i in range(size // 40))
+    return [data[i:i + 1] for i in range(len(data))]
+
+
+def lines_case(size):
+    return [b''.join(b'H%d: v\r\n' % i for i in range(size // 8))]
+
+
+def segments_case(size):
+    data = b'x' * size + b'\r\n'
+    return [data[i:i + 16] for i in range(0, len(data), 16)]
+
+
+CASES = [
+    ("byte", byte_case),
+    ("lines", lines_case),
+    ("segments", segments_case),
+]
+
+
+def run(chunks, repeat):
+    best = None
+    for _ in range(repeat):
+        reader = Reader()
+        start = time.perf_counter()
+        for chunk in chunks:
+            reader.data_received(chunk)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs (the best one is reported)')
+    args = parser.parse_args()
+
+    print("%-10s %10s %12s %12s" % ("case", "bytes", "total [ms]", "ns/byte"))
+    for name, case in CASES:
+        for size in (4096, 16384, 65536):
+            chunks = case(size)
+            total = sum(len(c) for c in chunks)
+            elapsed = run(chunks, args.repeat)
+            print("%-10s %10d %12.2f %12.1f" % (name, total, elapsed * 1e3, elapsed * 1e9 / total))
+
+
+if __name__ == '__main__':
+    main()
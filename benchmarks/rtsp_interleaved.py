@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""
+RTSP interleaved frame benchmark.
+
+The benchmark feeds 64 KiB reads of interleaved RTP packets (with an RTSP
+response every 1000 packets) into RtspResponseReader and reports the packet
+rate in the default and in the zero-copy mode.
+
+Usage: python benchmarks/rtsp_interleaved.py [--packets N] [--size BYTES]
+"""
+
+import argparse
+import os
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from protocolparser.rtsp import RtspResponseReader  # noqa: E402
+
+
+class Reader(RtspResponseReader):
+
+    def __init__(self, zero_copy):
+        super().__init__(zero_copy=zero_copy)
+        self.packets = 0
+
+    def interleaved_data_received(self, channel, data):
+        self.packets += 1
+
+
+def make_stream(packets, size):
+    frame = b'$\x00' + struct.pack('>H', size) + b'p' * size
+    response = (b'RTSP/1.0 200 OK\r\n'
+                b'CSeq: 1\r\n'
+                b'\r\n')
+    chunks = []
+    for i in range(0, packets, 1000):
+        chunks.append(frame * min(1000, packets - i))
+        chunks.append(response)
+    return b''.join(chunks)
+
+
+def run(zero_copy, stream, read_size):
+    reader = Reader(zero_copy)
+    start = time.perf_counter()
+    for i in range(0, len(stream), read_size):
+        reader.data_received(stream[i:i + read_size])
+    elapsed = time.perf_counter() - start
+    return reader.packets, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--packets', type=int, default=200000, help='number of packets')
+    parser.add_argument('--size', type=int, default=1400, help='packet size')
+    args = parser.parse_args()
+
+    stream = make_stream(args.packets, args.size)
+
+    print("%-8s %12s %14s %10s" % ("mode", "packets", "packets/s", "MB/s"))
+    for zero_copy in (False, True):
+        packets, elapsed = run(zero_copy, stream, 65536)
+        mode = "view" if zero_copy else "copy"
+        print("%-8s %12d %14.0f %10.1f" % (mode, packets, packets / elapsed, len(stream) / elapsed / 1e6))
+
+
+if __name__ == '__main__':
+    main()
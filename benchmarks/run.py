@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+"""
+Benchmark suite for the parser hot paths.
+
+Every scenario feeds a prepared list of reads into one of the reader classes
+and reports:
+
+* messages_per_sec: completed messages per second (the best of all repeats)
+* mb_per_sec: processed input megabytes per second (the best of all repeats)
+* peak_bytes_per_read: the highest amount of memory allocated at once (as seen
+  by tracemalloc) while processing a single read, averaged over the reads.
+  CPython does not provide a cumulative allocation counter, so this is the
+  allocation metric used. It mostly reflects copies of the received data.
+
+Usage:
+
+    python benchmarks/run.py --output results.json
+    python benchmarks/run.py --compare results.json [--threshold 0.1]
+
+In the compare mode, the results are compared with a previous JSON output and
+the exit code is 1 if the throughput of any scenario dropped by more than the
+threshold (or if its allocations grew by more than the threshold).
+"""
+
+import argparse
+import json
+import os
+import platform
+import struct
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from protocolparser.http import HttpRequestReader, HttpResponseReader  # noqa: E402
+from protocolparser.rtsp import RtspRequestReader, RtspResponseReader  # noqa: E402
+
+
+class CountingMixin:
+    """
+    Reader mixin counting completed messages.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.messages = 0
+        self.errors = 0
+
+    def message_end_received(self):
+        self.messages += 1
+
+    def parse_error(self, msg):
+        self.errors += 1
+
+    def internal_error(self, msg):
+        self.errors += 1
+
+
+def counting(cls):
+    return type(cls.__name__, (CountingMixin, cls), {})
+
+
+def split(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def http_request(url=b"/index.html", headers=4):
+    fields = [b"Host: camera.example.com", b"User-Agent: bench/1.0", b"Accept: */*",
+              b"Connection: keep-alive"] + [b"X-Header-%d: value-%d" % (i, i) for i in range(headers)]
+    return b"GET " + url + b" HTTP/1.1\r\n" + b"\r\n".join(fields[:headers]) + b"\r\n\r\n"
+
+
+def http_response(body=b"", headers=4, chunked=False):
+    fields = [b"Server: bench/1.0", b"Content-Type: application/octet-stream", b"Connection: keep-alive"]
+    fields += [b"X-Header-%d: value-%d" % (i, i) for i in range(max(0, headers - 4))]
+    if chunked:
+        fields.append(b"Transfer-Encoding: chunked")
+    else:
+        fields.append(b"Content-Length: %d" % len(body))
+    return b"HTTP/1.1 200 OK\r\n" + b"\r\n".join(fields) + b"\r\n\r\n" + body
+
+
+def chunked_body(chunks, size):
+    chunk = b"%x\r\n" % size + b"c" * size + b"\r\n"
+    return chunk * chunks + b"0\r\n\r\n"
+
+
+def rtsp_request_session():
+    url = b"rtsp://10.0.0.1:554/stream1"
+    requests = [
+        b"OPTIONS " + url + b" RTSP/1.0\r\nCSeq: 1\r\nUser-Agent: bench\r\n\r\n",
+        b"DESCRIBE " + url + b" RTSP/1.0\r\nCSeq: 2\r\nAccept: application/sdp\r\n\r\n",
+        b"SETUP " + url + b"/track1 RTSP/1.0\r\nCSeq: 3\r\nTransport: RTP/AVP/TCP;unicast;interleaved=0-1\r\n\r\n",
+        b"PLAY " + url + b" RTSP/1.0\r\nCSeq: 4\r\nSession: 12345678\r\nRange: npt=0.000-\r\n\r\n",
+    ]
+    keepalive = b"GET_PARAMETER " + url + b" RTSP/1.0\r\nCSeq: 5\r\nSession: 12345678\r\n\r\n"
+    return requests + [keepalive] * 16
+
+
+def rtsp_response_session(packets):
+    sdp = (b"v=0\r\no=- 0 0 IN IP4 10.0.0.1\r\ns=stream\r\nt=0 0\r\n"
+           b"m=video 0 RTP/AVP 96\r\na=rtpmap:96 H264/90000\r\na=control:track1\r\n")
+    responses = [
+        b"RTSP/1.0 200 OK\r\nCSeq: 1\r\nPublic: OPTIONS, DESCRIBE, SETUP, PLAY, TEARDOWN\r\n\r\n",
+        b"RTSP/1.0 200 OK\r\nCSeq: 2\r\nContent-Type: application/sdp\r\nContent-Length: %d\r\n\r\n" % len(sdp)
+        + sdp,
+        b"RTSP/1.0 200 OK\r\nCSeq: 3\r\nSession: 12345678\r\nTransport: RTP/AVP/TCP;interleaved=0-1\r\n\r\n",
+        b"RTSP/1.0 200 OK\r\nCSeq: 4\r\nSession: 12345678\r\n\r\n",
+    ]
+    frame = b"$\x00" + struct.pack(">H", 1200) + b"p" * 1200
+    return b"".join(responses) + frame * packets
+
+
+def scenarios():
+    """
+    Get list of (name, reader class, list of reads, number of messages) tuples.
+    """
+    request = http_request()
+    response_50 = http_response(b"x" * 128, headers=50)
+    large = http_response(b"x" * (1 << 20))
+    chunked = http_response(chunked_body(1000, 200), chunked=True)
+    rtsp_requests = b"".join(rtsp_request_session())
+    rtsp_responses = rtsp_response_session(2000)
+    keepalive = b"RTSP/1.0 200 OK\r\nCSeq: 5\r\nSession: 12345678\r\n\r\n"
+
+    return [
+        ("http-request-small", HttpRequestReader, [request] * 20000, 20000),
+        ("http-response-50-headers", HttpResponseReader, [response_50] * 5000, 5000),
+        ("http-request-pipelined", HttpRequestReader, split(request * 20000, 65536), 20000),
+        ("http-request-fragmented", HttpRequestReader, split(request * 50, 1), 50),
+        ("http-response-large-body", HttpResponseReader, split(large * 20, 65536), 20),
+        ("http-response-chunked", HttpResponseReader, split(chunked * 20, 65536), 20),
+        ("rtsp-request-session", RtspRequestReader, split(rtsp_requests * 500, 1500), 10000),
+        ("rtsp-response-session", RtspResponseReader, split(rtsp_responses * 10, 65536), 40),
+        ("rtsp-response-pipelined", RtspResponseReader, split(keepalive * 20000, 65536), 20000),
+    ]
+
+
+def measure_throughput(cls, chunks, messages, repeat):
+    size = sum(len(c) for c in chunks)
+    best = None
+    for _ in range(repeat):
+        reader = cls()
+        start = time.perf_counter()
+        for chunk in chunks:
+            reader.data_received(chunk)
+        elapsed = time.perf_counter() - start
+        if reader.messages != messages or reader.errors:
+            raise RuntimeError("%s: %d messages, %d errors" % (cls.__name__, reader.messages, reader.errors))
+        if best is None or elapsed < best:
+            best = elapsed
+    return messages / best, size / best / 1e6
+
+
+def measure_allocations(cls, chunks, limit=2000):
+    """
+    Get average peak allocation per read (measured on at most `limit` reads).
+    """
+    reader = cls()
+    peaks = []
+    tracemalloc.start()
+    try:
+        for chunk in chunks[:limit]:
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            reader.data_received(chunk)
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - current)
+    finally:
+        tracemalloc.stop()
+    return sum(peaks) / len(peaks)
+
+
+def run(names=None, repeat=5):
+    results = {}
+    for name, cls, chunks, messages in scenarios():
+        if names and not any(n in name for n in names):
+            continue
+        cls = counting(cls)
+        mps, mbps = measure_throughput(cls, chunks, messages, repeat)
+        peak = measure_allocations(cls, chunks)
+        results[name] = {
+            "reader": cls.__name__,
+            "messages_per_sec": round(mps, 1),
+            "mb_per_sec": round(mbps, 3),
+            "peak_bytes_per_read": round(peak, 1),
+        }
+        print("%-26s %14.0f msg/s %10.1f MB/s %12.0f B/read" % (name, mps, mbps, peak), file=sys.stderr)
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold):
+    """
+    Print comparison of given results and return number of regressions.
+    """
+    regressions = 0
+    print("%-26s %12s %12s %12s" % ("scenario", "msg/s", "MB/s", "B/read"))
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print("%-26s %12s" % (name, "new"))
+            continue
+
+        changes = []
+        for key in ("messages_per_sec", "mb_per_sec", "peak_bytes_per_read"):
+            old = base[key]
+            changes.append((result[key] - old) / old if old else 0.0)
+
+        regressed = changes[0] < -threshold or changes[1] < -threshold or changes[2] > threshold
+        regressions += regressed
+        flag = "  REGRESSION" if regressed else ""
+        mps, mbps, peak = (change * 100 for change in changes)
+        print("%-26s %+11.1f%% %+11.1f%% %+11.1f%%%s" % (name, mps, mbps, peak, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--output', help='write the results into a given JSON file')
+    parser.add_argument('--compare', help='compare the results with a given JSON file')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative regression threshold (default 0.1)')
+    parser.add_argument('--repeat', type=int, default=5, help='number of runs per scenario (default 5)')
+    parser.add_argument('scenario', nargs='*', help='run only scenarios containing any of the given names')
+    args = parser.parse_args()
+
+    results = run(args.scenario, args.repeat)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+"""
+Multi-process server load benchmark.
+
+Runs MultiProcessServer with a minimal HTTP or RTSP responder on loopback
+and drives it with client processes sending pipelined requests over many
+connections. The request throughput is reported for a growing number of
+worker processes.
+
+Usage: python benchmarks/serve.py [--protocol http|rtsp] [--workers 1,2,4] [--clients N] [--duration S]
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from protocolparser.http import HttpRequestReader, HttpResponseReader  # noqa: E402
+from protocolparser.rtsp import RtspRequestReader, RtspResponseReader  # noqa: E402
+from protocolparser.serve import MultiProcessServer  # noqa: E402
+
+
+class HttpResponder(HttpRequestReader):
+
+    def connection_made(self, transport):
+        super().connection_made(transport)
+        self.transport = transport
+
+    def message_end_received(self):
+        if not self.transport.is_closing():
+            self.transport.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+
+
+class RtspResponder(RtspRequestReader):
+
+    def connection_made(self, transport):
+        super().connection_made(transport)
+        self.transport = transport
+
+    def message_end_received(self):
+        if not self.transport.is_closing():
+            cseq = self.get_cseq() or 0
+            self.transport.write(b"RTSP/1.0 200 OK\r\nCSeq: %d\r\nSession: 12345678\r\n\r\n" % cseq)
+
+
+PROTOCOLS = {
+    "http": (HttpResponder, HttpResponseReader, b"GET /index.html HTTP/1.1\r\nHost: bench\r\n\r\n"),
+    "rtsp": (RtspResponder, RtspResponseReader,
+             b"GET_PARAMETER rtsp://bench/stream RTSP/1.0\r\nCSeq: 1\r\nSession: 12345678\r\n\r\n"),
+}
+
+
+class ClientMixin:
+    """
+    Reader mixin sending batches of pipelined requests, a new batch is sent
+    when all responses of the previous one are received.
+    """
+
+    def __init__(self, request, depth):
+        super().__init__()
+        self.batch = request * depth
+        self.depth = depth
+        self.pending = 0
+        self.responses = 0
+        self.transport = None
+        self.running = True
+
+    def connection_made(self, transport):
+        super().connection_made(transport)
+        self.transport = transport
+
+    def send(self):
+        for _ in range(self.depth):
+            self.push_request("GET")
+        self.pending = self.depth
+        self.transport.write(self.batch)
+
+    def message_end_received(self):
+        self.responses += 1
+        self.pending -= 1
+        if self.pending == 0 and self.running:
+            self.send()
+
+
+async def run_clients(protocol, port, connections, depth, duration):
+    loop = asyncio.get_running_loop()
+    _, reader_class, request = PROTOCOLS[protocol]
+    client_class = type(reader_class.__name__, (ClientMixin, reader_class), {})
+    clients = []
+    for _ in range(connections):
+        _, client = await loop.create_connection(lambda: client_class(request, depth), "127.0.0.1", port)
+        clients.append(client)
+    for client in clients:
+        client.send()
+    await asyncio.sleep(duration)
+    for client in clients:
+        client.running = False
+        client.transport.close()
+    return sum(client.responses for client in clients)
+
+
+def client_main(args):
+    return asyncio.run(run_clients(*args))
+
+
+def measure(protocol, workers, clients, connections, depth, duration):
+    server = MultiProcessServer(PROTOCOLS[protocol][0], workers=workers, drain_timeout=1)
+    server.start()
+    try:
+        tasks = [(protocol, server.get_port(), connections, depth, duration)] * clients
+        with multiprocessing.Pool(clients) as pool:
+            start = time.perf_counter()
+            responses = sum(pool.map(client_main, tasks))
+            elapsed = time.perf_counter() - start
+    finally:
+        server.stop()
+    return responses / elapsed, server.registry.collect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--protocol', choices=sorted(PROTOCOLS), default="http", help='protocol (default http)')
+    parser.add_argument('--workers', default="1,2,4", help='comma separated worker counts (default 1,2,4)')
+    parser.add_argument('--clients', type=int, default=os.cpu_count(), help='number of client processes')
+    parser.add_argument('--connections', type=int, default=16, help='connections per client process')
+    parser.add_argument('--depth', type=int, default=16, help='pipelined requests per batch')
+    parser.add_argument('--duration', type=float, default=3.0, help='duration of every run in seconds')
+    args = parser.parse_args()
+
+    print("%8s %14s %14s %8s" % ("workers", "requests/s", "messages", "errors"))
+    for workers in [int(n) for n in args.workers.split(",")]:
+        rps, metrics = measure(args.protocol, workers, args.clients, args.connections, args.depth, args.duration)
+        total = metrics.get(PROTOCOLS[args.protocol][0].__name__)
+        messages = total.messages if total is not None else 0
+        errors = sum(total.parse_errors.values()) if total is not None else 0
+        print("%8d %14.0f %14d %8d" % (workers, rps, messages, errors))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+"""
+Compare the default and the zero-copy mode of the message readers.
+
+The benchmark feeds 64 KiB reads containing several pipelined HTTP responses
+with large bodies into HttpResponseReader and reports the number of body
+bytes copied by the reader (per received byte) and the throughput. A copy is
+counted for every bytes object passed to raw_data_received() and for every
+body_data_received() slice of it.
+
+To check that the default (copying) mode did not get slower, the copy mode
+throughput can be compared with a checkout of a revision before the zero-copy
+mode was added, e.g.:
+
+    git worktree add /tmp/baseline <revision>
+    python benchmarks/zero_copy.py --baseline /tmp/baseline
+
+The baseline is measured by this script running in a subprocess with the
+protocolparser package imported from the given tree.
+
+Usage: python benchmarks/zero_copy.py [--reads N] [--baseline DIR]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# the tree of the measured protocolparser package (set for the baseline runs)
+TREE = os.environ.get("BENCHMARK_TREE") or os.path.join(os.path.dirname(__file__), os.pardir)
+
+sys.path.insert(0, TREE)
+
+from protocolparser.http import HttpResponseReader  # noqa: E402
+
+
+class Reader(HttpResponseReader):
+
+    def __init__(self, zero_copy, count=False):
+        # the baseline readers have no zero_copy option
+        if zero_copy:
+            super().__init__(zero_copy=True)
+        else:
+            super().__init__()
+        self.count = count
+        self.copied = 0
+        self.raw = None
+        self.body = 0
+
+    def raw_data_received(self, data):
+        if self.count and isinstance(data, bytes):
+            self.copied += len(data)
+            self.raw = data
+        return super().raw_data_received(data)
+
+    def body_data_received(self, data):
+        if self.count and isinstance(data, bytes) and data is not self.raw:
+            self.copied += len(data)
+        self.body += len(data)
+
+
+def make_stream(body_size, messages):
+    message = (b'HTTP/1.1 200 OK\r\n'
+               b'Content-Type: image/jpeg\r\n'
+               b'Content-Length: ' + str(body_size).encode() + b'\r\n'
+               b'\r\n') + b'x' * body_size
+    return message * messages
+
+
+def feed(reader, chunks, reads):
+    received = 0
+    for i in range(reads):
+        chunk = chunks[i % len(chunks)]
+        reader.data_received(chunk)
+        received += len(chunk)
+    return received
+
+
+def run(zero_copy, stream, read_size, reads):
+    chunks = [stream[i:i + read_size] for i in range(0, len(stream), read_size)]
+
+    reader = Reader(zero_copy, count=True)
+    received = feed(reader, chunks, reads)
+    copied = reader.copied / received
+
+    start = time.perf_counter()
+    received = feed(Reader(zero_copy), chunks, reads)
+    elapsed = time.perf_counter() - start
+
+    return copied, received / elapsed / 1e6
+
+
+def run_baseline(tree, reads):
+    """
+    Measure the copy mode of a given tree in a subprocess.
+
+    :returns: body size -> (copied per byte, MB/s)
+    """
+    env = dict(os.environ, BENCHMARK_TREE=os.path.abspath(tree))
+    output = subprocess.check_output([sys.executable, __file__, '--reads', str(reads), '--json'], env=env)
+    return {int(size): tuple(result) for size, result in json.loads(output).items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--reads', type=int, default=2000, help='number of 64 KiB reads')
+    parser.add_argument('--baseline', help='checkout of a revision to compare the copy mode with')
+    parser.add_argument('--json', action='store_true', help='print the copy mode results as JSON only')
+    args = parser.parse_args()
+
+    read_size = 65536
+    body_sizes = (1024, 16384, 262144)
+
+    def streams():
+        for body_size in body_sizes:
+            yield body_size, make_stream(body_size, max(4, 4 * read_size // body_size))
+
+    if args.json:
+        results = {size: run(False, stream, read_size, args.reads) for size, stream in streams()}
+        print(json.dumps(results))
+        return
+
+    baseline = run_baseline(args.baseline, args.reads) if args.baseline else {}
+
+    print("%-10s %-8s %14s %10s" % ("body", "mode", "copied/byte", "MB/s"))
+    for body_size, stream in streams():
+        if body_size in baseline:
+            copied, mbps = baseline[body_size]
+            print("%-10d %-8s %14.3f %10.1f" % (body_size, "baseline", copied, mbps))
+        for zero_copy in (False, True):
+            copied, mbps = run(zero_copy, stream, read_size, args.reads)
+            mode = "view" if zero_copy else "copy"
+            print("%-10d %-8s %14.3f %10.1f" % (body_size, mode, copied, mbps))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+Incremental decoding of content codings (the Content-Encoding header field).
+"""
+
+import zlib
+
+# wbits values of the supported content codings
+CODINGS = {
+    b"gzip": 16 + zlib.MAX_WBITS,
+    b"x-gzip": 16 + zlib.MAX_WBITS,
+    b"deflate": zlib.MAX_WBITS,
+}
+
+
+def parse_content_encoding(value):
+    """
+    Parse a given Content-Encoding value.
+
+    :param value: value of the Content-Encoding header field
+    :type value: bytes
+    :returns: list of lowercase content codings in the order they have been applied (without identity)
+    """
+    codings = (coding.strip().lower() for coding in value.split(b","))
+    return [coding for coding in codings if coding and coding != b"identity"]
+
+
+class DecodingError(Exception):
+    pass
+
+
+class ContentDecoder:
+    """
+    Streaming decoder of stacked content codings. The decoded data are
+    produced in pieces of a bounded size, so a small piece of encoded data
+    never expands into a large buffer.
+    """
+
+    def __init__(self, codings, callback, max_size=None, window=65536):
+        """
+        Create a new decoder. ValueError is raised if a coding is not
+        supported.
+
+        :param codings: content codings in the order they have been applied (see parse_content_encoding())
+        :type codings: list of bytes
+        :param callback: callback called with every piece of decoded data (bytes)
+        :type callback: callable
+        :param max_size: maximum size of the decoded data (None means unlimited)
+        :type max_size: int
+        :param window: maximum size of a single piece of decoded data
+        :type window: int
+        """
+        for coding in codings:
+            if coding not in CODINGS:
+                raise ValueError("unsupported content encoding: %s" % coding.decode('ascii', 'replace'))
+
+        self.__codings = list(reversed(codings))
+        self.__decompressors = [zlib.decompressobj(CODINGS[coding]) for coding in self.__codings]
+        # deflate stages which have not validated the zlib header yet (deflate may be sent without the zlib
+        # wrapper) and the data they have been given so far (replayed to a raw deflate decompressor)
+        self.__fresh = [coding == b"deflate" for coding in self.__codings]
+        self.__heads = [b""] * len(self.__codings)
+        self.__callback = callback
+        self.__max_size = max_size
+        self.__window = window
+        self.__size = 0
+        self.__fed = False
+
+    def get_decoded_size(self):
+        """
+        Get the amount of decoded data produced so far.
+        """
+        return self.__size
+
+    def feed(self, data):
+        """
+        Decode a given piece of encoded data.
+
+        :param data: encoded data
+        :type data: bytes or memoryview
+        :returns: error message or None
+        """
+        if not data:
+            return None
+        self.__fed = True
+        try:
+            self.__decode(0, data)
+        except DecodingError as ex:
+            return str(ex)
+        except zlib.error:
+            return 'unable to decode content'
+        return None
+
+    def flush(self):
+        """
+        Signal end of the encoded data and decode everything that is left.
+
+        :returns: error message or None
+        """
+        if not self.__fed:
+            return None
+        try:
+            for level, decompressor in enumerate(self.__decompressors):
+                data = decompressor.flush()
+                if data:
+                    self.__decode(level + 1, data)
+                if not decompressor.eof:
+                    return 'incomplete encoded content'
+        except DecodingError as ex:
+            return str(ex)
+        except zlib.error:
+            return 'unable to decode content'
+        return None
+
+    def __decode(self, level, data):
+        """
+        Pass given data through a given decoding stage and all the following
+        ones.
+        """
+        if level == len(self.__decompressors):
+            self.__size += len(data)
+            if self.__max_size is not None and self.__size > self.__max_size:
+                raise DecodingError('max decoded body size exceeded')
+            self.__callback(data)
+            return
+
+        window = self.__window
+        decompressor = self.__decompressors[level]
+
+        if decompressor.eof:
+            if self.__codings[level] == b"deflate":
+                return
+            decompressor = self.__decompressors[level] = zlib.decompressobj(CODINGS[self.__codings[level]])
+
+        while True:
+            if self.__fresh[level]:
+                head = self.__heads[level] + bytes(data)
+                try:
+                    out = decompressor.decompress(data, window)
+                except zlib.error:
+                    # raw deflate stream without the zlib header, all data received so far are replayed
+                    decompressor = self.__decompressors[level] = zlib.decompressobj(-zlib.MAX_WBITS)
+                    out = decompressor.decompress(head, window)
+                    head = b""
+                # the zlib header (2 bytes) has been validated or the data are raw deflate
+                if len(head) >= 2 or not head:
+                    self.__fresh[level] = False
+                    head = b""
+                self.__heads[level] = head
+            else:
+                out = decompressor.decompress(data, window)
+
+            if out:
+                self.__decode(level + 1, out)
+
+            if decompressor.eof:
+                data = decompressor.unused_data
+                if not data or self.__codings[level] == b"deflate":
+                    # data after the end of the stream are ignored
+                    return
+                # next member of a multi-member gzip stream
+                decompressor = self.__decompressors[level] = zlib.decompressobj(CODINGS[self.__codings[level]])
+                continue
+
+            data = decompressor.unconsumed_tail
+            if not data and len(out) < window:
+                return
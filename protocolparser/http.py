@@ -1,15 +1,16 @@
 import re
 
-from .protocol import HttpLikeRequestReader, HttpLikeResponseReader
+from .protocol import BufferedLineReader, HttpLikeRequestReader, HttpLikeResponseReader
 
 
 class HttpMixin:
 
+    __slots__ = ()
+
     def is_chunked(self):
         if self.version == "1.1":
-            tencoding = self.get_header(b"transfer-encoding")
+            tencoding = self.get_transfer_encoding()
             if tencoding:
-                tencoding = tencoding.value.lower()
                 return tencoding != b"identity"
         return False
 
@@ -27,13 +28,27 @@ class HttpRequestReader(HttpMixin, HttpLikeRequestReader):
 
     header_received(self): This method is called when all HTTP header fields of the current message have been received.
     body_data_received(self, data): This method is called whenever a new piece of body data is received.
+    decoded_body_data_received(self, data): This method is called for every piece of decoded body data.
     message_end_received(self): This method is called when message end is reached.
+    tunnel_data_received(self, data): This method is called for all data received after a protocol switch.
     parse_error(self, msg): This method is called when parse error occurred.
     internal_error(self, msg): This method is called when internal server error occurred.
     close_connection(self): This method is called whenever the underlying connection should be closed.
     """
 
+    __slots__ = ()
+
     first_line_re = re.compile(r"^(?P<method>\S+) (?P<url>\S*) HTTP/(?P<version>\d\.\d)$")
+    first_line_protocol = b"HTTP"
+
+    def is_upgrade_requested(self):
+        """
+        Check if the current request asks for a protocol switch (CONNECT or
+        Upgrade). The server confirming the switch should call start_tunnel().
+        """
+        if self.method == "CONNECT":
+            return True
+        return self.get_header(b"upgrade") is not None and b"upgrade" in (self.get_connection() or b"")
 
 
 class HttpResponseReader(HttpMixin, HttpLikeResponseReader):
@@ -44,10 +59,42 @@ class HttpResponseReader(HttpMixin, HttpLikeResponseReader):
 
     header_received(self): This method is called when all HTTP header fields of the current message have been received.
     body_data_received(self, data): This method is called whenever a new piece of body data is received.
+    decoded_body_data_received(self, data): This method is called for every piece of decoded body data.
     message_end_received(self): This method is called when message end is reached.
+    tunnel_data_received(self, data): This method is called for all data received after a protocol switch.
     parse_error(self, msg): This method is called when parse error occurred.
     internal_error(self, msg): This method is called when internal server error occurred.
     close_connection(self): This method is called whenever the underlying connection should be closed.
     """
 
+    __slots__ = ()
+
     first_line_re = re.compile(r"^HTTP/(?P<version>\d\.\d) (?P<status_code>\d{3}) (?P<reason_phrase>.*)$")
+    first_line_protocol = b"HTTP"
+
+    def switches_protocol(self):
+        # 101 Switching Protocols or a successful CONNECT
+        status_code = self.status_code
+        if status_code == 101:
+            return True
+        return status_code is not None and 200 <= status_code < 300 and self.get_request_method() == "CONNECT"
+
+
+class BufferedHttpRequestReader(BufferedLineReader, HttpRequestReader):
+    """
+    HTTP request reader protocol based on asyncio.BufferedProtocol. The body
+    data are passed to body_data_received() as memoryviews valid only during
+    the call.
+    """
+
+    __slots__ = ()
+
+
+class BufferedHttpResponseReader(BufferedLineReader, HttpResponseReader):
+    """
+    HTTP response reader protocol based on asyncio.BufferedProtocol. The body
+    data are passed to body_data_received() as memoryviews valid only during
+    the call.
+    """
+
+    __slots__ = ()
@@ -0,0 +1,415 @@
+"""
+Optional parser instrumentation.
+
+The readers are not instrumented by default. An instrumented reader class is
+created by mixing the MetricsMixin into a given reader class (or simply by
+calling instrumented()), so readers without metrics pay nothing:
+
+    registry = MetricsRegistry()
+    server = await loop.create_server(instrumented(MyRequestReader, registry), host, port)
+    await start_metrics_server(registry, port=9100)
+
+Every instrumented reader has its own counters (reader.metrics) and the
+registry aggregates them per reader class. Header and body phase durations
+are measured only for every n-th message (see MetricsRegistry). The registry
+can be replaced by a subclass forwarding the values to another metrics
+system (override collect() and observe()).
+"""
+
+import asyncio
+import bisect
+import time
+import weakref
+
+from .http import HttpRequestReader
+
+# default histogram buckets (in seconds)
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                   5.0, 10.0)
+
+# counter name, counter description
+COUNTERS = (
+    ('bytes', "Number of bytes passed to the readers."),
+    ('messages', "Number of completed messages."),
+    ('header_lines', "Number of received header lines (first lines, header fields and continuation lines)."),
+    ('body_bytes', "Number of received body bytes."),
+    ('line_length_exceeded', "Number of lines exceeding the line length limit."),
+    ('raw_mode_switches', "Number of switches to the raw (body) mode."),
+)
+
+# histogram name, histogram description
+HISTOGRAMS = (
+    ('header_phase_seconds', "Time between the first line and the end of the header (sampled)."),
+    ('body_phase_seconds', "Time between the end of the header and the end of the message (sampled)."),
+)
+
+
+class ReaderMetrics:
+    """
+    Counters of a single reader (or aggregated counters of several readers).
+    """
+
+    __slots__ = ('bytes', 'messages', 'header_lines', 'body_bytes', 'line_length_exceeded', 'raw_mode_switches',
+                 'parse_errors')
+
+    def __init__(self):
+        self.bytes = 0
+        self.messages = 0
+        self.header_lines = 0
+        self.body_bytes = 0
+        self.line_length_exceeded = 0
+        self.raw_mode_switches = 0
+        # error message -> count
+        self.parse_errors = {}
+
+    def add(self, other):
+        """
+        Add counters of a given metrics object to this one.
+
+        :param other: reader metrics
+        :type other: ReaderMetrics
+        """
+        for name, _ in COUNTERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for reason, count in other.parse_errors.items():
+            self.parse_errors[reason] = self.parse_errors.get(reason, 0) + count
+
+
+class Histogram:
+    """
+    Histogram with fixed buckets.
+    """
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """
+        Add a given value.
+
+        :param value: value
+        :type value: float
+        """
+        idx = bisect.bisect_left(self.buckets, value)
+        if idx < len(self.counts):
+            self.counts[idx] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Registry aggregating metrics of instrumented readers.
+    """
+
+    def __init__(self, sample_interval=100, buckets=DEFAULT_BUCKETS):
+        """
+        Create a new registry.
+
+        :param sample_interval: measure phase durations of every n-th message (0 disables the timing)
+        :type sample_interval: int
+        :param buckets: histogram bucket upper bounds in seconds
+        :type buckets: tuple
+        """
+        self.sample_interval = sample_interval
+        self.__buckets = tuple(sorted(buckets))
+        # reader name -> set of metrics of live readers
+        self.__live = {}
+        # reader name -> aggregated metrics of already released readers
+        self.__released = {}
+        # (histogram name, reader name) -> Histogram
+        self.__histograms = {}
+
+    def register(self, reader):
+        """
+        Create metrics for a given reader. The metrics are aggregated under
+        the reader class name.
+
+        :param reader: reader
+        :returns: ReaderMetrics
+        """
+        name = type(reader).__name__
+        metrics = ReaderMetrics()
+        self.__live.setdefault(name, set()).add(metrics)
+        weakref.finalize(reader, self.__release, name, metrics)
+        return metrics
+
+    def __release(self, name, metrics):
+        """
+        Move metrics of a released reader to the aggregated counters.
+        """
+        self.__live[name].discard(metrics)
+        self.__released.setdefault(name, ReaderMetrics()).add(metrics)
+
+    def observe(self, name, reader_name, value):
+        """
+        Add a value to a given histogram.
+
+        :param name: histogram name (e.g. header_phase_seconds)
+        :type name: str
+        :param reader_name: reader class name
+        :type reader_name: str
+        :param value: observed value
+        :type value: float
+        """
+        key = (name, reader_name)
+        histogram = self.__histograms.get(key)
+        if histogram is None:
+            histogram = self.__histograms[key] = Histogram(self.__buckets)
+        histogram.observe(value)
+
+    def collect(self):
+        """
+        Get aggregated counters.
+
+        :returns: dict of reader class name -> ReaderMetrics
+        """
+        result = {}
+        for name in self.__live.keys() | self.__released.keys():
+            total = ReaderMetrics()
+            if name in self.__released:
+                total.add(self.__released[name])
+            for metrics in self.__live.get(name, ()):
+                total.add(metrics)
+            result[name] = total
+        return result
+
+    def get_histograms(self):
+        """
+        Get all histograms.
+
+        :returns: dict of (histogram name, reader class name) -> Histogram
+        """
+        return dict(self.__histograms)
+
+    def export_prometheus(self, prefix="protocolparser"):
+        """
+        Export all metrics in the Prometheus text format.
+
+        :param prefix: metric name prefix
+        :type prefix: str
+        :returns: str
+        """
+        totals = sorted(self.collect().items())
+        histograms = self.get_histograms()
+        lines = []
+
+        for name, description in COUNTERS:
+            metric = "%s_%s_total" % (prefix, name)
+            lines.append("# HELP %s %s" % (metric, description))
+            lines.append("# TYPE %s counter" % metric)
+            for reader, metrics in totals:
+                lines.append('%s{reader="%s"} %d' % (metric, _escape(reader), getattr(metrics, name)))
+
+        metric = "%s_parse_errors_total" % prefix
+        lines.append("# HELP %s Number of parse errors by reason." % metric)
+        lines.append("# TYPE %s counter" % metric)
+        for reader, metrics in totals:
+            for reason, count in sorted(metrics.parse_errors.items()):
+                lines.append('%s{reader="%s",reason="%s"} %d' % (metric, _escape(reader), _escape(reason), count))
+
+        for name, description in HISTOGRAMS:
+            metric = "%s_%s" % (prefix, name)
+            lines.append("# HELP %s %s" % (metric, description))
+            lines.append("# TYPE %s histogram" % metric)
+            for (hname, reader), histogram in sorted(histograms.items()):
+                if hname != name:
+                    continue
+                reader = _escape(reader)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append('%s_bucket{reader="%s",le="%r"} %d' % (metric, reader, bound, cumulative))
+                lines.append('%s_bucket{reader="%s",le="+Inf"} %d' % (metric, reader, histogram.count))
+                lines.append('%s_sum{reader="%s"} %r' % (metric, reader, histogram.sum))
+                lines.append('%s_count{reader="%s"} %d' % (metric, reader, histogram.count))
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    """
+    Escape a given Prometheus label value.
+    """
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+# registry used by instrumented readers which do not specify any
+default_registry = MetricsRegistry()
+
+
+class MetricsMixin:
+    """
+    Reader mixin counting parsed data and measuring sampled header and body
+    phase durations. The counters are available as reader.metrics.
+    """
+
+    # registry used by the reader (None means the default_registry)
+    metrics_registry = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        registry = self.metrics_registry or default_registry
+
+        self.metrics = registry.register(self)
+
+        self.__registry = registry
+        self.__sample_countdown = 1
+        self.__header_start = None
+        self.__body_start = None
+
+    def data_received(self, data):
+        self.metrics.bytes += len(data)
+        super().data_received(data)
+
+    def set_raw_mode(self, raw):
+        if raw and not self.is_raw_mode():
+            self.metrics.raw_mode_switches += 1
+        super().set_raw_mode(raw)
+
+    def line_length_exceeded(self):
+        self.metrics.line_length_exceeded += 1
+        super().line_length_exceeded()
+
+    def first_line_received(self, line):
+        interval = self.__registry.sample_interval
+        if interval:
+            self.__sample_countdown -= 1
+            if self.__sample_countdown <= 0:
+                self.__sample_countdown = interval
+                self.__header_start = time.perf_counter()
+        super().first_line_received(line)
+
+    def header_received(self):
+        self.metrics.header_lines += self.get_header_line_count()
+        if self.__header_start is not None:
+            now = time.perf_counter()
+            self.__registry.observe('header_phase_seconds', type(self).__name__, now - self.__header_start)
+            self.__header_start = None
+            self.__body_start = now
+        super().header_received()
+
+    def body_data_received(self, data):
+        self.metrics.body_bytes += len(data)
+        super().body_data_received(data)
+
+    def message_end_received(self):
+        self.metrics.messages += 1
+        if self.__body_start is not None:
+            elapsed = time.perf_counter() - self.__body_start
+            self.__registry.observe('body_phase_seconds', type(self).__name__, elapsed)
+            self.__body_start = None
+        super().message_end_received()
+
+    def parse_error(self, msg):
+        errors = self.metrics.parse_errors
+        errors[msg] = errors.get(msg, 0) + 1
+        # a sampled message with an error is not measured
+        self.__header_start = None
+        self.__body_start = None
+        super().parse_error(msg)
+
+
+# instrumented classes created for the given (reader class, registry) pairs
+_instrumented_classes = {}
+
+
+def instrumented(reader_class, registry=None):
+    """
+    Get an instrumented version of a given reader class.
+
+    :param reader_class: reader class (e.g. HttpRequestReader or its subclass)
+    :type reader_class: type
+    :param registry: metrics registry (None means the default_registry)
+    :type registry: MetricsRegistry
+    :returns: reader class
+    """
+    key = (reader_class, registry)
+    cls = _instrumented_classes.get(key)
+    if cls is None:
+        cls = type(reader_class.__name__, (MetricsMixin, reader_class), {'metrics_registry': registry})
+        _instrumented_classes[key] = cls
+    return cls
+
+
+class MetricsExporter(HttpRequestReader):
+    """
+    Protocol serving metrics of a given registry in the Prometheus text
+    format (GET /metrics).
+    """
+
+    def __init__(self, registry=None, path="/metrics"):
+        """
+        Create a new exporter.
+
+        :param registry: metrics registry (None means the default_registry)
+        :type registry: MetricsRegistry
+        :param path: metrics URL path
+        :type path: str
+        """
+        super().__init__()
+
+        self.__registry = registry or default_registry
+        self.__path = path
+        self.__transport = None
+
+    def connection_made(self, transport):
+        super().connection_made(transport)
+        self.__transport = transport
+
+    def connection_lost(self, exc):
+        super().connection_lost(exc)
+        self.__transport = None
+
+    def message_end_received(self):
+        if self.method not in ("GET", "HEAD"):
+            self.__send_response(405, "Method Not Allowed", b"")
+        elif self.url.split("?", 1)[0] != self.__path:
+            self.__send_response(404, "Not Found", b"")
+        else:
+            body = self.__registry.export_prometheus().encode()
+            self.__send_response(200, "OK", body, b"text/plain; version=0.0.4; charset=utf-8")
+
+    def parse_error(self, msg):
+        self.__send_response(400, "Bad Request", b"")
+        self.close_connection()
+
+    def close_connection(self):
+        if self.__transport is not None:
+            self.__transport.close()
+
+    def __send_response(self, status_code, reason_phrase, body, content_type=b"text/plain"):
+        """
+        Send a given response.
+        """
+        if self.__transport is None:
+            return
+        header = b"HTTP/1.1 %d %s\r\nContent-Type: %s\r\nContent-Length: %d\r\n\r\n" % (
+            status_code, reason_phrase.encode(), content_type, len(body))
+        if getattr(self, 'method', None) == "HEAD":
+            body = b""
+        self.__transport.writelines((header, body))
+
+
+async def start_metrics_server(registry=None, host="127.0.0.1", port=9100, path="/metrics"):
+    """
+    Start a HTTP server exporting metrics of a given registry.
+
+    :param registry: metrics registry (None means the default_registry)
+    :type registry: MetricsRegistry
+    :param host: listening address
+    :type host: str
+    :param port: listening port
+    :type port: int
+    :param path: metrics URL path
+    :type path: str
+    :returns: asyncio.Server
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.create_server(lambda: MetricsExporter(registry, path), host, port)
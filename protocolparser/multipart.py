@@ -0,0 +1,321 @@
+"""
+Incremental decoder of multipart bodies (RFC 2046, section 5.1), e.g. MJPEG
+streams sent as multipart/x-mixed-replace responses:
+
+    class CameraReader(MultipartMixin, MyResponseReader):
+        pass
+
+where MyResponseReader is a HttpResponseReader subclass implementing
+part_received().
+
+Every part is passed to part_received() at once. A part received within a
+single piece of body data is passed as a memoryview of that data (i.e. it
+is not copied at all). Parts spanning several pieces are collected in a
+buffer which is never searched twice.
+"""
+
+import re
+
+from .protocol import HeaderFields
+
+# decoder states
+PREAMBLE = 0
+DELIMITER_LINE = 1
+HEADERS = 2
+BODY = 3
+EPILOGUE = 4
+
+HEADER_END_RE = re.compile(rb"\r\n\r\n")
+CRLF_RE = re.compile(rb"\r\n")
+BOUNDARY_RE = re.compile(rb';\s*boundary\s*=\s*(?:"([^"]+)"|([^\s;]+))', re.IGNORECASE)
+
+# maximum length of the transport padding after a delimiter
+MAX_PADDING = 1024
+
+
+def get_boundary(content_type):
+    """
+    Get boundary of a given multipart content type.
+
+    :param content_type: value of the Content-Type header field
+    :type content_type: bytes
+    :returns: bytes or None if the content type is not multipart
+    """
+    if not content_type[:10].lower() == b"multipart/":
+        return None
+    m = BOUNDARY_RE.search(content_type)
+    if m is None:
+        return None
+    return m.group(1) or m.group(2)
+
+
+class MultipartDecoder:
+    """
+    Incremental multipart body decoder.
+    """
+
+    def __init__(self, boundary, part_received, parse_error, max_header_size=8192, max_part_size=None):
+        """
+        Create a new decoder.
+
+        :param boundary: multipart boundary
+        :type boundary: bytes
+        :param part_received: callback called with part headers (HeaderFields) and payload (memoryview)
+        :type part_received: callable
+        :param parse_error: callback called with an error message
+        :type parse_error: callable
+        :param max_header_size: maximum size of part headers
+        :type max_header_size: int
+        :param max_part_size: maximum size of a part payload (None means unlimited)
+        :type max_part_size: int
+        """
+        self.__part_received = part_received
+        self.__parse_error = parse_error
+        self.__max_header_size = max_header_size
+        self.__max_part_size = max_part_size
+
+        self.__delimiter = b"\r\n--" + boundary
+        # some devices put the leading dashes into the boundary parameter,
+        # the actual delimiter is found in the preamble
+        candidates = [self.__delimiter]
+        if boundary.startswith(b"--"):
+            candidates.append(b"\r\n" + boundary)
+        self.__delimiter_re = re.compile(b"|".join(re.escape(c) for c in candidates))
+
+        self.__state = PREAMBLE
+        # the body is processed as if it started with CRLF, so that the first
+        # delimiter looks the same as the other ones
+        self.__buffer = bytearray(b"\r\n")
+        # position where the next search starts
+        self.__scan = 0
+        self.__part_headers = None
+        self.__part_length = None
+
+    def feed(self, data):
+        """
+        Process a given piece of the body.
+
+        :param data: body data
+        :type data: bytes or memoryview
+        """
+        buffer = self.__buffer
+        if buffer:
+            buffer += data
+            consumed = self.__process(buffer)
+            if consumed:
+                # payloads passed to part_received() may still reference the
+                # buffer, so the rest is moved to a new one
+                self.__buffer = bytearray(memoryview(buffer)[consumed:])
+        else:
+            consumed = self.__process(data)
+            if consumed < len(data):
+                self.__buffer = bytearray(data[consumed:])
+        self.__scan -= consumed
+
+    def close(self):
+        """
+        Signal end of the body.
+        """
+        if self.__state in (HEADERS, BODY):
+            self.__parse_error('incomplete multipart body')
+        self.__state = EPILOGUE
+        self.__buffer = bytearray()
+
+    def __process(self, data):
+        """
+        Process given data.
+
+        :returns: number of consumed bytes
+        """
+        view = memoryview(data)
+        end = len(data)
+        pos = 0
+
+        while pos < end:
+            state = self.__state
+
+            if state == PREAMBLE:
+                m = self.__delimiter_re.search(data, self.__scan)
+                if m is None:
+                    # the preamble is ignored
+                    pos = max(pos, end - len(self.__delimiter) + 1)
+                    self.__scan = pos
+                    return pos
+                self.__delimiter = m.group()
+                self.__delimiter_re = re.compile(re.escape(self.__delimiter))
+                pos = m.end()
+                self.__state = DELIMITER_LINE
+
+            elif state == DELIMITER_LINE:
+                if end - pos < 2:
+                    return pos
+                if data[pos:pos + 2] == b"--":
+                    self.__state = EPILOGUE
+                    return end
+                m = CRLF_RE.search(data, pos, pos + MAX_PADDING)
+                if m is None:
+                    if end - pos >= MAX_PADDING:
+                        return self.__error('invalid multipart delimiter', end)
+                    return pos
+                pos = m.end()
+                self.__scan = pos
+                self.__state = HEADERS
+
+            elif state == HEADERS:
+                if data[pos:pos + 2] == b"\r\n":
+                    headers = b""
+                    pos += 2
+                else:
+                    m = HEADER_END_RE.search(data, max(pos, self.__scan))
+                    if m is None:
+                        if end - pos > self.__max_header_size:
+                            return self.__error('max part header size exceeded', end)
+                        self.__scan = max(pos, end - 3)
+                        return pos
+                    headers = bytes(view[pos:m.start()])
+                    pos = m.end()
+                self.__part_headers_received(headers)
+                self.__scan = pos
+                if self.__part_length is not None:
+                    self.__scan += self.__part_length
+                self.__state = BODY
+
+            elif state == BODY:
+                idx = self.__find_delimiter(data, pos)
+                if self.__max_part_size is not None and max(idx, self.__scan) - pos > self.__max_part_size:
+                    return self.__error('max part size exceeded', end)
+                if idx < 0:
+                    return pos
+                self.__part_received(self.__part_headers, view[pos:idx])
+                pos = idx + len(self.__delimiter)
+                self.__part_headers = None
+                self.__state = DELIMITER_LINE
+
+            else:
+                return end
+
+        return pos
+
+    def __find_delimiter(self, data, start):
+        """
+        Find the delimiter ending a part which starts at a given position.
+        If the part length is known, the delimiter is expected right after
+        the payload. Every byte is searched only once.
+
+        :returns: delimiter position or -1 if it has not been received yet
+        """
+        end = len(data)
+        dlen = len(self.__delimiter)
+        scan = self.__scan
+
+        if self.__part_length is not None:
+            if scan + dlen > end:
+                return -1
+            if data[scan:scan + dlen] == self.__delimiter:
+                return scan
+            # the length is not correct, search for the delimiter
+            self.__part_length = None
+            scan = start
+
+        m = self.__delimiter_re.search(data, scan)
+        if m is None:
+            self.__scan = max(start, end - dlen + 1)
+            return -1
+        return m.start()
+
+    def __part_headers_received(self, block):
+        """
+        Parse given part headers.
+        """
+        headers = HeaderFields()
+        field = None
+        for line in block.split(b"\r\n") if block else ():
+            if field is not None and line[:1] in (b" ", b"\t"):
+                field.value += line.strip()
+                continue
+            name, sep, value = line.partition(b":")
+            if sep:
+                field = headers.append(name.strip(), value.strip())
+            else:
+                self.__parse_error('part header field line does not contain ":"')
+
+        self.__part_headers = headers
+        self.__part_length = None
+
+        field = headers.get(b"content-length")
+        if field is not None and field.value.isdigit():
+            self.__part_length = int(field.value)
+
+    def __error(self, msg, consumed):
+        """
+        Report a given error and ignore the rest of the body.
+        """
+        self.__parse_error(msg)
+        self.__state = EPILOGUE
+        return consumed
+
+
+class MultipartMixin:
+    """
+    Response reader mixin decoding multipart bodies. The boundary is taken
+    from the Content-Type header field. Bodies of other messages are passed
+    to body_data_received() as usual. (Note: The mixin must precede the class
+    implementing body_data_received() and message_end_received() in the MRO.)
+
+    The class implementing body_data_received() must also implement:
+
+    part_received(self, headers, payload): This method is called for every part
+        with its header fields (HeaderFields) and payload (memoryview). In the
+        zero-copy mode, the payload may be a view into the buffer passed to
+        data_received(). Such a view is valid only until the method returns,
+        use bytes(payload) to keep the data for later.
+    """
+
+    def __init__(self, *args, max_part_size=None, **kwargs):
+        """
+        Create a new reader. All positional and keyword arguments (except of
+        max_part_size) are passed to the next constructor in the MRO.
+
+        :param max_part_size: maximum size of a part payload (None means unlimited)
+        :type max_part_size: int
+        """
+        super().__init__(*args, **kwargs)
+
+        self.__max_part_size = max_part_size
+        self.__decoder = None
+        self.__started = False
+
+    def recycle(self):
+        super().recycle()
+        self.__decoder = None
+        self.__started = False
+
+    def get_multipart_boundary(self):
+        """
+        Get multipart boundary of the current message.
+
+        :returns: bytes or None if the message body is not multipart
+        """
+        content_type = self.get_header(b"content-type")
+        if content_type is None:
+            return None
+        return get_boundary(content_type.value)
+
+    def body_data_received(self, data):
+        if not self.__started:
+            self.__started = True
+            boundary = self.get_multipart_boundary()
+            if boundary:
+                self.__decoder = MultipartDecoder(boundary, self.part_received, self.parse_error,
+                                                  max_part_size=self.__max_part_size)
+        if self.__decoder is not None:
+            self.__decoder.feed(data)
+        else:
+            super().body_data_received(data)
+
+    def message_end_received(self):
+        if self.__decoder is not None:
+            self.__decoder.close()
+            self.__decoder = None
+        self.__started = False
+        super().message_end_received()
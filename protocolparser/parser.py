@@ -0,0 +1,139 @@
+"""
+Sans-IO interface of the message readers.
+
+The Parser class turns the callbacks of a given reader class into a list of
+events, so the readers can be used without an event loop (e.g. from threads,
+selectors based loops or for offline parsing of recorded streams):
+
+    parser = Parser(HttpResponseReader)
+    parser.push_request("GET")
+    for event in parser.feed(data):
+        ...
+    events = parser.close()
+
+All event data are copied, so the events stay valid after the feed() call.
+"""
+
+from collections import namedtuple
+
+from .protocol import HttpLikeMessageReader
+
+RequestLine = namedtuple('RequestLine', ['method', 'url', 'version'])
+StatusLine = namedtuple('StatusLine', ['version', 'status_code', 'reason_phrase'])
+Header = namedtuple('Header', ['name', 'value'])
+BodyChunk = namedtuple('BodyChunk', ['data'])
+MessageEnd = namedtuple('MessageEnd', [])
+InterleavedFrame = namedtuple('InterleavedFrame', ['channel', 'data'])
+ParseError = namedtuple('ParseError', ['message'])
+InternalError = namedtuple('InternalError', ['message'])
+ConnectionClose = namedtuple('ConnectionClose', [])
+
+
+class EventMixin:
+    """
+    Reader mixin collecting events instead of calling the application
+    callbacks.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.events = []
+
+    def header_received(self):
+        events = self.events
+        # connection readers (e.g. RtspConnectionReader) receive both requests and responses
+        if getattr(self, 'status_code', None) is None:
+            events.append(RequestLine(self.method, self.url, self.version))
+        else:
+            events.append(StatusLine(self.version, self.status_code, self.reason_phrase))
+        for _, field in self.get_headers():
+            events.append(Header(field.name, field.value))
+
+    def body_data_received(self, data):
+        self.events.append(BodyChunk(bytes(data)))
+
+    def message_end_received(self):
+        self.events.append(MessageEnd())
+
+    def interleaved_data_received(self, channel, data):
+        self.events.append(InterleavedFrame(channel, bytes(data)))
+
+    def parse_error(self, msg):
+        self.events.append(ParseError(msg))
+
+    def internal_error(self, msg):
+        self.events.append(InternalError(msg))
+
+    def close_connection(self):
+        self.events.append(ConnectionClose())
+
+
+class Parser:
+    """
+    Sans-IO message parser. It takes received bytes and returns parsing
+    events (RequestLine or StatusLine, Header, BodyChunk, MessageEnd,
+    InterleavedFrame, ParseError, InternalError and ConnectionClose).
+    """
+
+    # event reader classes created for the given reader classes
+    __reader_classes = {}
+
+    def __init__(self, reader_class, **kwargs):
+        """
+        Create a new parser.
+
+        :param reader_class: message reader class (e.g. HttpRequestReader or RtspConnectionReader)
+        :type reader_class: type
+        :param kwargs: reader options (e.g. max_headers or max_body_size)
+        """
+        if not issubclass(reader_class, HttpLikeMessageReader):
+            raise TypeError("message reader class expected")
+
+        cls = self.__reader_classes.get(reader_class)
+        if cls is None:
+            cls = type(reader_class.__name__, (EventMixin, reader_class), {})
+            self.__reader_classes[reader_class] = cls
+
+        self.__reader = cls(**kwargs)
+
+    def feed(self, data):
+        """
+        Process given data.
+
+        :param data: received data
+        :type data: bytes
+        :returns: list of events
+        """
+        self.__reader.data_received(data)
+        return self.__take_events()
+
+    def close(self):
+        """
+        Signal end of the stream. A body delimited by the end of the stream is
+        completed.
+
+        :returns: list of events
+        """
+        self.__reader.eof_received()
+        return self.__take_events()
+
+    def push_request(self, method, cseq=None):
+        """
+        Inform the parser about a request for which a response is expected
+        (applicable only to response and connection parsers).
+
+        :param method: request method (e.g. GET, POST, HEAD, etc.)
+        :type method: str
+        :param cseq: sequence number of the request (required by RtspConnectionReader only)
+        :type cseq: int
+        """
+        if cseq is None:
+            self.__reader.push_request(method)
+        else:
+            self.__reader.push_request(method, cseq)
+
+    def __take_events(self):
+        events = self.__reader.events
+        self.__reader.events = []
+        return events
@@ -0,0 +1,95 @@
+"""
+Reader instance pooling.
+
+ReaderPool is a protocol factory which recycles reader instances (including
+their internal buffers) after their connections are closed:
+
+    pool = ReaderPool(MyRequestReader, max_headers=64)
+    server = await loop.create_server(pool, host, port)
+
+A released reader is scrubbed using recycle(), so it cannot be told apart
+from a new instance. Reader classes keeping their own connection state must
+extend recycle() accordingly.
+"""
+
+
+class PooledMixin:
+    """
+    Reader mixin returning the reader to its pool when the connection is
+    lost.
+    """
+
+    __slots__ = ()
+
+    reader_pool = None
+
+    def connection_lost(self, exc):
+        super().connection_lost(exc)
+        pool = self.reader_pool
+        if pool is not None:
+            pool.release(self)
+
+
+class ReaderPool:
+    """
+    Protocol factory recycling reader instances.
+    """
+
+    # pooled classes created for the given reader classes
+    __pooled_classes = {}
+
+    def __init__(self, reader_class, *args, max_size=1024, **kwargs):
+        """
+        Create a new pool. All positional and keyword arguments (except of
+        max_size) are passed to the reader constructor.
+
+        :param reader_class: reader class (e.g. HttpRequestReader or its subclass)
+        :type reader_class: type
+        :param max_size: maximum number of idle readers kept in the pool
+        :type max_size: int
+        """
+        cls = self.__pooled_classes.get(reader_class)
+        if cls is None:
+            cls = type(reader_class.__name__, (PooledMixin, reader_class), {'__slots__': ('reader_pool',)})
+            self.__pooled_classes[reader_class] = cls
+
+        self.__reader_class = cls
+        self.__args = args
+        self.__kwargs = kwargs
+        self.__max_size = max_size
+        self.__idle = []
+
+    def __call__(self):
+        """
+        Get a reader for a new connection.
+        """
+        if self.__idle:
+            reader = self.__idle.pop()
+        else:
+            reader = self.__reader_class(*self.__args, **self.__kwargs)
+        reader.reader_pool = self
+        return reader
+
+    def __len__(self):
+        """
+        Get number of idle readers.
+        """
+        return len(self.__idle)
+
+    def release(self, reader):
+        """
+        Scrub a given reader and keep it for another connection. It is
+        called automatically when the reader connection is lost.
+
+        :param reader: reader created by this pool
+        """
+        reader.reader_pool = None
+        if len(self.__idle) < self.__max_size:
+            reader.recycle()
+            self.__idle.append(reader)
+
+    def clear(self):
+        """
+        Drop all idle readers.
+        """
+        self.__idle.clear()
@@ -1,27 +1,215 @@
 import asyncio
 import re
+import threading
 
 from collections import deque
 
+from .encoding import ContentDecoder, parse_content_encoding
+from .timers import get_timer_wheel
+
+# ASCII characters matched by "\s" in a str regular expression
+WHITESPACE = b" \t\n\x0b\x0c\r\x1c\x1d\x1e\x1f"
+
+CRLF_RE = re.compile(rb"\r\n")
+CHUNK_SIZE_RE = re.compile(rb"[0-9A-Fa-f]+")
+
+# lowercase names of common header fields
+COMMON_HEADER_NAMES = (
+    b"accept", b"accept-encoding", b"accept-language", b"accept-ranges", b"age", b"allow", b"authorization",
+    b"blocksize", b"cache-control", b"connection", b"content-base", b"content-disposition", b"content-encoding",
+    b"content-language", b"content-length", b"content-location", b"content-range", b"content-type", b"cookie",
+    b"cseq", b"date", b"etag", b"expect", b"expires", b"host", b"if-match", b"if-modified-since",
+    b"if-none-match", b"keep-alive", b"last-modified", b"location", b"origin", b"pragma", b"proxy-authenticate",
+    b"proxy-authorization", b"public", b"range", b"referer", b"retry-after", b"rtp-info", b"scale", b"server",
+    b"session", b"set-cookie", b"speed", b"te", b"timestamp", b"trailer", b"transfer-encoding", b"transport",
+    b"unsupported", b"upgrade", b"user-agent", b"vary", b"via", b"www-authenticate", b"x-forwarded-for",
+)
+
+# usual spellings of the common header field names mapped to their shared
+# lowercase names
+HEADER_KEYS = {variant: name
+               for name in COMMON_HEADER_NAMES
+               for variant in (name, name.title(), name.upper())}
+HEADER_KEYS.update({
+    b"CSeq": b"cseq",
+    b"ETag": b"etag",
+    b"RTP-Info": b"rtp-info",
+    b"TE": b"te",
+    b"WWW-Authenticate": b"www-authenticate",
+})
+
+
+def header_key(name):
+    """
+    Get lowercase version of a given header field name. The same object is
+    returned for all usual spellings of common header field names.
+
+    :param name: header field name
+    :type name: bytes
+    :returns: bytes
+    """
+    return HEADER_KEYS.get(name) or name.lower()
+
+
+def splice_header(raw, replace=None, remove=(), append=()):
+    """
+    Apply given header field edits to a raw header block. All other lines
+    are kept as they are (including their order, case and repeated fields).
+
+    :param raw: raw header block (see HttpLikeMessageReader.get_raw_header())
+    :type raw: bytes
+    :param replace: map of field names to new values, the first field with a given name gets the new value (with
+        the original name spelling) and the other ones are removed, missing fields are appended
+    :type replace: dict
+    :param remove: names of fields to be removed
+    :type remove: iterable of bytes
+    :param append: (name, value) pairs of fields to be appended
+    :type append: iterable of tuple
+    :returns: list of bytes-like objects (slices of the raw block and new lines) to be passed to writelines()
+    """
+    view = memoryview(raw)
+    pending = {header_key(name): (name, value) for name, value in (replace or {}).items()}
+    dropped = {header_key(name) for name in remove} | set(pending)
+    segments = []
+    drop = False
+    # start of the current run of unchanged lines
+    kept = 0
+    pos = raw.index(b"\r\n") + 2
+    end = len(raw) - 2
+
+    while pos < end:
+        eol = raw.index(b"\r\n", pos) + 2
+        if raw[pos] not in b" \t":
+            colon = raw.find(b":", pos, eol)
+            name = raw[pos:colon if colon >= 0 else eol - 2].strip()
+            drop = header_key(name) in dropped
+            if drop:
+                if kept < pos:
+                    segments.append(view[kept:pos])
+                field = pending.pop(header_key(name), None)
+                if field is not None:
+                    segments.append(name + b": " + field[1] + b"\r\n")
+        if drop:
+            kept = eol
+        pos = eol
+
+    if kept < end:
+        segments.append(view[kept:end])
+    for name, value in pending.values():
+        segments.append(name + b": " + value + b"\r\n")
+    for name, value in append:
+        segments.append(name + b": " + value + b"\r\n")
+    segments.append(b"\r\n")
+
+    return segments
+
+
+# chunked body decoder states
+CHUNK_SIZE = 0
+CHUNK_DATA = 1
+CHUNK_DATA_END = 2
+CHUNK_TRAILER = 3
+
 
 class LineReader(asyncio.Protocol):
     """
     Line reader protocol allowing to process incoming data as raw binary messages or lines of a text message.
+
+    The received data is always processed through a memoryview, so it is
+    never copied between processing steps. In the zero-copy mode, all data
+    passed to raw_data_received() are memoryview slices of the buffer given
+    to data_received(). Such a view is valid only until the
+    raw_data_received() call returns. The underlying buffer may be reused by
+    the caller afterwards, so the data must be copied (e.g. using bytes(data))
+    if it is needed later. Otherwise, raw_data_received() gets a bytes copy.
+    Lines passed to line_received() are always copied.
+
+    The reader classes use __slots__ and create their buffers only when they
+    are needed, so an idle reader takes as little memory as possible.
     """
 
-    def __init__(self, delimiter=b"\r\n", buffer_limit=8192):
+    # the buffer passed to data_received() is overwritten by the next read
+    # (see BufferedLineReader)
+    reuses_read_buffer = False
+
+    __slots__ = ('__delimiter', '__delimiter_re', '__delimiter_prefix', '__buffer', '__buffer_limit', '__raw_mode',
+                 '__stop_scan', '__processing', '__zero_copy', '__transport', '__reading_paused',
+                 # read buffer size used by buffered readers (BufferedLineReader is combined with other LineReader
+                 # subclasses, so it cannot have any slots of its own)
+                 '_read_buffer_size')
+
+    def __init__(self, delimiter=b"\r\n", buffer_limit=8192, zero_copy=False):
         """Create a new instance of LineReader protocol.
 
         :param delimiter: line delimiter (the default delimiter is "\r\n")
         :type delimiter: bytes
         :param buffer_limit: maximum length of a line (the default limit is 8192 bytes)
         :type buffer_limit: int
+        :param zero_copy: pass memoryview slices of the received data to raw_data_received()
+        :type zero_copy: bool
         """
         self.__delimiter = delimiter
-        self.__buffer = bytes()
+        self.__delimiter_re = re.compile(re.escape(delimiter))
+        # bytes that can appear at the end of the line buffer if the delimiter has been split
+        self.__delimiter_prefix = delimiter[:-1]
+        # incomplete line (None if there is no such line)
+        self.__buffer = None
         self.__buffer_limit = buffer_limit
         self.__raw_mode = False
+        self.__stop_scan = False
         self.__processing = False
+        self.__zero_copy = zero_copy
+        self.__transport = None
+        self.__reading_paused = False
+
+    def connection_made(self, transport):
+        """
+        Store the transport, it is needed for reading flow control.
+        (Note: Subclasses overriding this method must call it.)
+
+        :param transport: the underlying transport
+        :type transport: asyncio.Transport
+        """
+        self.__transport = transport
+        self.__reading_paused = False
+
+    def connection_lost(self, exc):
+        self.__transport = None
+
+    def recycle(self):
+        """
+        Restore the initial state of the reader, so that it can be used for a
+        new connection. (Note: Subclasses keeping any connection state must
+        extend this method.)
+        """
+        self.__buffer = None
+        self.__raw_mode = False
+        self.__stop_scan = False
+        self.__processing = False
+        self.__transport = None
+        self.__reading_paused = False
+
+    def pause_reading(self):
+        """
+        Pause reading from the underlying transport (if there is any).
+        """
+        if self.__transport is not None and not self.__reading_paused:
+            self.__reading_paused = True
+            self.__transport.pause_reading()
+
+    def resume_reading(self):
+        """
+        Resume reading from the underlying transport.
+        """
+        if self.__transport is not None and self.__reading_paused:
+            self.__reading_paused = False
+            self.__transport.resume_reading()
+
+    def is_reading_paused(self):
+        """
+        Check if reading from the underlying transport has been paused.
+        """
+        return self.__reading_paused
 
     def data_received(self, data):
         """
@@ -30,56 +218,142 @@ class LineReader(asyncio.Protocol):
         :param data: received data
         :type data: bytes
         """
+        data = memoryview(data)
+
         self.__processing = True
         try:
             consumed = 0
             while consumed < len(data):
                 consumed += self.process_data(data[consumed:])
                 # process all possibly buffered data in case the raw mode has been enabled
-                if self.__raw_mode and len(self.__buffer) > 0:
-                    data = self.__buffer + data[consumed:]
-                    self.__buffer = bytes()
+                if self.__raw_mode and self.__buffer:
+                    data = memoryview(self.__take_buffer() + data[consumed:])
                     consumed = 0
         finally:
             self.__processing = False
 
+    def is_zero_copy(self):
+        """
+        Check if the zero-copy mode is enabled.
+        """
+        return self.__zero_copy
+
     def process_data(self, data):
         """
         Single data processing step. The method should be called repeatedly (with increasing offset)
         until the whole buffer is processed.
 
+        Complete lines are taken directly from the given data. The line buffer
+        holds only an incomplete line at the end of the data, so every byte is
+        searched for the delimiter only once.
+
         :param data: data to be processed
-        :type data: bytes
+        :type data: bytes or memoryview
         :returns: number of processed bytes
         """
         if self.__raw_mode:
+            if not self.__zero_copy:
+                data = bytes(data)
             return self.raw_data_received(data)
 
-        consumed = self.__buffer_limit - len(self.__buffer)
-        if consumed <= 0:
-            self.line_length_exceeded()
-            self.__buffer = bytes()
-            return len(data)
+        limit = self.__buffer_limit
+        search = self.__delimiter_re.search
+        buffer = self.__buffer
+        pos = 0
+
+        self.__stop_scan = False
+
+        if buffer:
+            available = limit - len(buffer)
+            if available <= 0:
+                self.line_length_exceeded()
+                self.__buffer = None
+                return len(data)
+
+            if buffer[-1] in self.__delimiter_prefix:
+                pos = self.__find_split_delimiter(data, available)
+
+            if pos == 0:
+                m = search(data, 0, available)
+                if m is None:
+                    if len(data) <= available:
+                        buffer += data
+                        return len(data)
+                    buffer += data[:available]
+                    return available
+                pos = m.end()
+                buffer += data[:pos]
+
+            line = bytes(buffer[:len(buffer) - len(self.__delimiter)])
+            self.__buffer = None
+            self.line_received(line)
 
-        if consumed > len(data):
-            consumed = len(data)
+        while not self.__raw_mode and not self.__stop_scan:
+            m = search(data, pos, pos + limit)
+            if m is None:
+                break
+            line = data[pos:m.start()]
+            pos = m.end()
+            self.line_received(bytes(line))
 
-        dlen = len(self.__delimiter)
-        start = len(self.__buffer) - dlen
-        if start < 0:
-            start = 0
+        if self.__raw_mode or self.__stop_scan:
+            return pos
 
-        self.__buffer += data[:consumed]
+        consumed = min(len(data), pos + limit)
+        if consumed > pos:
+            self.__buffer = bytearray(data[pos:consumed])
+        return consumed
 
-        pos = self.__buffer.find(self.__delimiter, start)
-        while not self.__raw_mode and pos >= 0:
-            line = self.__buffer[:pos]
-            rest = self.__buffer[pos + dlen:]
-            self.__buffer = rest
-            self.line_received(line)
-            pos = self.__buffer.find(self.__delimiter)
+    def __find_split_delimiter(self, data, available):
+        """
+        Check if the delimiter has been split between the line buffer and the
+        new data. If so, the rest of the delimiter is appended to the line
+        buffer.
 
-        return consumed
+        :param data: new data
+        :type data: bytes or memoryview
+        :param available: maximum number of bytes that can be appended to the line buffer
+        :type available: int
+        :returns: number of bytes taken from the data (0 if the delimiter has not been split)
+        """
+        delimiter = self.__delimiter
+        dlen = len(delimiter)
+        tail = bytes(self.__buffer[-(dlen - 1):])
+        head = bytes(data[:dlen - 1])
+        pos = (tail + head).find(delimiter)
+        if 0 <= pos < len(tail):
+            end = pos + dlen - len(tail)
+            if end <= available:
+                self.__buffer += head[:end]
+                return end
+        return 0
+
+    def __take_buffer(self):
+        """
+        Remove all data from the line buffer.
+
+        :returns: the buffered data
+        """
+        data = bytes(self.__buffer)
+        self.__buffer = None
+        return data
+
+    def stop_line_scan(self):
+        """
+        Stop scanning for lines after the current line. The rest of the data
+        will be passed to a new process_data() call (e.g. because it may
+        contain a new message which can be processed in a different way).
+        """
+        self.__stop_scan = True
+
+    def get_buffered_length(self):
+        """
+        Get length of the incomplete line stored in the line buffer.
+
+        :returns: number of buffered bytes
+        """
+        buffer = self.__buffer
+        return len(buffer) if buffer else 0
 
     def set_raw_mode(self, raw):
         """
@@ -94,10 +368,14 @@ class LineReader(asyncio.Protocol):
         self.__raw_mode = raw
         # process all possibly buffered data in case the raw mode has
         # been enabled and we are not inside of the processing loop
-        if raw and not self.__processing and len(self.__buffer) > 0:
-            data = self.__buffer
-            self.__buffer = bytes()
-            self.data_received(data)
+        if raw and not self.__processing and self.__buffer:
+            self.data_received(self.__take_buffer())
+
+    def is_raw_mode(self):
+        """
+        Check if the raw mode is enabled.
+        """
+        return self.__raw_mode
 
     def line_received(self, line):
         """
@@ -118,26 +396,224 @@ class LineReader(asyncio.Protocol):
 
     def raw_data_received(self, data):
         """This method is called in raw mode for every piece of received data.
+
+        :param data: received data (a memoryview valid only during this call in the zero-copy mode)
+        :type data: bytes or memoryview
+        :returns: number of consumed bytes
         """
         return len(data)
 
 
+# read buffers shared by all buffered readers running in a thread
+_read_buffers = threading.local()
+
+
+def get_read_buffer(size):
+    """
+    Get the read buffer of a given size shared by all buffered readers
+    running in the current thread. The event loop processes the data before
+    the next read, so the readers never need the buffer at the same time.
+
+    :param size: buffer size
+    :type size: int
+    :returns: memoryview
+    """
+    buffers = getattr(_read_buffers, 'buffers', None)
+    if buffers is None:
+        buffers = _read_buffers.buffers = {}
+    buffer = buffers.get(size)
+    if buffer is None:
+        buffer = buffers[size] = memoryview(bytearray(size))
+    return buffer
+
+
+class BufferedLineReader(LineReader, asyncio.BufferedProtocol):
+    """
+    Line reader based on asyncio.BufferedProtocol. The event loop receives
+    data directly into a preallocated read buffer, so no new bytes object is
+    created for every read. The read buffer is shared by all buffered readers
+    of the thread (see get_read_buffer()), so an idle connection does not
+    hold any. The reader always works in the zero-copy mode and the read
+    buffer is reused for the next read, i.e. all memoryviews passed to
+    raw_data_received() are valid only during the call.
+
+    This class is meant to be combined with a LineReader subclass, e.g.:
+    class BufferedFooReader(BufferedLineReader, FooReader).
+    """
+
+    reuses_read_buffer = True
+
+    __slots__ = ()
+
+    def __init__(self, *args, read_buffer_size=65536, **kwargs):
+        """
+        Create a new buffered reader. All positional and keyword arguments
+        (except of read_buffer_size) are passed to the next constructor in the
+        MRO.
+
+        :param read_buffer_size: size of the read buffer (the default size is 64 KiB)
+        :type read_buffer_size: int
+        """
+        kwargs['zero_copy'] = True
+        super().__init__(*args, **kwargs)
+
+        self._read_buffer_size = read_buffer_size
+
+    def get_buffer(self, sizehint):
+        """
+        Get the read buffer.
+
+        :param sizehint: recommended minimal buffer size (ignored)
+        :type sizehint: int
+        :returns: memoryview
+        """
+        return get_read_buffer(self._read_buffer_size)
+
+    def buffer_updated(self, nbytes):
+        """
+        Process data written into the read buffer.
+
+        :param nbytes: number of bytes written into the read buffer
+        :type nbytes: int
+        """
+        self.data_received(get_read_buffer(self._read_buffer_size)[:nbytes])
+
+
 class HeaderField:
     """
     Header field envelope.
     """
+    __slots__ = ('name', 'value', 'key')
 
     def __init__(self, name, value):
         """
         Create a new header field with a given name and value.
 
         :param name: header name
-        :type name: str
+        :type name: bytes
         :param value: header value
-        :type value: str
+        :type value: bytes
         """
         self.name = name
         self.value = value
+        # lowercase name
+        self.key = HEADER_KEYS.get(name) or name.lower()
+
+
+class HeaderFields:
+    """
+    Ordered collection of header fields. All occurrences of repeated header
+    fields are kept. The fields are indexed by their lowercase names only
+    when a field is looked up by name.
+    """
+    __slots__ = ('__fields', '__index')
+
+    def __init__(self):
+        """
+        Create a new empty collection of header fields.
+        """
+        self.__fields = []
+        self.__index = None
+
+    def __len__(self):
+        return len(self.__fields)
+
+    def __iter__(self):
+        return iter(self.__fields)
+
+    def clear(self):
+        """
+        Remove all header fields.
+        """
+        self.__fields.clear()
+        self.__index = None
+
+    def append(self, name, value):
+        """
+        Append a new header field.
+
+        :param name: header name
+        :type name: bytes
+        :param value: header value
+        :type value: bytes
+        :returns: the new HeaderField
+        """
+        field = HeaderField(name, value)
+        self.__fields.append(field)
+        self.__index = None
+        return field
+
+    def extend(self, fields):
+        """
+        Append given header fields.
+
+        :param fields: header fields
+        :type fields: list of HeaderField
+        """
+        self.__fields.extend(fields)
+        self.__index = None
+
+    def get(self, name):
+        """
+        Get the last header field with a given name.
+
+        :param name: lowercase header field name
+        :type name: bytes
+        :returns: HeaderField or None
+        """
+        if self.__index is None:
+            self.__index = {field.key: field for field in self.__fields}
+        return self.__index.get(name)
+
+    def get_all(self, name):
+        """
+        Get all header fields with a given name (in the order of appearance).
+
+        :param name: lowercase header field name
+        :type name: bytes
+        :returns: list of HeaderField
+        """
+        if self.get(name) is None:
+            return []
+        return [field for field in self.__fields if field.key == name]
+
+    def items(self):
+        """
+        Get list of (lowercase name, HeaderField) pairs (in the order of appearance).
+        """
+        return [(field.key, field) for field in self.__fields]
+
+
+class Message:
+    """
+    Complete message returned by HttpLikeMessageReader.parse_all(). All named
+    groups of the reader's first line regex (e.g. method, url and version) are
+    available as attributes.
+    """
+
+    def __init__(self, first_line, headers):
+        """
+        Create a new message.
+
+        :param first_line: first line fields
+        :type first_line: dict
+        :param headers: header fields
+        :type headers: HeaderFields
+        """
+        self.__dict__.update(first_line)
+        self.headers = headers
+        self.body = b""
+
+    def get_header(self, name):
+        """
+        Get header with a given name. If the header field is repeated, the
+        last occurrence is returned.
+
+        :param name: header field name
+        :type name: bytes
+        :returns: HttpHeader or None
+        """
+        return self.headers.get(HEADER_KEYS.get(name) or name.lower())
 
 
 class HttpLikeMessageReader(LineReader):
@@ -145,8 +621,43 @@ class HttpLikeMessageReader(LineReader):
     HTTP like message reader protocol.
     """
     first_line_re = re.compile(r"^(?P<first_line>.*)$")
-
-    def __init__(self, max_headers=512, max_line_length=8192):
+    header_end_re = re.compile(rb"\r\n\r\n")
+
+    # maximum amount of chunk payloads passed to a single body_data_received()
+    # call (chunks are never merged in the zero-copy mode)
+    chunk_coalesce_limit = 16384
+
+    # keep the original header block of every message (see get_raw_header())
+    keep_raw_header = False
+
+    # protocol name (e.g. b"HTTP") used by the built-in first line parsers of
+    # the request and response readers, None means that only the first_line_re
+    # is used
+    first_line_protocol = None
+    # map of valid protocol tokens (e.g. b"HTTP/1.1") to protocol versions
+    first_line_versions = {}
+
+    __slots__ = ('first_line', '__header_lines', '__last_header_field', '__header_fields', '__header_fields_taken',
+                 '__trailer_fields', '__max_header_fields', '__max_line_length', '__max_body_size', '__max_chunk_size',
+                 '__max_header_size', '__max_continuation_lines', '__header_size', '__continuation_lines',
+                 '__header_complete', '__expected', '__body_size', '__discard', '__content_length',
+                 '__transfer_encoding', '__connection', '__timer_wheel', '__header_timeout', '__header_timer',
+                 '__min_data_rate', '__rate_window', '__rate_timer', '__rate_start', '__received', '__raw_header',
+                 '__raw_header_buffer', '__relay', '__decoding', '__content_decoder', '__tunnel_pending', '__tunnel',
+                 '__chunk_state', '__chunk_remaining', '__chunk_line', '__body_high_water', '__body_low_water',
+                 '__body_pending', '__batch', '__batch_message', '__batch_body')
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # a custom first line regex disables the built-in first line parser
+        if 'first_line_re' in cls.__dict__ and 'first_line_protocol' not in cls.__dict__:
+            cls.first_line_protocol = None
+        if 'first_line_protocol' in cls.__dict__ and cls.first_line_protocol is not None:
+            versions = ["%d.%d" % (major, minor) for major in range(10) for minor in range(10)]
+            cls.first_line_versions = {cls.first_line_protocol + b"/" + v.encode(): v for v in versions}
+
+    def __init__(self, max_headers=512, max_line_length=8192, zero_copy=False, max_body_size=None,
+                 max_chunk_size=None, max_header_size=None, max_continuation_lines=None):
         """
         Create a new instance of HTTP message reader.
 
@@ -154,58 +665,387 @@ class HttpLikeMessageReader(LineReader):
         :type max_headers: int
         :param max_line_length: maximum length of a single header line
         :type max_line_length: int
-        """
-        super().__init__(b"\r\n", max_line_length)
+        :param zero_copy: pass body data to body_data_received() as memoryview slices of the received data
+        :type zero_copy: bool
+        :param max_body_size: maximum size of a message body (None means unlimited)
+        :type max_body_size: int
+        :param max_chunk_size: maximum size of a single chunk of a chunked body (None means unlimited)
+        :type max_chunk_size: int
+        :param max_header_size: maximum size of a header including the first line (None means unlimited)
+        :type max_header_size: int
+        :param max_continuation_lines: maximum number of continuation lines of a header field (None means unlimited)
+        :type max_continuation_lines: int
+        """
+        super().__init__(b"\r\n", max_line_length, zero_copy)
 
-        self.__process_line = self.__process_header_line
         self.__header_lines = 0
         self.__last_header_field = None
-        self.__header_fields = {}
+        self.__header_fields = HeaderFields()
+        # the header fields are referenced by a message returned by parse_all()
+        self.__header_fields_taken = False
+        self.__trailer_fields = None
         self.__max_header_fields = max_headers
+        self.__max_line_length = max_line_length
+        self.__max_body_size = max_body_size
+        self.__max_chunk_size = max_chunk_size
+        self.__max_header_size = max_header_size
+        self.__max_continuation_lines = max_continuation_lines
+        self.__header_size = 0
+        self.__continuation_lines = 0
+        self.__header_complete = False
         self.__expected = 0
+        self.__body_size = 0
+        self.__discard = False
+
+        # framing header fields of the current message (decoded at the end
+        # of the header, a negative content length means an invalid value)
+        self.__content_length = None
+        self.__transfer_encoding = None
+        self.__connection = None
+
+        # time budgets (see set_time_limits())
+        self.__timer_wheel = None
+        self.__header_timeout = None
+        self.__header_timer = None
+        self.__min_data_rate = None
+        self.__rate_window = None
+        self.__rate_timer = None
+        self.__rate_start = 0
+        self.__received = 0
+
+        # original header block of the current message (see keep_raw_header)
+        self.__raw_header = None
+        self.__raw_header_buffer = None
+        # transport the rest of the current message is relayed to (see relay())
+        self.__relay = None
+
+        # content decoding options (see set_content_decoding()) and the
+        # decoder of the current message body
+        self.__decoding = None
+        self.__content_decoder = None
+
+        # all data after the current message belong to another protocol (see start_tunnel())
+        self.__tunnel_pending = False
+        self.__tunnel = False
+
+        # chunked body decoder state (None if no chunked body is being received)
+        self.__chunk_state = None
+        self.__chunk_remaining = 0
+        # incomplete line of a chunked body
+        self.__chunk_line = None
+
+        # body flow control (see set_body_buffer_limits())
+        self.__body_high_water = None
+        self.__body_low_water = None
+        self.__body_pending = 0
+
+        # messages completed within the current parse_all() call
+        self.__batch = None
+        self.__batch_message = None
+        self.__batch_body = None
 
     def reset(self):
         """
         Reset the protocol state and prepare the reader for reading a new
         message.
         """
-        self.__process_line = self.__process_header_line
+        persistent = self.__tunnel or self.is_persistent()
+
+        self.__clear_message_state()
+
+        self.set_raw_mode(False)
+        self.stop_line_scan()
+
+        if not persistent:
+            self.close_connection()
+
+    def recycle(self):
+        super().recycle()
+
+        self.__clear_message_state()
+
+        self.set_time_limits()
+        self.set_content_decoding(False)
+        self.__received = 0
+        self.__tunnel_pending = False
+        self.__tunnel = False
+        self.__body_high_water = None
+        self.__body_low_water = None
+        self.__body_pending = 0
+        self.__batch = None
+        self.__batch_message = None
+        self.__batch_body = None
+
+    def __clear_message_state(self):
+        """
+        Clear state of the current message. The header field container is
+        reused unless it has been passed to a message.
+        """
         self.__header_lines = 0
         self.__last_header_field = None
-        self.__header_fields = {}
+        if self.__header_fields_taken:
+            self.__header_fields = HeaderFields()
+            self.__header_fields_taken = False
+        else:
+            self.__header_fields.clear()
+        self.__trailer_fields = None
+        self.__header_size = 0
+        self.__continuation_lines = 0
+        self.__header_complete = False
         self.__expected = 0
+        self.__body_size = 0
+        self.__discard = False
+        self.__chunk_state = None
+        self.__chunk_line = None
+        self.__content_length = None
+        self.__transfer_encoding = None
+        self.__connection = None
+        self.__raw_header = None
+        self.__raw_header_buffer = None
+        self.__relay = None
+        self.__content_decoder = None
+
+        if self.__timer_wheel is not None:
+            self.__cancel_timers()
+
+    def parse_all(self, data):
+        """
+        Process given data and return all messages completed within it. All
+        the usual callbacks are called as well. A message received partially
+        is kept in the reader state and it is returned by one of the following
+        parse_all() calls. (Note: Messages that started within a data_received()
+        call are not collected.)
 
-        self.set_raw_mode(False)
+        :param data: data to be processed
+        :type data: bytes
+        :returns: list of Message
+        """
+        self.__batch = []
+        try:
+            self.data_received(data)
+            return self.__batch
+        finally:
+            self.__batch = None
+
+    def set_time_limits(self, header_timeout=None, min_data_rate=None, rate_window=5.0, timer_wheel=None):
+        """
+        Set time budgets of incoming messages. A message exceeding a budget
+        is reported via parse_error() ('header timeout exceeded' or 'minimum
+        data rate not reached'), the rest of the data is discarded and
+        close_connection() is called. The deadlines are checked using a timer
+        wheel shared by all readers, so there is no event loop handle per
+        reader. (Note: Subclasses overriding connection_lost() must call it.)
+
+        :param header_timeout: maximum time (in seconds) between receiving the beginning and the end of a header
+        :type header_timeout: float
+        :param min_data_rate: minimum data rate (bytes per second) while a message is being received
+        :type min_data_rate: float
+        :param rate_window: time window (in seconds) over which the data rate is measured
+        :type rate_window: float
+        :param timer_wheel: timer wheel (None means the default timer wheel of the running event loop)
+        :type timer_wheel: protocolparser.timers.TimerWheel
+        """
+        self.__cancel_timers()
+        self.__header_timeout = header_timeout
+        self.__min_data_rate = min_data_rate
+        self.__rate_window = rate_window if min_data_rate is not None else None
+        if header_timeout is None and min_data_rate is None:
+            self.__timer_wheel = None
+        else:
+            self.__timer_wheel = timer_wheel if timer_wheel is not None else get_timer_wheel()
+            self.__update_timers()
+
+    def set_content_decoding(self, enabled=True, max_decoded_size=None, window=65536):
+        """
+        Enable incremental decoding of message bodies with a Content-Encoding
+        (gzip, deflate or their combination). The decoded data are passed to
+        decoded_body_data_received() in pieces of at most window bytes,
+        body_data_received() still gets the original data. An unsupported
+        coding, invalid encoded data or a body exceeding the decoded size
+        limit is reported via parse_error() and the rest of the body is not
+        decoded.
+
+        :param enabled: enable the content decoding
+        :type enabled: bool
+        :param max_decoded_size: maximum size of a decoded body (None means unlimited)
+        :type max_decoded_size: int
+        :param window: maximum size of a single piece of decoded data
+        :type window: int
+        """
+        self.__decoding = (max_decoded_size, window) if enabled else None
+
+    def set_body_buffer_limits(self, high=None, low=None):
+        """
+        Enable body flow control. All data passed to body_data_received() are
+        considered pending until the application reports them as processed
+        using body_data_processed(). Reading from the underlying transport is
+        paused when the amount of pending data reaches the high-water mark and
+        it is resumed when it drops to the low-water mark.
+
+        :param high: high-water mark in bytes (None disables the flow control)
+        :type high: int
+        :param low: low-water mark in bytes (the default is high / 4)
+        :type low: int
+        """
+        if high is not None and low is None:
+            low = high // 4
+        self.__body_high_water = high
+        self.__body_low_water = low
+        self.__body_pending = 0
+        if high is None:
+            self.resume_reading()
+
+    def body_data_processed(self, size):
+        """
+        Inform the reader that the application has processed a given amount
+        of body data.
+
+        :param size: number of processed bytes
+        :type size: int
+        """
+        if self.__body_high_water is None:
+            return
+        self.__body_pending = max(0, self.__body_pending - size)
+        if self.__body_pending <= self.__body_low_water:
+            self.resume_reading()
 
-        if not self.is_persistent():
-            self.close_connection()
+    def get_pending_body_size(self):
+        """
+        Get amount of body data not processed by the application yet (see
+        set_body_buffer_limits()).
+        """
+        return self.__body_pending
 
     def get_header(self, name):
         """
-        Get request header with a given name.
+        Get request header with a given name. If the header field is repeated,
+        the last occurrence is returned.
 
         :param name: header field name
         :type name: bytes
         :returns: HttpHeader or None
         """
-        return self.__header_fields.get(name.lower())
+        return self.__header_fields.get(HEADER_KEYS.get(name) or name.lower())
+
+    def get_all_headers(self, name):
+        """
+        Get all occurrences of request header with a given name.
+
+        :param name: header field name
+        :type name: bytes
+        :returns: list of HttpHeader
+        """
+        return self.__header_fields.get_all(HEADER_KEYS.get(name) or name.lower())
+
+    def get_header_line_count(self):
+        """
+        Get number of received lines of the current header, i.e. the first
+        line, header field lines and continuation lines (the terminating empty
+        line is not counted).
+
+        :returns: int
+        """
+        return max(self.__header_lines - self.__header_complete, 0)
 
     def get_headers(self):
         """
-        Get list of all request headers.
+        Get list of all request headers as (lowercase name, HttpHeader) pairs.
         """
         return self.__header_fields.items()
 
+    def get_raw_header(self):
+        """
+        Get the original header block of the current message (including the
+        first line and the terminating empty line). It is available once the
+        header has been received if keep_raw_header is enabled.
+
+        :returns: bytes or None
+        """
+        return self.__raw_header
+
+    def relay(self, transport, header=None):
+        """
+        Forward the current message to a given transport. The header is
+        written right away and the rest of the message is written exactly as
+        it is received (including the chunked encoding) using slices of the
+        received data, so it is not copied or buffered by the reader (except
+        of buffered readers, their read buffer is reused for the next read). Relayed
+        body data is not passed to body_data_received(), message_end_received()
+        is still called. The method can be called once the header has been
+        received (e.g. from header_received()).
+
+        :param transport: target transport
+        :type transport: asyncio.WriteTransport
+        :param header: header to be written instead of the original one (e.g. result of splice_header()), a list of
+            bytes-like objects
+        :type header: list
+        """
+        if not self.__header_complete:
+            raise ValueError("message header has not been received yet")
+        if header is None:
+            if self.__raw_header is None:
+                raise ValueError("raw header is not available (keep_raw_header is disabled)")
+            header = (self.__raw_header,)
+        transport.writelines(header)
+        self.__relay = transport
+
+    def start_tunnel(self):
+        """
+        Switch the connection to the tunnel mode once the current message
+        ends (or right away if no message is being received). All data after
+        the message are passed to tunnel_data_received() without any
+        processing. The tunnel mode cannot be left.
+        """
+        if self.is_message_start():
+            self.__tunnel = True
+        else:
+            self.__tunnel_pending = True
+
+    def is_tunnel(self):
+        """
+        Check if the connection has been switched to the tunnel mode.
+        """
+        return self.__tunnel
+
+    def switches_protocol(self):
+        """
+        Check if the current message switches the connection to another
+        protocol (see start_tunnel()). It is called at the message end.
+        """
+        return False
+
+    def get_trailers(self):
+        """
+        Get list of all trailer fields of the current chunked message as
+        (lowercase name, HttpHeader) pairs. The trailer is complete when
+        message_end_received() is called.
+        """
+        if self.__trailer_fields is None:
+            return []
+        return self.__trailer_fields.items()
+
+    def get_transfer_encoding(self):
+        """
+        Get lowercase value of the Transfer-Encoding header field of the
+        current message (None if the field is not present). The value is
+        available once the header has been received.
+        """
+        return self.__transfer_encoding
+
+    def get_connection(self):
+        """
+        Get lowercase value of the Connection header field of the current
+        message (None if the field is not present). The value is available
+        once the header has been received.
+        """
+        return self.__connection
+
     def is_persistent(self):
         """
         Check if this is a persistent connection (i.e. the Connection: close
         header is NOT present).
         """
-        connection = self.get_header(b"connection")
-        if not connection:
-            return True
-        connection = connection.value.lower()
-        return connection != b"close"
+        return self.__connection != b"close"
 
     def has_body(self):
         """
@@ -223,20 +1063,142 @@ class HttpLikeMessageReader(LineReader):
         """
         Get content length. None is returned if the header field is not present.
         In such case, the body length should be determined either by the chunked encoding or by closing the connection.
+        The value is available once the header has been received. ValueError is raised if the value is invalid.
         """
-        clength = self.get_header(b"content-length")
-        if not clength:
-            return None
-        return int(clength.value)
+        clength = self.__content_length
+        if clength is not None and clength < 0:
+            raise ValueError("invalid content length")
+        return clength
+
+    def connection_lost(self, exc):
+        self.__cancel_timers()
+        super().connection_lost(exc)
 
     def data_received(self, data):
         try:
+            if self.__tunnel:
+                self.tunnel_data_received(data)
+                return
             super().data_received(data)
         except Exception as ex:
             self.internal_error(str(ex))
+        if self.__timer_wheel is not None:
+            self.__received += len(data)
+            self.__update_timers()
+
+    def __update_timers(self):
+        """
+        Start the budget timers if a message is being received.
+        """
+        if self.__discard or self.is_message_start():
+            return
+        if self.__header_timeout is not None and self.__header_timer is None and not self.__header_complete:
+            self.__header_timer = self.__timer_wheel.schedule(self.__header_timeout, self.__header_timeout_expired)
+        if self.__min_data_rate is not None and self.__rate_timer is None:
+            self.__rate_start = self.__received
+            self.__rate_timer = self.__timer_wheel.schedule(self.__rate_window, self.__check_data_rate)
+
+    def __cancel_timers(self):
+        """
+        Cancel the budget timers.
+        """
+        if self.__header_timer is not None:
+            self.__header_timer.cancel()
+            self.__header_timer = None
+        if self.__rate_timer is not None:
+            self.__rate_timer.cancel()
+            self.__rate_timer = None
+
+    def __header_timeout_expired(self):
+        self.__header_timer = None
+        self.__time_budget_exceeded('header timeout exceeded')
+
+    def __check_data_rate(self):
+        """
+        Check the data rate of the current message.
+        """
+        self.__rate_timer = None
+        if self.__discard or self.is_message_start():
+            return
+        received = self.__received - self.__rate_start
+        # reading may be paused by the application (see set_body_buffer_limits())
+        if received < self.__min_data_rate * self.__rate_window and not self.is_reading_paused():
+            self.__time_budget_exceeded('minimum data rate not reached')
+        else:
+            self.__rate_start = self.__received
+            self.__rate_timer = self.__timer_wheel.schedule(self.__rate_window, self.__check_data_rate)
+
+    def __time_budget_exceeded(self, msg):
+        """
+        Report a given time budget violation and close the connection.
+        """
+        self.__discard_rest()
+        self.parse_error(msg)
+        self.close_connection()
+
+    def eof_received(self):
+        """
+        Handle end of the incoming stream. A body delimited by closing the
+        connection is completed, any other incomplete message is reported as
+        a parse error.
+        """
+        if self.__discard or self.__tunnel:
+            return
+        if self.__expected is None:
+            self.__message_end()
+        elif not self.is_message_start():
+            self.parse_error('incomplete message')
+
+    def is_message_start(self):
+        """
+        Check if the reader expects beginning of a new message (i.e. no part
+        of the next message has been received yet).
+        """
+        return self.__header_lines == 0 and self.get_buffered_length() == 0
+
+    def is_discarding(self):
+        """
+        Check if all remaining data is discarded, i.e. the message boundaries
+        are unknown after a fatal parse error. The flag is already set when
+        parse_error() reporting the error is called.
+        """
+        return self.__discard
+
+    def process_data(self, data):
+        if self.__tunnel:
+            # the rest of the data received together with the last message
+            if not self.is_zero_copy():
+                data = bytes(data)
+            self.tunnel_data_received(data)
+            return len(data)
+        if self.__discard:
+            # the message boundaries are unknown, nothing may be parsed anymore
+            return len(data)
+        if self.__chunk_state is not None:
+            if self.__relay is not None:
+                return self.__relay_chunks(data)
+            return self.__decode_chunks(data)
+        if self.__relay is not None and self.is_raw_mode():
+            # relayed data is written directly, it does not have to be copied
+            return self.raw_data_received(data)
+        # pass only the expected part of the body to the raw mode, so that
+        # the rest of the data is not copied
+        expected = self.__expected
+        if expected and len(data) > expected:
+            return super().process_data(data[:expected])
+        # parse the whole header block at once if it is already available
+        if self.is_message_start():
+            m = self.header_end_re.search(data)
+            if m is not None:
+                if self.keep_raw_header:
+                    self.__raw_header = bytes(data[:m.end()])
+                if self.__process_header_block(data[:m.start()]):
+                    return m.end()
+                self.__raw_header = None
+        return super().process_data(data)
 
     def line_received(self, line):
-        self.__process_line(line)
+        self.__process_header_line(line)
 
     def line_length_exceeded(self):
         self.parse_error('line length exceeded')
@@ -247,6 +1209,22 @@ class HttpLikeMessageReader(LineReader):
         """
         self.__header_lines += 1
 
+        if self.keep_raw_header:
+            buffer = self.__raw_header_buffer
+            if buffer is None:
+                buffer = self.__raw_header_buffer = bytearray()
+            buffer += line
+            buffer += b"\r\n"
+            if not line and self.__header_lines > 1:
+                self.__raw_header = bytes(buffer)
+                self.__raw_header_buffer = None
+
+        if self.__max_header_size is not None:
+            self.__header_size += len(line) + 2
+            if self.__header_size > self.__max_header_size:
+                self.__discard_body('max header size exceeded')
+                return
+
         if self.__header_lines == 1:
             self.first_line_received(line)
         elif len(line) == 0:
@@ -254,33 +1232,199 @@ class HttpLikeMessageReader(LineReader):
         else:
             self.__header_line_received(line)
 
+    def __process_header_block(self, block):
+        """
+        Process a given complete header block (without the terminating empty
+        line) in a single pass. The block is not processed if it contains a
+        line longer than the line length limit. Such blocks must be processed
+        line by line in order to report the error.
+
+        :param block: header block
+        :type block: bytes or memoryview
+        :returns: True if the block has been processed, False otherwise
+        """
+        if self.__max_header_size is not None and len(block) + 4 > self.__max_header_size:
+            self.__discard_body('max header size exceeded')
+            return True
+
+        limit = self.__max_line_length - 2
+        lines = bytes(block).split(b"\r\n")
+        if len(block) > limit and max(map(len, lines)) > limit:
+            return False
+
+        self.__header_lines = len(lines) + 1
+        self.first_line_received(lines[0])
+
+        max_fields = self.__max_header_fields
+        max_continuations = self.__max_continuation_lines
+        fields = []
+        last = None
+        continuations = 0
+
+        for line in lines[1:]:
+            if line[0] in b" \t":
+                continuations += 1
+                if max_continuations is not None and continuations > max_continuations:
+                    self.__discard_body('max continuation lines exceeded')
+                    return True
+                if last:
+                    last.value += line.strip()
+                else:
+                    self.parse_error('first header field cannot be a continuation')
+                continue
+
+            continuations = 0
+
+            name, sep, value = line.partition(b":")
+            if not sep:
+                self.parse_error('header field line does not contain ":"')
+            elif len(fields) < max_fields:
+                last = HeaderField(name.strip(), value.strip())
+                fields.append(last)
+            else:
+                self.parse_error('max header fields exceeded')
+
+        self.__header_fields.extend(fields)
+        self.__last_header_field = last
+        self.__header_end_received()
+
+        return True
+
     def __header_line_received(self, line):
         """
         Handle a given header line.
         """
         if line[0] in b" \t":
-            if self.__last_header_field:
+            self.__continuation_lines += 1
+            if self.__max_continuation_lines is not None \
+                    and self.__continuation_lines > self.__max_continuation_lines:
+                self.__discard_body('max continuation lines exceeded')
+            elif self.__last_header_field:
                 self.__last_header_field.value += line.strip()
             else:
                 self.parse_error('first header field cannot be a continuation')
         else:
+            self.__continuation_lines = 0
             self.__header_field_received(line)
 
     def __header_end_received(self):
         """
         Handle header end.
         """
+        self.__header_complete = True
+        if self.__header_timer is not None:
+            self.__header_timer.cancel()
+            self.__header_timer = None
+
+        if not self.__framing_fields_received():
+            # the peers could disagree on the message boundaries
+            self.__discard_body('conflicting content length')
+            return
+
         self.header_received()
+
+        if self.__decoding is not None:
+            self.__start_content_decoding()
+
+        if self.__batch is not None:
+            first_line = {name: getattr(self, name, None) for name in self.first_line_re.groupindex}
+            self.__batch_message = Message(first_line, self.__header_fields)
+            self.__batch_body = []
+            self.__header_fields_taken = True
+
         if not self.has_body():
-            self.reset()
+            self.__message_end()
         elif self.is_chunked():
-            self.__process_line = self.__process_chunk_size
+            # the chunked body is decoded directly from the received data
+            self.__chunk_state = CHUNK_SIZE
+            self.__chunk_remaining = 0
+            self.stop_line_scan()
         else:
             try:
-                self.__expected = self.get_content_length()
-                self.set_raw_mode(True)
+                expected = self.get_content_length()
             except ValueError:
                 self.parse_error('unable to decode content length')
+                return
+            if expected is not None and self.__max_body_size is not None and expected > self.__max_body_size:
+                self.__discard_body('max body size exceeded')
+            # complete empty messages right away, there is no need to wait for more data
+            elif expected == 0:
+                self.__message_end()
+            else:
+                self.__expected = expected
+                self.set_raw_mode(True)
+
+    def __framing_fields_received(self):
+        """
+        Decode header fields determining the message framing.
+
+        :returns: False if the message has conflicting Content-Length fields, True otherwise
+        """
+        fields = self.__header_fields
+
+        field = fields.get(b"content-length")
+        if field is not None:
+            value = field.value.strip()
+            for other in fields.get_all(b"content-length"):
+                if other.value.strip() != value:
+                    return False
+            try:
+                clength = int(field.value)
+            except ValueError:
+                clength = -1
+            self.__content_length = clength if clength >= 0 else -1
+
+        field = fields.get(b"transfer-encoding")
+        if field is not None:
+            self.__transfer_encoding = field.value.lower()
+
+        field = fields.get(b"connection")
+        if field is not None:
+            self.__connection = field.value.lower()
+
+        return True
+
+    def __start_content_decoding(self):
+        """
+        Create a decoder of the current message body if it is encoded.
+        """
+        field = self.__header_fields.get(b"content-encoding")
+        if field is None:
+            return
+        codings = parse_content_encoding(field.value)
+        if not codings:
+            return
+        max_size, window = self.__decoding
+        try:
+            self.__content_decoder = ContentDecoder(codings, self.decoded_body_data_received, max_size, window)
+        except ValueError as ex:
+            self.parse_error(str(ex))
+
+    def __message_end(self):
+        """
+        Handle message end.
+        """
+        decoder = self.__content_decoder
+        if decoder is not None:
+            self.__content_decoder = None
+            error = decoder.flush()
+            if error is not None:
+                self.parse_error(error)
+
+        self.message_end_received()
+
+        message = self.__batch_message
+        if message is not None:
+            self.__batch_message = None
+            if self.__batch is not None:
+                message.body = b"".join(self.__batch_body)
+                self.__batch.append(message)
+            self.__batch_body = None
+
+        if self.__tunnel_pending or self.switches_protocol():
+            self.__tunnel = True
+
+        self.reset()
 
     def __header_field_received(self, field):
         """
@@ -291,76 +1435,293 @@ class HttpLikeMessageReader(LineReader):
             if len(self.__header_fields) < self.__max_header_fields:
                 name = field[:pos].strip()
                 value = field[pos + 1:].strip()
-                header = HeaderField(name, value)
-                name = name.lower()
-                self.__header_fields[name] = header
-                self.__last_header_field = header
+                self.__last_header_field = self.__header_fields.append(name, value)
             else:
                 self.parse_error('max header fields exceeded')
         else:
             self.parse_error('header field line does not contain ":"')
 
-    def __process_chunk_size(self, line):
+    def __decode_chunks(self, data):
+        """
+        Decode a given part of a chunked body. Chunk size lines, chunk data,
+        chunk ends and trailer lines are processed in a single pass over the
+        data. Unless the zero-copy mode is enabled, payloads of all chunks
+        found in the data are passed to body_data_received() together (up to
+        chunk_coalesce_limit bytes).
+
+        :param data: received data
+        :type data: memoryview
+        :returns: number of consumed bytes
+        """
+        zero_copy = self.is_zero_copy()
+        relay = self.__relay
+        limit = self.chunk_coalesce_limit
+        state = self.__chunk_state
+        remaining = self.__chunk_remaining
+        parts = []
+        collected = 0
+        pos = 0
+        end = len(data)
+
+        while pos < end:
+            if state == CHUNK_DATA:
+                size = end - pos
+                if size > remaining:
+                    size = remaining
+                # relayed chunks are written by __relay_chunks()
+                if relay is None:
+                    part = data[pos:pos + size]
+                    if zero_copy:
+                        self.__body_received(part)
+                    else:
+                        parts.append(part)
+                        collected += size
+                        if collected >= limit:
+                            self.__flush_chunks(parts)
+                            collected = 0
+                pos += size
+                remaining -= size
+                if remaining > 0:
+                    break
+                state = CHUNK_DATA_END
+                continue
+
+            line, next_pos = self.__take_chunk_line(data, pos)
+            if next_pos is None:
+                self.__flush_chunks(parts)
+                self.line_length_exceeded()
+                self.__discard_rest()
+                return pos
+            pos = next_pos
+            if line is None:
+                break
+
+            if state == CHUNK_SIZE:
+                size, error = self.__parse_chunk_size(line)
+                if error is not None:
+                    self.__flush_chunks(parts)
+                    self.__discard_body(error)
+                    return pos
+                elif size > 0:
+                    self.__body_size += size
+                    remaining = size
+                    state = CHUNK_DATA
+                else:
+                    self.__flush_chunks(parts)
+                    state = CHUNK_TRAILER
+            elif state == CHUNK_DATA_END:
+                if line:
+                    self.__flush_chunks(parts)
+                    self.__discard_body('non-empty line after chunk data')
+                    return pos
+                state = CHUNK_SIZE
+            elif line:
+                self.__trailer_line_received(line)
+            else:
+                self.__flush_chunks(parts)
+                if relay is not None:
+                    self.__relay_write(data[:pos])
+                self.__message_end()
+                return pos
+
+        self.__chunk_state = state
+        self.__chunk_remaining = remaining
+        self.__flush_chunks(parts)
+        return pos
+
+    def __relay_chunks(self, data):
+        """
+        Relay a given part of a chunked body. The body is decoded only to
+        find its end.
+
+        :param data: received data
+        :type data: memoryview
+        :returns: number of consumed bytes
+        """
+        relay = self.__relay
+        consumed = self.__decode_chunks(data)
+        # the end of the body is written before the message end is reported
+        if self.__relay is relay:
+            self.__relay_write(data[:consumed])
+        return consumed
+
+    def __relay_write(self, data):
+        """
+        Write a given piece of the relayed message. Transports may queue the
+        data without copying, so views of a reused read buffer are copied.
         """
-        Process a given message line containing the current chunk size.
+        if self.reuses_read_buffer:
+            data = bytes(data)
+        self.__relay.write(data)
+
+    def __take_chunk_line(self, data, pos):
+        """
+        Take a complete line of a chunked body starting at a given position.
+        An incomplete line is stored in the chunk line buffer.
+
+        :returns: tuple (line or None, new position or None if the line is too long)
+        """
+        buffer = self.__chunk_line
+        if buffer and buffer[-1] == 0x0d and data[pos] == 0x0a:
+            line = bytes(buffer[:-1])
+            self.__chunk_line = None
+            return line, pos + 1
+
+        m = CRLF_RE.search(data, pos)
+        end = len(data) if m is None else m.start()
+
+        if (len(buffer) if buffer else 0) + end - pos > self.__max_line_length:
+            return None, None
+
+        if m is None:
+            if buffer:
+                buffer += data[pos:]
+            elif end > pos:
+                self.__chunk_line = bytearray(data[pos:])
+            return None, end
+
+        if buffer:
+            buffer += data[pos:end]
+            line = bytes(buffer)
+            self.__chunk_line = None
+        else:
+            line = bytes(data[pos:end])
+        return line, m.end()
+
+    def __parse_chunk_size(self, line):
+        """
+        Parse a given chunk size line (chunk extensions are ignored) and
+        check the size limits.
+
+        :returns: tuple (chunk size, error message or None)
         """
         ext = line.find(b";")
         if ext >= 0:
             line = line[:ext]
+        line = line.strip()
 
-        try:
-            self.__expected = int(line, 16)
-        except ValueError:
-            self.parse_error('unable to decode chunk size')
+        if CHUNK_SIZE_RE.fullmatch(line) is None:
+            return None, 'unable to decode chunk size'
 
-        if self.__expected > 0:
-            self.set_raw_mode(True)
-        else:
-            self.__process_line = self.__process_trailer
+        size = int(line, 16)
+
+        if self.__max_chunk_size is not None and size > self.__max_chunk_size:
+            return size, 'max chunk size exceeded'
+        elif self.__max_body_size is not None and self.__body_size + size > self.__max_body_size:
+            return size, 'max body size exceeded'
 
-    def __process_chunk_end(self, line):
+        return size, None
+
+    def __trailer_line_received(self, line):
         """
-        Process a given chunk end.
+        Process a given trailer line.
         """
-        if len(line) > 0:
-            self.parse_error('non-empty line after chunk data')
+        if self.__trailer_fields is None:
+            self.__trailer_fields = HeaderFields()
+            self.__last_header_field = None
+
+        if line[0] in b" \t":
+            if self.__last_header_field:
+                self.__last_header_field.value += line.strip()
+            else:
+                self.parse_error('first trailer field cannot be a continuation')
+            return
+
+        pos = line.find(b":")
+        if pos < 0:
+            self.parse_error('trailer field line does not contain ":"')
+        elif len(self.__trailer_fields) < self.__max_header_fields:
+            name = line[:pos].strip()
+            value = line[pos + 1:].strip()
+            self.__last_header_field = self.__trailer_fields.append(name, value)
         else:
-            self.__process_line = self.__process_chunk_size
+            self.parse_error('max trailer fields exceeded')
 
-    def __process_trailer(self, line):
+    def __flush_chunks(self, parts):
         """
-        Process a given chunk trailer (we ignore all trailer lines).
+        Pass given chunk payloads to body_data_received() as a single piece.
+        """
+        if len(parts) == 1:
+            self.__body_received(bytes(parts[0]))
+        elif parts:
+            self.__body_received(b"".join(parts))
+        parts.clear()
+
+    def __body_received(self, data):
         """
-        if len(line) > 0:
+        Pass a given piece of body to the application (or to the relay
+        target).
+        """
+        if self.__relay is not None:
+            self.__relay_write(data)
             return
-        self.message_end_received()
-        self.reset()
+
+        self.body_data_received(data)
+
+        if self.__body_high_water is not None:
+            self.__body_pending += len(data)
+            if self.__body_pending >= self.__body_high_water:
+                self.pause_reading()
+
+        if self.__batch_message is not None:
+            self.__batch_body.append(bytes(data))
+
+        decoder = self.__content_decoder
+        if decoder is not None:
+            error = decoder.feed(data)
+            if error is not None:
+                self.__content_decoder = None
+                self.parse_error(error)
+
+    def __discard_body(self, msg):
+        """
+        Report a given body error and discard all remaining data (the message
+        boundaries are unknown from now on).
+
+        :param msg: error message
+        :type msg: str
+        """
+        self.__discard_rest()
+        self.parse_error(msg)
+
+    def __discard_rest(self):
+        """
+        Discard all remaining data.
+        """
+        self.__discard = True
+        self.__expected = None
+        self.__chunk_state = None
+        self.__cancel_timers()
+        self.set_raw_mode(True)
 
     def raw_data_received(self, data):
         """
         Process received raw data (HTTP message body or chunk).
 
         :param data: received data
-        :type data: bytes
+        :type data: bytes or memoryview
         :returns: number of consumed bytes
         """
+        if self.__discard:
+            return len(data)
+
         consume = self.__expected
         if consume is None or consume > len(data):
             consume = len(data)
         if self.__expected is not None:
             self.__expected -= consume
+        elif self.__max_body_size is not None and self.__body_size + consume > self.__max_body_size:
+            self.__discard_body('max body size exceeded')
+            return len(data)
+
+        self.__body_size += consume
 
-        self.body_data_received(data[:consume])
+        self.__body_received(data[:consume])
 
         if self.__expected is None or self.__expected > 0:
             return len(data)
 
-        if self.is_chunked():
-            self.__process_line = self.__process_chunk_end
-            self.set_raw_mode(False)
-        else:
-            self.message_end_received()
-            self.reset()
+        self.__message_end()
 
         return consume
 
@@ -378,7 +1739,8 @@ class HttpLikeMessageReader(LineReader):
         m = self.first_line_re.match(line)
         if m:
             for name, value in m.groupdict().items():
-                if name == 'status_code':
+                # optional groups (e.g. of a request or response line) may not match
+                if name == 'status_code' and value is not None:
                     value = int(value)
                 setattr(self, name, value)
         else:
@@ -394,14 +1756,40 @@ class HttpLikeMessageReader(LineReader):
         """
         This method is called whenever a new piece of body data is received.
 
+        In the zero-copy mode, the data is a memoryview into the buffer passed
+        to data_received(). The view is valid only until this method returns,
+        use bytes(data) to keep the data for later.
+
         :param data: data
-        :type data: bytes
+        :type data: bytes or memoryview
         """
         return
 
     def message_end_received(self):
         """
-        Message end indicator.
+        Message end indicator. It is called for every message including
+        messages without body.
+        """
+        return
+
+    def decoded_body_data_received(self, data):
+        """
+        This method is called for every piece of decoded body data if the
+        content decoding is enabled (see set_content_decoding()).
+
+        :param data: decoded data
+        :type data: bytes
+        """
+        return
+
+    def tunnel_data_received(self, data):
+        """
+        This method is called for all data received in the tunnel mode (see
+        start_tunnel()). In the zero-copy mode, the data may be a memoryview
+        valid only until this method returns.
+
+        :param data: data
+        :type data: bytes or memoryview
         """
         return
 
@@ -435,42 +1823,128 @@ class HttpLikeRequestReader(HttpLikeMessageReader):
     HTTP like request reader protocol.
     """
 
-    def __init__(self, max_headers=512, max_line_length=8192):
+    __slots__ = ('version', 'method', '__url')
+
+    def __init__(self, max_headers=512, max_line_length=8192, zero_copy=False, max_body_size=None,
+                 max_chunk_size=None, max_header_size=None, max_continuation_lines=None):
         """
         Create a new HTTP request reader.
         """
-        super().__init__(max_headers, max_line_length)
+        super().__init__(max_headers, max_line_length, zero_copy, max_body_size, max_chunk_size, max_header_size,
+                         max_continuation_lines)
 
         self.version = None
         self.method = None
         self.url = None
 
+    @property
+    def url(self):
+        """
+        Request URL (decoded on the first access).
+        """
+        url = self.__url
+        if isinstance(url, bytes):
+            url = self.__url = url.decode('utf-8', 'replace')
+        return url
+
+    @url.setter
+    def url(self, url):
+        self.__url = url
+
     def get_content_length(self):
         clength = super().get_content_length()
         return clength or 0
 
+    def recycle(self):
+        super().recycle()
+        self.version = None
+        self.method = None
+        self.url = None
+
+    def first_line_received(self, line):
+        # use the regex only for lines not accepted by the fast parser
+        # (it may still accept some unusual ones)
+        if self.first_line_protocol is not None and line.isascii():
+            parts = line.split(b" ")
+            if len(parts) == 3 and len(line.translate(None, WHITESPACE)) == len(line) - 2:
+                method, url, protocol = parts
+                version = self.first_line_versions.get(protocol)
+                if method and version:
+                    self.method = method.decode('ascii')
+                    self.url = url
+                    self.version = version
+                    return
+        super().first_line_received(line)
+
 
 class HttpLikeResponseReader(HttpLikeMessageReader):
     """
     HTTP like response reader protocol.
     """
 
-    def __init__(self, max_headers=512, max_line_length=8192):
+    __slots__ = ('version', 'status_code', '__reason_phrase', '__request_queue')
+
+    def __init__(self, max_headers=512, max_line_length=8192, zero_copy=False, max_body_size=None,
+                 max_chunk_size=None, max_header_size=None, max_continuation_lines=None):
         """
         Create a new HTTP like response reader.
         """
-        super().__init__(max_headers, max_line_length)
+        super().__init__(max_headers, max_line_length, zero_copy, max_body_size, max_chunk_size, max_header_size,
+                         max_continuation_lines)
 
         self.version = None
         self.status_code = None
         self.reason_phrase = None
 
-        self.__request_queue = deque()
+        # methods of the requests waiting for a response (created on the first push_request() call)
+        self.__request_queue = None
+
+    @property
+    def reason_phrase(self):
+        """
+        Response reason phrase (decoded on the first access).
+        """
+        reason_phrase = self.__reason_phrase
+        if isinstance(reason_phrase, bytes):
+            reason_phrase = self.__reason_phrase = reason_phrase.decode('utf-8', 'replace')
+        return reason_phrase
+
+    @reason_phrase.setter
+    def reason_phrase(self, reason_phrase):
+        self.__reason_phrase = reason_phrase
+
+    def first_line_received(self, line):
+        # use the regex only for lines not accepted by the fast parser
+        # (it may still accept some unusual ones)
+        if self.first_line_protocol is not None:
+            parts = line.split(b" ", 2)
+            if len(parts) == 3:
+                protocol, status_code, reason_phrase = parts
+                version = self.first_line_versions.get(protocol)
+                if (version
+                        and len(status_code) == 3
+                        and status_code.isdigit()
+                        and b"\n" not in reason_phrase):
+                    self.version = version
+                    self.status_code = int(status_code)
+                    self.reason_phrase = reason_phrase
+                    return
+        super().first_line_received(line)
 
     def reset(self):
         super().reset()
-        if self.__request_queue:
-            self.__request_queue.popleft()
+        queue = self.__request_queue
+        if queue:
+            queue.popleft()
+            if not queue:
+                self.__request_queue = None
+        self.version = None
+        self.status_code = None
+        self.reason_phrase = None
+
+    def recycle(self):
+        super().recycle()
+        self.__request_queue = None
         self.version = None
         self.status_code = None
         self.reason_phrase = None
@@ -482,13 +1956,37 @@ class HttpLikeResponseReader(HttpLikeMessageReader):
         :param method: request method (e.g. GET, POST, HEAD, etc.)
         :type method: str
         """
+        if self.__request_queue is None:
+            self.__request_queue = deque()
         self.__request_queue.append(method.upper())
 
+    def get_request_method(self):
+        """
+        Get method of the request the current response belongs to.
+
+        :returns: str or None if it is unknown (see push_request())
+        """
+        if self.__request_queue:
+            return self.__request_queue[0]
+        return None
+
     def has_body(self):
         if self.__request_queue and self.__request_queue[0] == "HEAD":
             return False
+        # a successful CONNECT response is followed by the tunnel
+        if self.__request_queue and self.__request_queue[0] == "CONNECT" and self.status_code \
+                and 200 <= self.status_code < 300:
+            return False
         if self.status_code and 100 <= self.status_code < 200:
             return False
         if self.status_code == 204 or self.status_code == 304:
             return False
         return True
+
+
+class BufferedHttpLikeMessageReader(BufferedLineReader, HttpLikeMessageReader):
+    """
+    HTTP like message reader protocol based on asyncio.BufferedProtocol.
+    """
+
+    __slots__ = ()
@@ -0,0 +1,548 @@
+"""
+Offline re-parser of recorded HTTP/RTSP streams.
+
+The input is either a set of stream files (each containing one direction of
+a single TCP connection) or pcap captures, TCP connections of which are
+reassembled. The files are memory-mapped, so they are never loaded into
+memory, and the streams are parsed in parallel by a pool of processes. A
+summary of every message (first line, header fields, body size and parse
+errors) is written as a JSON line:
+
+    python -m protocolparser.replay --reader rtsp-response -o out.jsonl stream1.bin stream2.bin
+    python -m protocolparser.replay --pcap --protocol rtsp -j 8 -o out.jsonl capture.pcap
+
+Every stream is finished by a summary record containing the number of bytes,
+messages and interleaved frames. A single stream is always parsed by a
+single process.
+"""
+
+import argparse
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from .http import HttpRequestReader, HttpResponseReader
+from .rtsp import RtspRequestReader, RtspResponseReader
+
+READERS = {
+    'http-request': HttpRequestReader,
+    'http-response': HttpResponseReader,
+    'rtsp-request': RtspRequestReader,
+    'rtsp-response': RtspResponseReader,
+}
+
+# well-known server ports used to guess direction of connections without a
+# captured SYN
+SERVER_PORTS = {80, 554, 8000, 8080, 8554}
+
+# size of data passed to a single data_received() call
+BLOCK_SIZE = 1 << 20
+
+PCAP_HEADER = struct.Struct("<IHHiIII")
+PCAP_RECORD = struct.Struct("<IIII")
+ETHERNET_HEADER = struct.Struct("!6s6sH")
+IPV4_HEADER = struct.Struct("!BBHHHBBH4s4s")
+IPV6_HEADER = struct.Struct("!IHBB16s16s")
+TCP_HEADER = struct.Struct("!HHIIBB")
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_ACK = 0x10
+
+
+class SummaryMixin:
+    """
+    Reader mixin collecting message summaries (body data are only counted,
+    so the reader can be used in the zero-copy mode).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.records = []
+        self.messages = 0
+        self.interleaved_frames = 0
+        self.interleaved_bytes = 0
+
+        self.__record = None
+
+    def __current_record(self):
+        if self.__record is None:
+            self.__record = {'first_line': None, 'headers': [], 'body_size': 0, 'errors': []}
+        return self.__record
+
+    def first_line_received(self, line):
+        self.__current_record()['first_line'] = line.decode('utf-8', 'replace')
+        super().first_line_received(line)
+
+    def header_received(self):
+        headers = [[f.name.decode('latin-1'), f.value.decode('latin-1')] for _, f in self.get_headers()]
+        self.__current_record()['headers'] = headers
+
+    def body_data_received(self, data):
+        self.__current_record()['body_size'] += len(data)
+
+    def message_end_received(self):
+        record = self.__current_record()
+        trailers = self.get_trailers()
+        if trailers:
+            record['trailers'] = [[f.name.decode('latin-1'), f.value.decode('latin-1')] for _, f in trailers]
+        self.records.append(record)
+        self.messages += 1
+        self.__record = None
+
+    def interleaved_data_received(self, channel, data):
+        self.interleaved_frames += 1
+        self.interleaved_bytes += len(data)
+
+    def parse_error(self, msg):
+        self.__current_record()['errors'].append(msg)
+
+    def internal_error(self, msg):
+        self.__current_record()['errors'].append('internal error: ' + msg)
+
+    def finish(self):
+        """
+        Signal end of the stream and take the incomplete message (if any).
+        """
+        self.eof_received()
+        if self.__record is not None:
+            self.__record['incomplete'] = True
+            self.records.append(self.__record)
+            self.__record = None
+
+
+# summary reader classes created for the given reader classes
+_summary_classes = {}
+
+
+def summary_reader(reader_class):
+    """
+    Create a new summary reader for a given reader class.
+    """
+    cls = _summary_classes.get(reader_class)
+    if cls is None:
+        cls = type(reader_class.__name__, (SummaryMixin, reader_class), {})
+        _summary_classes[reader_class] = cls
+    return cls(zero_copy=True)
+
+
+class StreamWriter:
+    """
+    Writer of JSON lines describing a single stream.
+    """
+
+    def __init__(self, output, stream, methods=None):
+        """
+        :param output: text output
+        :param stream: stream name
+        :type stream: str
+        :param methods: list collecting request methods (or None)
+        :type methods: list
+        """
+        self.output = output
+        self.stream = stream
+        self.methods = methods
+        self.index = 0
+
+    def write_records(self, reader):
+        """
+        Write all collected records of a given reader.
+        """
+        for record in reader.records:
+            if self.methods is not None and record['first_line']:
+                self.methods.append(record['first_line'].split(' ', 1)[0])
+            record['stream'] = self.stream
+            record['message'] = self.index
+            self.index += 1
+            self.output.write(json.dumps(record, separators=(',', ':')))
+            self.output.write('\n')
+        reader.records.clear()
+
+    def write_error(self, msg):
+        self.output.write(json.dumps({'stream': self.stream, 'errors': [msg]}, separators=(',', ':')))
+        self.output.write('\n')
+
+    def write_summary(self, reader, size):
+        summary = {
+            'stream': self.stream,
+            'summary': True,
+            'bytes': size,
+            'messages': reader.messages,
+            'interleaved_frames': reader.interleaved_frames,
+            'interleaved_bytes': reader.interleaved_bytes,
+        }
+        self.output.write(json.dumps(summary, separators=(',', ':')))
+        self.output.write('\n')
+
+
+def replay_file(path, reader_name, output):
+    """
+    Parse a given stream file.
+
+    :param path: stream file path
+    :type path: str
+    :param reader_name: reader name (see READERS)
+    :type reader_name: str
+    :param output: text output
+    """
+    reader = summary_reader(READERS[reader_name])
+    writer = StreamWriter(output, path)
+    size = os.path.getsize(path)
+
+    if size > 0:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with memoryview(mm) as view:
+                for offset in range(0, size, BLOCK_SIZE):
+                    block = view[offset:offset + BLOCK_SIZE]
+                    reader.data_received(block)
+                    block.release()
+                    writer.write_records(reader)
+
+    reader.finish()
+    writer.write_records(reader)
+    writer.write_summary(reader, size)
+    return reader
+
+
+def replay_segments(view, segments, reader, writer):
+    """
+    Parse a TCP stream given by a list of captured segments.
+
+    :param view: memoryview of the capture
+    :type view: memoryview
+    :param segments: sequence numbers (relative to the initial sequence number), capture offsets and lengths
+    :type segments: tuple
+    :param reader: summary reader
+    :param writer: stream writer
+    :returns: number of stream bytes
+    """
+    seqs, offsets, lengths = segments
+    order = range(len(seqs))
+    if any(seqs[i] > seqs[i + 1] for i in range(len(seqs) - 1)):
+        order = sorted(order, key=seqs.__getitem__)
+
+    expected = 0
+    for i in order:
+        seq = seqs[i]
+        end = seq + lengths[i]
+        if end <= expected:
+            # retransmission
+            continue
+        if seq > expected:
+            writer.write_error('missing %d bytes at stream offset %d' % (seq - expected, expected))
+            skip = 0
+        else:
+            skip = expected - seq
+        block = view[offsets[i] + skip:offsets[i] + lengths[i]]
+        reader.data_received(block)
+        block.release()
+        expected = end
+        if len(reader.records) > 1000:
+            writer.write_records(reader)
+
+    return expected
+
+
+def replay_connection(path, protocol, name, client, server, output):
+    """
+    Parse both directions of a captured TCP connection. Requests are parsed
+    first, so that the response reader knows methods of the requests.
+
+    :param path: pcap file path
+    :type path: str
+    :param protocol: protocol name (http or rtsp)
+    :type protocol: str
+    :param name: connection name
+    :type name: str
+    :param client: client to server segments (or None)
+    :param server: server to client segments (or None)
+    :param output: text output
+    """
+    methods = []
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        with memoryview(mm) as view:
+            for direction, segments in (('request', client), ('response', server)):
+                if segments is None:
+                    continue
+                reader = summary_reader(READERS['%s-%s' % (protocol, direction)])
+                if direction == 'request':
+                    writer = StreamWriter(output, '%s request' % name, methods)
+                else:
+                    writer = StreamWriter(output, '%s response' % name)
+                    for method in methods:
+                        reader.push_request(method)
+                size = replay_segments(view, segments, reader, writer)
+                reader.finish()
+                writer.write_records(reader)
+                writer.write_summary(reader, size)
+
+
+class PcapError(Exception):
+    pass
+
+
+class Flow:
+    """
+    One direction of a captured TCP connection.
+    """
+
+    __slots__ = ('connection', 'isn', 'last', 'seqs', 'offsets', 'lengths', 'syn', 'syn_ack')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.isn = None
+        self.last = 0
+        # relative sequence numbers, capture offsets and lengths of the payloads
+        self.seqs = array('Q')
+        self.offsets = array('Q')
+        self.lengths = array('I')
+        self.syn = False
+        self.syn_ack = False
+
+    def segments(self):
+        return self.seqs, self.offsets, self.lengths
+
+
+def index_pcap(path):
+    """
+    Find all TCP connections in a given pcap file. Only offsets of the TCP
+    payloads are stored, the payloads are read by the workers.
+
+    :param path: pcap file path
+    :type path: str
+    :returns: list of tuples (connection name, client segments, server segments)
+    """
+    # direction key (src, sport, dst, dport) -> the current Flow
+    flows = {}
+    # list of dicts (direction key -> Flow) in the order of appearance
+    connections = []
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if len(mm) < PCAP_HEADER.size:
+            raise PcapError("file too short")
+        magic = struct.unpack_from("<I", mm, 0)[0]
+        if magic in (0xa1b2c3d4, 0xa1b23c4d):
+            endian = "<"
+        elif magic in (0xd4c3b2a1, 0x4d3cb2a1):
+            endian = ">"
+        else:
+            raise PcapError("unsupported capture format (only pcap is supported)")
+        record = struct.Struct(endian + PCAP_RECORD.format[1:])
+        linktype = struct.unpack_from(endian + "I", mm, 20)[0] & 0x0fffffff
+
+        pos = PCAP_HEADER.size
+        end = len(mm)
+        while pos + record.size <= end:
+            _, _, caplen, _ = record.unpack_from(mm, pos)
+            pos += record.size
+            if pos + caplen > end:
+                break
+            segment = _parse_packet(mm, pos, caplen, linktype)
+            pos += caplen
+            if segment is None:
+                continue
+
+            key, seq, flags, offset, length = segment
+            flow = flows.get(key)
+            # a SYN after some data means that the ports have been reused
+            if flow is None or (flags & TCP_SYN and len(flow.lengths) > 0):
+                reverse = flows.get((key[2], key[3], key[0], key[1]))
+                if reverse is not None and key not in reverse.connection:
+                    connection = reverse.connection
+                else:
+                    connection = {}
+                    connections.append(connection)
+                flow = connection[key] = flows[key] = Flow(connection)
+
+            if flags & TCP_SYN:
+                flow.isn = (seq + 1) & 0xffffffff
+                flow.syn = not flags & TCP_ACK
+                flow.syn_ack = bool(flags & TCP_ACK)
+                continue
+            if length == 0:
+                continue
+            if flow.isn is None:
+                flow.isn = seq
+            flow.last = _unwrap((seq - flow.isn) & 0xffffffff, flow.last)
+            flow.seqs.append(flow.last)
+            flow.offsets.append(offset)
+            flow.lengths.append(length)
+
+    result = []
+    for connection in connections:
+        keys = list(connection)
+        client = keys[0]
+        for key, flow in connection.items():
+            if flow.syn:
+                client = key
+                break
+        else:
+            if connection[client].syn_ack:
+                client = keys[-1]
+            elif client[3] not in SERVER_PORTS and client[1] in SERVER_PORTS:
+                client = (client[2], client[3], client[0], client[1])
+        server = (client[2], client[3], client[0], client[1])
+        name = "%s:%d-%s:%d" % (_address(client[0]), client[1], _address(client[2]), client[3])
+        client = connection.get(client)
+        server = connection.get(server)
+        result.append((name, client and client.segments(), server and server.segments()))
+    return result
+
+
+def _unwrap(rel, last):
+    """
+    Get a 64-bit relative sequence number closest to the last one.
+    """
+    base = last & ~0xffffffff
+    candidates = (base - 0x100000000 + rel, base + rel, base + 0x100000000 + rel)
+    return min((c for c in candidates if c >= 0), key=lambda c: abs(c - last))
+
+
+def _address(address):
+    if len(address) == 4:
+        return ".".join(str(b) for b in address)
+    return "[%s]" % ":".join("%x" % v for v in struct.unpack("!8H", address))
+
+
+def _parse_packet(data, pos, length, linktype):
+    """
+    Parse a captured packet.
+
+    :returns: tuple (direction key, sequence number, TCP flags, payload offset, payload length) or None
+    """
+    end = pos + length
+    if linktype == LINKTYPE_ETHERNET:
+        if length < 14:
+            return None
+        _, _, ethertype = ETHERNET_HEADER.unpack_from(data, pos)
+        pos += 14
+        while ethertype in (0x8100, 0x88a8) and pos + 4 <= end:
+            ethertype = struct.unpack_from("!H", data, pos + 2)[0]
+            pos += 4
+    elif linktype == LINKTYPE_LINUX_SLL:
+        if length < 16:
+            return None
+        ethertype = struct.unpack_from("!H", data, pos + 14)[0]
+        pos += 16
+    elif linktype == LINKTYPE_NULL:
+        if length < 4:
+            return None
+        family = struct.unpack_from("=I", data, pos)[0]
+        ethertype = 0x0800 if family == 2 else 0x86dd
+        pos += 4
+    elif linktype == LINKTYPE_RAW:
+        ethertype = 0x0800 if data[pos] >> 4 == 4 else 0x86dd
+    else:
+        raise PcapError("unsupported link type %d" % linktype)
+
+    if ethertype == 0x0800:
+        if pos + IPV4_HEADER.size > end:
+            return None
+        vihl, _, total, _, fragment, _, proto, _, src, dst = IPV4_HEADER.unpack_from(data, pos)
+        if proto != 6 or fragment & 0x3fff:
+            return None
+        end = min(end, pos + total)
+        pos += (vihl & 0x0f) * 4
+    elif ethertype == 0x86dd:
+        if pos + IPV6_HEADER.size > end:
+            return None
+        _, payload, proto, _, src, dst = IPV6_HEADER.unpack_from(data, pos)
+        if proto != 6:
+            return None
+        pos += IPV6_HEADER.size
+        end = min(end, pos + payload)
+    else:
+        return None
+
+    if pos + TCP_HEADER.size > end:
+        return None
+    sport, dport, seq, _, offset, flags = TCP_HEADER.unpack_from(data, pos)
+    pos += (offset >> 4) * 4
+    if flags & TCP_RST or pos > end:
+        return None
+    return (src, sport, dst, dport), seq, flags, pos, end - pos
+
+
+def _replay_task(task):
+    """
+    Process a single replay task and write its output into a temporary file.
+
+    :returns: path of the output file
+    """
+    kind, args, tmpdir = task
+    fd, path = tempfile.mkstemp(suffix='.jsonl', dir=tmpdir)
+    with open(fd, 'w') as output:
+        if kind == 'file':
+            replay_file(*args, output)
+        else:
+            replay_connection(*args, output)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m protocolparser.replay',
+                                     description=__doc__.strip().split("\n\n")[0])
+    parser.add_argument('inputs', nargs='+', help='stream files (or pcap files with --pcap)')
+    parser.add_argument('-r', '--reader', choices=sorted(READERS), help='reader used for stream files')
+    parser.add_argument('--pcap', action='store_true', help='inputs are pcap captures')
+    parser.add_argument('-p', '--protocol', choices=('http', 'rtsp'), default='http',
+                        help='protocol of captured connections (default: http)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('-o', '--output', help='output file (default: standard output)')
+    args = parser.parse_args(argv)
+
+    if not args.pcap and args.reader is None:
+        parser.error('--reader is required for stream files')
+
+    output_dir = os.path.dirname(os.path.abspath(args.output)) if args.output else None
+    with tempfile.TemporaryDirectory(dir=output_dir) as tmpdir:
+        tasks = []
+        if args.pcap:
+            for path in args.inputs:
+                try:
+                    connections = index_pcap(path)
+                except PcapError as ex:
+                    parser.exit(1, "%s: %s\n" % (path, ex))
+                for name, client, server in connections:
+                    tasks.append(('connection', (path, args.protocol, name, client, server), tmpdir))
+        else:
+            tasks = [('file', (path, args.reader), tmpdir) for path in args.inputs]
+
+        output = open(args.output, 'w') if args.output else sys.stdout
+        try:
+            if args.jobs > 1 and len(tasks) > 1:
+                with ProcessPoolExecutor(args.jobs) as executor:
+                    for path in executor.map(_replay_task, tasks):
+                        _append(path, output)
+            else:
+                for task in tasks:
+                    _append(_replay_task(task), output)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+
+def _append(path, output):
+    """
+    Append a given task output to the final output and remove it.
+    """
+    with open(path) as f:
+        shutil.copyfileobj(f, output)
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
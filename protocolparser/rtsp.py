@@ -1,9 +1,180 @@
+import functools
 import re
+import struct
 
-from .protocol import HttpLikeRequestReader, HttpLikeResponseReader
+from .protocol import (WHITESPACE, BufferedLineReader, HttpLikeMessageReader, HttpLikeRequestReader,
+                       HttpLikeResponseReader)
+from .timers import get_timer_wheel
 
+# interleaved frame header: "$", channel identifier and payload length
+FRAME_HEADER = struct.Struct(">BBH")
 
-class RtspRequestReader(HttpLikeRequestReader):
+# marker of header field values which have not been decoded yet
+NOT_DECODED = object()
+
+# slots of the RtspMixin attributes (the mixin is combined with other slotted
+# classes, so it cannot have any slots of its own and they are declared by the
+# concrete readers)
+RTSP_SLOTS = ('_frame', '_cseq', '_session')
+
+
+class RtspMixin:
+    """
+    Interleaved binary data support (RFC 2326, section 10.12).
+
+    An interleaved frame consists of the "$" character, a one-byte channel
+    identifier, a two-byte (network byte order) payload length and the
+    payload. The frames can appear only between RTSP messages. They are
+    delivered to interleaved_data_received() without any line scanning.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self._frame = None
+        self._cseq = NOT_DECODED
+        self._session = NOT_DECODED
+
+    def reset(self):
+        super().reset()
+        self._cseq = NOT_DECODED
+        self._session = NOT_DECODED
+
+    def recycle(self):
+        super().recycle()
+        self._frame = None
+        self._cseq = NOT_DECODED
+        self._session = NOT_DECODED
+
+    def get_cseq(self):
+        """
+        Get sequence number of the current message (the CSeq header field).
+        The value is decoded only once per message.
+
+        :returns: int or None if the field is not present or it is invalid
+        """
+        cseq = self._cseq
+        if cseq is NOT_DECODED:
+            cseq = None
+            field = self.get_header(b"cseq")
+            if field is not None:
+                value = field.value.strip()
+                if value.isdigit():
+                    cseq = int(value)
+            self._cseq = cseq
+        return cseq
+
+    def get_session(self):
+        """
+        Get session identifier of the current message (the Session header
+        field without its parameters, e.g. timeout). The value is decoded only
+        once per message.
+
+        :returns: bytes or None if the field is not present
+        """
+        session = self._session
+        if session is NOT_DECODED:
+            session = None
+            field = self.get_header(b"session")
+            if field is not None:
+                session = field.value.split(b";", 1)[0].strip()
+            self._session = session
+        return session
+
+    def get_content_length(self):
+        # RTSP messages without the Content-Length header have no body
+        clength = super().get_content_length()
+        return clength or 0
+
+    def process_data(self, data):
+        if self._frame is not None:
+            return self.__frame_data_received(data)
+        if data[0] == 0x24 and self.is_message_start():
+            return self.__frames_received(data)
+        return super().process_data(data)
+
+    def __frames_received(self, data):
+        """
+        Process all complete interleaved frames at the beginning of given
+        data. An incomplete frame at the end is buffered.
+
+        :param data: data starting with an interleaved frame
+        :type data: bytes or memoryview
+        :returns: number of consumed bytes
+        """
+        unpack = FRAME_HEADER.unpack_from
+        handler = self.interleaved_data_received
+        zero_copy = self.is_zero_copy()
+        pos = 0
+        end = len(data)
+        while pos + 4 <= end:
+            magic, channel, length = unpack(data, pos)
+            frame_end = pos + 4 + length
+            if magic != 0x24 or frame_end > end:
+                break
+            if zero_copy:
+                handler(channel, data[pos + 4:frame_end])
+            else:
+                handler(channel, bytes(data[pos + 4:frame_end]))
+            pos = frame_end
+
+        if pos < end and data[pos] == 0x24:
+            self._frame = bytearray(data[pos:])
+            return end
+
+        return pos
+
+    def __frame_data_received(self, data):
+        """
+        Append given data to the current incomplete interleaved frame.
+
+        :param data: received data
+        :type data: bytes or memoryview
+        :returns: number of consumed bytes
+        """
+        frame = self._frame
+        consumed = 0
+        if len(frame) < 4:
+            consumed = min(4 - len(frame), len(data))
+            frame += data[:consumed]
+            if len(frame) < 4:
+                return consumed
+
+        missing = 4 + ((frame[2] << 8) | frame[3]) - len(frame)
+        if missing > len(data) - consumed:
+            frame += data[consumed:]
+            return len(data)
+
+        frame += data[consumed:consumed + missing]
+        self._frame = None
+
+        if self.is_zero_copy():
+            payload = memoryview(frame)[4:]
+        else:
+            payload = bytes(frame[4:])
+
+        self.interleaved_data_received(frame[1], payload)
+
+        return consumed + missing
+
+    def interleaved_data_received(self, channel, data):
+        """
+        This method is called for every interleaved binary frame.
+
+        In the zero-copy mode, the data is a memoryview valid only until this
+        method returns.
+
+        :param channel: channel identifier
+        :type channel: int
+        :param data: frame payload
+        :type data: bytes or memoryview
+        """
+        return
+
+
+class RtspRequestReader(RtspMixin, HttpLikeRequestReader):
     """
     HTTP request reader protocol.
 
@@ -12,14 +183,18 @@ class RtspRequestReader(HttpLikeRequestReader):
     header_received(self): This method is called when all HTTP header fields of the current message have been received.
     body_data_received(self, data): This method is called whenever a new piece of body data is received.
     message_end_received(self): This method is called when message end is reached.
+    interleaved_data_received(self, channel, data): This method is called for every interleaved binary frame.
     parse_error(self, msg): This method is called when parse error occurred.
     internal_error(self, msg): This method is called when internal server error occurred.
     close_connection(self): This method is called whenever the underlying connection should be closed.
     """
+    __slots__ = RTSP_SLOTS
+
     first_line_re = re.compile(r"^(?P<method>\S+) (?P<url>\S*) RTSP/(?P<version>\d\.\d)$")
+    first_line_protocol = b"RTSP"
 
 
-class RtspResponseReader(HttpLikeResponseReader):
+class RtspResponseReader(RtspMixin, HttpLikeResponseReader):
     """
     HTTP response reader protocol.
 
@@ -28,9 +203,337 @@ class RtspResponseReader(HttpLikeResponseReader):
     header_received(self): This method is called when all HTTP header fields of the current message have been received.
     body_data_received(self, data): This method is called whenever a new piece of body data is received.
     message_end_received(self): This method is called when message end is reached.
+    interleaved_data_received(self, channel, data): This method is called for every interleaved binary frame.
     parse_error(self, msg): This method is called when parse error occurred.
     internal_error(self, msg): This method is called when internal server error occurred.
     close_connection(self): This method is called whenever the underlying connection should be closed.
     """
 
+    __slots__ = RTSP_SLOTS
+
     first_line_re = re.compile(r"^RTSP/(?P<version>\d\.\d) (?P<status_code>\d{3}) (?P<reason_phrase>.*)$")
+    first_line_protocol = b"RTSP"
+
+
+class RtspConnectionReader(RtspMixin, HttpLikeMessageReader):
+    """
+    Reader of both directions of an RTSP control connection. RTSP servers
+    may send their own requests (e.g. ANNOUNCE, REDIRECT or SET_PARAMETER)
+    on the connection used by a client, so every message can be either a
+    request (the method, url and version attributes are set) or a response
+    (the version, status_code and reason_phrase attributes are set).
+
+    Responses are matched to the outstanding requests by their CSeq (see
+    push_request()), so any number of requests (e.g. SETUP of many tracks)
+    can be pipelined and their responses may arrive in any order.
+
+    There are several methods which are called during processing request. Default implementation do nothing.
+
+    header_received(self): This method is called when all header fields of the current message have been received.
+    body_data_received(self, data): This method is called whenever a new piece of body data is received.
+    message_end_received(self): This method is called when message end is reached.
+    interleaved_data_received(self, channel, data): This method is called for every interleaved binary frame.
+    request_timeout_expired(self, cseq, method): This method is called when a request gets no response in time.
+    parse_error(self, msg): This method is called when parse error occurred.
+    internal_error(self, msg): This method is called when internal server error occurred.
+    close_connection(self): This method is called whenever the underlying connection should be closed.
+    """
+
+    __slots__ = RTSP_SLOTS + ('version', 'method', '__url', 'status_code', '__reason_phrase', '__requests',
+                              '__request_timeout', '__request_timer_wheel', '__expired')
+
+    first_line_re = re.compile(r"^(?:(?P<method>\S+) (?P<url>\S*) )?RTSP/(?P<version>\d\.\d)"
+                               r"(?: (?P<status_code>\d{3}) (?P<reason_phrase>.*))?$")
+    first_line_protocol = b"RTSP"
+
+    def __init__(self, max_headers=512, max_line_length=8192, zero_copy=False, max_body_size=None,
+                 max_chunk_size=None, max_header_size=None, max_continuation_lines=None):
+        """
+        Create a new RTSP connection reader.
+        """
+        super().__init__(max_headers, max_line_length, zero_copy, max_body_size, max_chunk_size, max_header_size,
+                         max_continuation_lines)
+
+        self.version = None
+        self.method = None
+        self.url = None
+        self.status_code = None
+        self.reason_phrase = None
+
+        # outstanding requests (CSeq -> (method, timer), created on the first push_request() call)
+        self.__requests = None
+        self.__request_timeout = None
+        self.__request_timer_wheel = None
+        # requests expired while a response was being received (its CSeq may not be known yet)
+        self.__expired = None
+
+    @property
+    def url(self):
+        """
+        Request URL (decoded on the first access).
+        """
+        url = self.__url
+        if isinstance(url, bytes):
+            url = self.__url = url.decode('utf-8', 'replace')
+        return url
+
+    @url.setter
+    def url(self, url):
+        self.__url = url
+
+    @property
+    def reason_phrase(self):
+        """
+        Response reason phrase (decoded on the first access).
+        """
+        reason_phrase = self.__reason_phrase
+        if isinstance(reason_phrase, bytes):
+            reason_phrase = self.__reason_phrase = reason_phrase.decode('utf-8', 'replace')
+        return reason_phrase
+
+    @reason_phrase.setter
+    def reason_phrase(self, reason_phrase):
+        self.__reason_phrase = reason_phrase
+
+    def is_response(self):
+        """
+        Check if the current message is a response.
+        """
+        return self.status_code is not None
+
+    def first_line_received(self, line):
+        # use the regex only for lines not accepted by the fast parser
+        # (it may still accept some unusual ones)
+        versions = self.first_line_versions
+        if line.startswith(b"RTSP/"):
+            parts = line.split(b" ", 2)
+            if len(parts) == 3:
+                protocol, status_code, reason_phrase = parts
+                version = versions.get(protocol)
+                if (version
+                        and len(status_code) == 3
+                        and status_code.isdigit()
+                        and b"\n" not in reason_phrase):
+                    self.version = version
+                    self.status_code = int(status_code)
+                    self.reason_phrase = reason_phrase
+                    return
+        elif line.isascii():
+            parts = line.split(b" ")
+            if len(parts) == 3 and len(line.translate(None, WHITESPACE)) == len(line) - 2:
+                method, url, protocol = parts
+                version = versions.get(protocol)
+                if method and version:
+                    self.version = version
+                    self.method = method.decode('ascii')
+                    self.url = url
+                    return
+        super().first_line_received(line)
+
+    def has_body(self):
+        status_code = self.status_code
+        if status_code is not None and (100 <= status_code < 200 or status_code == 204 or status_code == 304):
+            return False
+        return True
+
+    def set_request_timeout(self, timeout=None, timer_wheel=None):
+        """
+        Set maximum time (in seconds) to wait for a response. Requests pushed
+        later without a response in time are dropped and reported via
+        request_timeout_expired(). A request expiring while a response is
+        being received is reported at the response end (unless it is the
+        response to the request), after a fatal parse error of the response
+        or when the connection is lost. None disables the timeout.
+
+        :param timeout: response timeout in seconds
+        :type timeout: float
+        :param timer_wheel: timer wheel (None means the default timer wheel of the running event loop)
+        :type timer_wheel: protocolparser.timers.TimerWheel
+        """
+        self.__request_timeout = timeout
+        if timeout is None:
+            self.__request_timer_wheel = None
+        else:
+            self.__request_timer_wheel = timer_wheel if timer_wheel is not None else get_timer_wheel()
+
+    def push_request(self, method, cseq):
+        """
+        Inform the reader about a sent request for which a response is
+        expected. ValueError is raised if there is already an outstanding
+        request with the same CSeq.
+
+        :param method: request method (e.g. DESCRIBE, SETUP, PLAY, etc.)
+        :type method: str
+        :param cseq: sequence number of the request (the CSeq header field)
+        :type cseq: int
+        """
+        requests = self.__requests
+        if requests is None:
+            requests = self.__requests = {}
+        elif cseq in requests:
+            raise ValueError("request with CSeq %d is already pending" % cseq)
+
+        timer = None
+        if self.__request_timeout is not None:
+            callback = functools.partial(self.__request_expired, cseq)
+            timer = self.__request_timer_wheel.schedule(self.__request_timeout, callback)
+
+        requests[cseq] = (method.upper(), timer)
+
+    def get_request_method(self, cseq=None):
+        """
+        Get method of an outstanding request.
+
+        :param cseq: sequence number of the request (None means the request the current response belongs to)
+        :type cseq: int
+        :returns: str or None if there is no such request
+        """
+        if cseq is None:
+            if self.status_code is None:
+                return None
+            cseq = self.get_cseq()
+        requests = self.__requests
+        if requests:
+            request = requests.get(cseq)
+            if request is not None:
+                return request[0]
+        return None
+
+    def get_pending_requests(self):
+        """
+        Get sequence numbers of all outstanding requests.
+
+        :returns: list of int
+        """
+        return list(self.__requests or ())
+
+    def reset(self):
+        # the response completes its request
+        if self.status_code is not None:
+            self.__pop_request(self.get_cseq())
+        super().reset()
+        self.version = None
+        self.method = None
+        self.url = None
+        self.status_code = None
+        self.reason_phrase = None
+
+        if self.__expired is not None:
+            self.__report_expired()
+
+    def recycle(self):
+        super().recycle()
+        self.__clear_requests()
+        self.__request_timeout = None
+        self.__request_timer_wheel = None
+        self.version = None
+        self.method = None
+        self.url = None
+        self.status_code = None
+        self.reason_phrase = None
+
+    def process_data(self, data):
+        consumed = super().process_data(data)
+        # the response being received will never end after a fatal parse error
+        if self.__expired is not None and self.is_discarding():
+            self.__report_expired()
+        return consumed
+
+    def connection_lost(self, exc):
+        if self.__expired is not None:
+            self.__report_expired()
+        self.__clear_requests()
+        super().connection_lost(exc)
+
+    def __pop_request(self, cseq):
+        """
+        Remove a given outstanding request.
+
+        :returns: (method, timer) or None
+        """
+        requests = self.__requests
+        if not requests:
+            return None
+        request = requests.pop(cseq, None)
+        if not requests:
+            self.__requests = None
+        if request is not None and request[1] is not None:
+            request[1].cancel()
+        return request
+
+    def __clear_requests(self):
+        """
+        Drop all outstanding requests.
+        """
+        requests = self.__requests
+        self.__requests = None
+        self.__expired = None
+        for _, timer in (requests or {}).values():
+            if timer is not None:
+                timer.cancel()
+
+    def __request_expired(self, cseq):
+        # a response is being received right now and it may belong to the
+        # request, so the expiration is checked again at the response end
+        if self.status_code is not None and not self.is_discarding():
+            if self.__expired is None:
+                self.__expired = []
+            self.__expired.append(cseq)
+            return
+        request = self.__pop_request(cseq)
+        if request is not None:
+            self.request_timeout_expired(cseq, request[0])
+
+    def __report_expired(self):
+        """
+        Report the requests which expired while a response was being received
+        and which are still outstanding.
+        """
+        expired = self.__expired
+        self.__expired = None
+        for cseq in expired:
+            request = self.__pop_request(cseq)
+            if request is not None:
+                self.request_timeout_expired(cseq, request[0])
+
+    def request_timeout_expired(self, cseq, method):
+        """
+        This method is called when a given request gets no response in time
+        (see set_request_timeout()). The request is not outstanding anymore.
+
+        :param cseq: sequence number of the request
+        :type cseq: int
+        :param method: request method
+        :type method: str
+        """
+        return
+
+
+class BufferedRtspRequestReader(BufferedLineReader, RtspRequestReader):
+    """
+    RTSP request reader protocol based on asyncio.BufferedProtocol. The body
+    data are passed to body_data_received() as memoryviews valid only during
+    the call.
+    """
+
+    __slots__ = ()
+
+
+class BufferedRtspResponseReader(BufferedLineReader, RtspResponseReader):
+    """
+    RTSP response reader protocol based on asyncio.BufferedProtocol. The body
+    data are passed to body_data_received() as memoryviews valid only during
+    the call.
+    """
+
+    __slots__ = ()
+
+
+class BufferedRtspConnectionReader(BufferedLineReader, RtspConnectionReader):
+    """
+    RTSP connection reader protocol based on asyncio.BufferedProtocol. The
+    body data are passed to body_data_received() as memoryviews valid only
+    during the call.
+    """
+
+    __slots__ = ()
@@ -0,0 +1,575 @@
+"""
+Multi-process serving of reader based protocols.
+
+A single asyncio event loop parses on a single core only. MultiProcessServer
+runs a given reader class in several worker processes, every one with its own
+event loop:
+
+    server = MultiProcessServer(MyRequestReader, "0.0.0.0", 8080, workers=4)
+    server.run()
+
+The workers listen on their own sockets bound with SO_REUSEPORT, so the
+kernel balances new connections among them. Where SO_REUSEPORT is not
+available, the workers accept connections from a single listening socket
+inherited from the parent process.
+
+The parent process restarts crashed workers and aggregates their parser
+metrics (see protocolparser.metrics), server.registry can be exported in the
+same way as a MetricsRegistry of a single process. On SIGTERM or SIGINT (or
+stop()), the workers stop accepting new connections, close their idle
+connections and wait (at most drain_timeout seconds) for the other ones to
+finish their messages.
+"""
+
+import asyncio
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import socket
+import time
+
+from .metrics import Histogram, MetricsRegistry, ReaderMetrics, instrumented
+
+
+def is_reuse_port_supported():
+    """
+    Check if SO_REUSEPORT can be used on this system.
+    """
+    if not hasattr(socket, "SO_REUSEPORT"):
+        return False
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    except OSError:
+        return False
+    return True
+
+
+def bind_socket(host, port, reuse_port=False):
+    """
+    Create a TCP socket bound to a given address.
+
+    :param host: listening address
+    :type host: str
+    :param port: listening port
+    :type port: int
+    :param reuse_port: set SO_REUSEPORT
+    :type reuse_port: bool
+    :returns: socket.socket
+    """
+    infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM, flags=socket.AI_PASSIVE)
+    family, type_, proto, _, address = infos[0]
+    sock = socket.socket(family, type_, proto)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuse_port:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind(address)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+class AggregatedRegistry(MetricsRegistry):
+    """
+    Registry aggregating metrics received from worker processes. The metrics
+    of terminated workers are kept.
+    """
+
+    def __init__(self):
+        super().__init__(sample_interval=0)
+
+        # worker id -> (counters, histograms) of live workers
+        self.__live = {}
+        # counters and histograms of terminated workers
+        self.__released = ({}, {})
+
+    def update(self, worker_id, counters, histograms):
+        """
+        Replace the last metrics snapshot of a given worker.
+
+        :param worker_id: worker identifier
+        :param counters: reader class name -> ReaderMetrics
+        :type counters: dict
+        :param histograms: (histogram name, reader class name) -> Histogram
+        :type histograms: dict
+        """
+        self.__live[worker_id] = (counters, histograms)
+
+    def release(self, worker_id):
+        """
+        Keep the last metrics snapshot of a terminated worker.
+
+        :param worker_id: worker identifier
+        """
+        snapshot = self.__live.pop(worker_id, None)
+        if snapshot is not None:
+            self.__released = _merge((self.__released, snapshot))
+
+    def collect(self):
+        return _merge([self.__released] + list(self.__live.values()))[0]
+
+    def get_histograms(self):
+        return _merge([self.__released] + list(self.__live.values()))[1]
+
+
+def _merge(snapshots):
+    """
+    Merge given (counters, histograms) metrics snapshots.
+    """
+    counters = {}
+    histograms = {}
+    for snapshot_counters, snapshot_histograms in snapshots:
+        for name, metrics in snapshot_counters.items():
+            counters.setdefault(name, ReaderMetrics()).add(metrics)
+        for key, histogram in snapshot_histograms.items():
+            total = histograms.get(key)
+            if total is None:
+                total = histograms[key] = Histogram(histogram.buckets)
+            total.counts = [a + b for a, b in zip(total.counts, histogram.counts)]
+            total.sum += histogram.sum
+            total.count += histogram.count
+    return counters, histograms
+
+
+class WorkerMixin:
+    """
+    Reader mixin tracking connections of a worker process.
+    """
+
+    # worker the reader belongs to
+    serving_worker = None
+
+    def connection_made(self, transport):
+        super().connection_made(transport)
+        self.__transport = transport
+        self.serving_worker.connection_made(self)
+
+    def connection_lost(self, exc):
+        self.serving_worker.connection_lost(self)
+        self.__transport = None
+        super().connection_lost(exc)
+
+    def is_idle(self):
+        """
+        Check if the connection can be closed while draining, i.e. no part
+        of a message has been received and there is no response to send.
+        Readers sending their responses asynchronously should extend this
+        method.
+        """
+        return self.is_message_start()
+
+    def close_transport(self):
+        """
+        Close the connection (the write buffer is flushed first).
+        """
+        if self.__transport is not None:
+            self.__transport.close()
+
+    def abort_transport(self):
+        """
+        Close the connection immediately.
+        """
+        if self.__transport is not None:
+            self.__transport.abort()
+
+
+class Worker:
+    """
+    Event loop of a single worker process.
+    """
+
+    def __init__(self, reader_class, address, sock, backlog, conn, stats_interval, drain_timeout):
+        """
+        Create a new worker.
+
+        :param reader_class: reader class
+        :type reader_class: type
+        :param address: (host, port) to bind with SO_REUSEPORT if there is no inherited socket
+        :type address: tuple
+        :param sock: inherited listening socket (None means SO_REUSEPORT)
+        :type sock: socket.socket
+        :param backlog: listen backlog
+        :type backlog: int
+        :param conn: pipe end for sending stats to the parent
+        :type conn: multiprocessing.connection.Connection
+        :param stats_interval: stats reporting interval in seconds
+        :type stats_interval: float
+        :param drain_timeout: maximum time (in seconds) to wait for open connections on shutdown
+        :type drain_timeout: float
+        """
+        self.__reader_class = reader_class
+        self.__address = address
+        self.__sock = sock
+        self.__backlog = backlog
+        self.__conn = conn
+        self.__stats_interval = stats_interval
+        self.__drain_timeout = drain_timeout
+        self.__registry = MetricsRegistry()
+        self.__readers = set()
+        self.__accepted = 0
+        self.__draining = False
+        self.__stopping = None
+        self.__parent = os.getppid()
+
+    def connection_made(self, reader):
+        self.__accepted += 1
+        self.__readers.add(reader)
+
+    def connection_lost(self, reader):
+        self.__readers.discard(reader)
+        if self.__draining and not self.__readers:
+            self.__stopping.set()
+
+    async def run(self):
+        """
+        Serve connections until SIGTERM is received.
+        """
+        loop = asyncio.get_running_loop()
+
+        self.__stopping = asyncio.Event()
+        loop.add_signal_handler(signal.SIGTERM, self.__stopping.set)
+
+        sock = self.__sock
+        if sock is None:
+            sock = bind_socket(*self.__address, reuse_port=True)
+        sock.listen(self.__backlog)
+
+        base = instrumented(self.__reader_class, self.__registry)
+        reader_class = type(base.__name__, (WorkerMixin, base), {'serving_worker': self})
+        server = await loop.create_server(reader_class, sock=sock, backlog=self.__backlog)
+
+        # the first stats tell the parent that the worker is listening
+        self.__send_stats()
+
+        while not self.__stopping.is_set():
+            try:
+                await asyncio.wait_for(self.__stopping.wait(), self.__stats_interval)
+            except asyncio.TimeoutError:
+                pass
+            # stop if the parent process has gone away
+            if not self.__send_stats() or os.getppid() != self.__parent:
+                break
+
+        server.close()
+        await self.__drain()
+        self.__send_stats()
+
+    async def __drain(self):
+        """
+        Close idle connections and wait for the other ones.
+        """
+        self.__draining = True
+        self.__stopping.clear()
+        deadline = time.monotonic() + self.__drain_timeout
+        while self.__readers:
+            for reader in list(self.__readers):
+                if reader.is_idle():
+                    reader.close_transport()
+            timeout = min(deadline - time.monotonic(), 0.1)
+            if timeout <= 0:
+                break
+            try:
+                await asyncio.wait_for(self.__stopping.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        for reader in list(self.__readers):
+            reader.abort_transport()
+        # let the transports call connection_lost()
+        await asyncio.sleep(0)
+
+    def __send_stats(self):
+        """
+        Send current stats to the parent process.
+
+        :returns: False if the parent process is not available
+        """
+        stats = (self.__accepted, len(self.__readers), self.__registry.collect(), self.__registry.get_histograms())
+        try:
+            self.__conn.send(stats)
+        except OSError:
+            return False
+        return True
+
+
+def _worker_main(reader_class, address, sock, backlog, conn, stats_interval, drain_timeout):
+    """
+    Entry point of a worker process.
+    """
+    # the parent process handles SIGINT and tells the workers to stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    worker = Worker(reader_class, address, sock, backlog, conn, stats_interval, drain_timeout)
+    try:
+        asyncio.run(worker.run())
+    finally:
+        conn.close()
+
+
+class WorkerProcess:
+    """
+    State of a worker process kept by the parent.
+    """
+
+    __slots__ = ('process', 'conn', 'ready', 'accepted', 'connections', 'restarts', 'restart_at', 'stopped')
+
+    def __init__(self):
+        self.process = None
+        self.conn = None
+        # the worker has started listening
+        self.ready = False
+        self.accepted = 0
+        self.connections = 0
+        self.restarts = 0
+        self.restart_at = None
+        self.stopped = False
+
+
+class MultiProcessServer:
+    """
+    Server running a given reader class in several worker processes.
+    """
+
+    def __init__(self, reader_class, host="127.0.0.1", port=0, workers=None, reuse_port=None, backlog=1024,
+                 drain_timeout=10.0, stats_interval=1.0, restart_delay=1.0, start_method=None):
+        """
+        Create a new server.
+
+        :param reader_class: reader class (instantiated for every connection, it must be picklable)
+        :type reader_class: type
+        :param host: listening address
+        :type host: str
+        :param port: listening port (0 means any free port, see get_port())
+        :type port: int
+        :param workers: number of worker processes (None means the number of CPUs)
+        :type workers: int
+        :param reuse_port: bind every worker with SO_REUSEPORT (None means if supported)
+        :type reuse_port: bool
+        :param backlog: listen backlog
+        :type backlog: int
+        :param drain_timeout: maximum time (in seconds) to wait for open connections on shutdown
+        :type drain_timeout: float
+        :param stats_interval: interval (in seconds) of sending stats from the workers
+        :type stats_interval: float
+        :param restart_delay: minimum delay (in seconds) before restarting a crashed worker
+        :type restart_delay: float
+        :param start_method: multiprocessing start method (None means the platform default)
+        :type start_method: str
+        """
+        if reuse_port is None:
+            reuse_port = is_reuse_port_supported()
+
+        self.registry = AggregatedRegistry()
+
+        self.__reader_class = reader_class
+        self.__host = host
+        self.__port = port
+        self.__workers = [WorkerProcess() for _ in range(workers or os.cpu_count() or 1)]
+        self.__reuse_port = reuse_port
+        self.__backlog = backlog
+        self.__drain_timeout = drain_timeout
+        self.__stats_interval = stats_interval
+        self.__restart_delay = restart_delay
+        self.__context = multiprocessing.get_context(start_method)
+        # listening socket shared by the workers or a socket reserving the
+        # port for the SO_REUSEPORT workers (it is bound but not listening,
+        # so it does not get any connections)
+        self.__sock = None
+        self.__stop_requested = False
+
+    def get_port(self):
+        """
+        Get the listening port (available after start()).
+        """
+        return self.__port
+
+    def get_worker_stats(self):
+        """
+        Get stats of all workers.
+
+        :returns: list of dicts (pid, ready, accepted, connections and restarts)
+        """
+        return [{
+            'pid': worker.process.pid if worker.process is not None else None,
+            'ready': worker.ready,
+            'accepted': worker.accepted,
+            'connections': worker.connections,
+            'restarts': worker.restarts,
+        } for worker in self.__workers]
+
+    def start(self, timeout=10.0):
+        """
+        Bind the listening address, start all workers and wait until they
+        are listening. RuntimeError is raised if any worker is not ready
+        within a given timeout.
+
+        :param timeout: timeout in seconds
+        :type timeout: float
+        """
+        self.__sock = bind_socket(self.__host, self.__port, reuse_port=self.__reuse_port)
+        self.__port = self.__sock.getsockname()[1]
+        if not self.__reuse_port:
+            self.__sock.listen(self.__backlog)
+        for idx in range(len(self.__workers)):
+            self.__start_worker(idx)
+
+        deadline = time.monotonic() + timeout
+        while not all(worker.ready for worker in self.__workers):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.stop(0)
+                raise RuntimeError("worker processes have not started in time")
+            self.poll(min(remaining, 0.1))
+
+    def request_stop(self):
+        """
+        Make run() stop the server (it is safe to call this from a signal
+        handler).
+        """
+        self.__stop_requested = True
+
+    def run(self):
+        """
+        Start the server (if it has not been started yet) and serve until
+        SIGTERM or SIGINT is received.
+        """
+        if self.__sock is None:
+            self.start()
+
+        handlers = {}
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            handlers[signum] = signal.signal(signum, lambda *args: self.request_stop())
+        try:
+            while not self.__stop_requested:
+                self.poll(0.1)
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+            self.stop()
+
+    def poll(self, timeout=0.0):
+        """
+        Receive stats from the workers and restart the crashed ones.
+
+        :param timeout: maximum time (in seconds) to wait for stats
+        :type timeout: float
+        """
+        workers = self.__workers
+        conns = {worker.conn: idx for idx, worker in enumerate(workers) if worker.conn is not None}
+        for conn in multiprocessing.connection.wait(list(conns), timeout):
+            self.__receive_stats(conns[conn])
+
+        now = time.monotonic()
+        for idx, worker in enumerate(workers):
+            if worker.stopped:
+                continue
+            if worker.process is not None and not worker.process.is_alive():
+                self.__reap_worker(idx)
+                worker.restart_at = now + self.__restart_delay
+            if worker.process is None and worker.restart_at is not None and worker.restart_at <= now:
+                worker.restarts += 1
+                self.__start_worker(idx)
+
+    def stop(self, timeout=None):
+        """
+        Drain and stop all workers. The workers still running after a given
+        timeout are killed.
+
+        :param timeout: timeout in seconds (None means drain_timeout plus a few seconds)
+        :type timeout: float
+        """
+        if timeout is None:
+            timeout = self.__drain_timeout + 5.0
+
+        for worker in self.__workers:
+            worker.stopped = True
+            if worker.process is not None and worker.process.is_alive():
+                worker.process.terminate()
+
+        deadline = time.monotonic() + timeout
+        for idx, worker in enumerate(self.__workers):
+            if worker.process is None:
+                continue
+            # keep reading stats, so the final snapshot is not lost
+            while worker.process.is_alive() and time.monotonic() < deadline:
+                self.poll(min(0.1, max(deadline - time.monotonic(), 0)))
+            if worker.process.is_alive():
+                worker.process.kill()
+            worker.process.join()
+            self.__reap_worker(idx)
+
+        if self.__sock is not None:
+            self.__sock.close()
+            self.__sock = None
+
+    def __start_worker(self, idx):
+        """
+        Start a given worker process.
+        """
+        worker = self.__workers[idx]
+        recv_conn, send_conn = self.__context.Pipe(duplex=False)
+        sock = None if self.__reuse_port else self.__sock
+        process = self.__context.Process(target=_worker_main, name="protocolparser-worker-%d" % idx, daemon=True,
+                                         args=(self.__reader_class, (self.__host, self.__port), sock,
+                                               self.__backlog, send_conn, self.__stats_interval,
+                                               self.__drain_timeout))
+        process.start()
+        send_conn.close()
+        worker.process = process
+        worker.conn = recv_conn
+        worker.ready = False
+        worker.restart_at = None
+
+    def __reap_worker(self, idx):
+        """
+        Collect the last stats of a terminated worker.
+        """
+        worker = self.__workers[idx]
+        if worker.conn is not None:
+            while worker.conn.poll() and self.__receive_stats(idx):
+                pass
+            if worker.conn is not None:
+                worker.conn.close()
+                worker.conn = None
+        worker.process = None
+        worker.ready = False
+        worker.connections = 0
+        self.registry.release((idx, worker.restarts))
+
+    def __receive_stats(self, idx):
+        """
+        Receive a stats message of a given worker.
+
+        :returns: False if the worker has closed its pipe
+        """
+        worker = self.__workers[idx]
+        try:
+            accepted, connections, counters, histograms = worker.conn.recv()
+        except (EOFError, OSError):
+            worker.conn.close()
+            worker.conn = None
+            return False
+        worker.ready = True
+        worker.accepted = accepted
+        worker.connections = connections
+        self.registry.update((idx, worker.restarts), counters, histograms)
+        return True
+
+
+def serve(reader_class, host="127.0.0.1", port=0, workers=None, **kwargs):
+    """
+    Serve a given reader class in several worker processes until SIGTERM or
+    SIGINT is received (see MultiProcessServer for the other arguments).
+
+    :param reader_class: reader class
+    :type reader_class: type
+    :param host: listening address
+    :type host: str
+    :param port: listening port
+    :type port: int
+    :param workers: number of worker processes (None means the number of CPUs)
+    :type workers: int
+    """
+    MultiProcessServer(reader_class, host, port, workers, **kwargs).run()
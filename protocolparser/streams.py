@@ -0,0 +1,300 @@
+"""
+Async iterator API over the readers.
+
+A streaming reader class is created by mixing the StreamMixin into a given
+reader class (or simply by calling streaming()). It works the same way for
+HTTP and RTSP requests and responses:
+
+    reader_class = streaming(HttpResponseReader)
+    transport, reader = await loop.create_connection(reader_class, host, port)
+    ...
+    async for message in reader.messages():
+        print(message.status_code, message.get_header(b"content-type"))
+        async for data in message.body():
+            ...
+
+Body data waiting for the consumer count against the body flow control
+limits of the reader (see HttpLikeMessageReader.set_body_buffer_limits()),
+so reading from the transport is paused while the consumer is behind. A
+wakeup of the consumer returns all body data buffered until then at once.
+"""
+
+import asyncio
+
+from collections import deque
+
+from .protocol import HEADER_KEYS, HeaderFields
+
+
+class ParseError(Exception):
+    pass
+
+
+class StreamMessage:
+    """
+    Message received by a streaming reader. All named groups of the reader's
+    first line regex (e.g. method, url and version) are available as
+    attributes. The body is read using body() or read().
+    """
+
+    def __init__(self, reader, first_line, headers):
+        """
+        Create a new message.
+
+        :param reader: reader receiving the message
+        :type reader: StreamMixin
+        :param first_line: first line fields
+        :type first_line: dict
+        :param headers: header fields
+        :type headers: HeaderFields
+        """
+        self.__dict__.update(first_line)
+        self.headers = headers
+        self.trailers = None
+
+        self.__reader = reader
+        self.__chunks = []
+        self.__size = 0
+        self.__complete = False
+        self.__discarded = False
+        self.__exception = None
+        self.__waiter = None
+
+    def get_header(self, name):
+        """
+        Get header with a given name. If the header field is repeated, the
+        last occurrence is returned.
+
+        :param name: header field name
+        :type name: bytes
+        :returns: HttpHeader or None
+        """
+        return self.headers.get(HEADER_KEYS.get(name) or name.lower())
+
+    def is_complete(self):
+        """
+        Check if the whole message has been received.
+        """
+        return self.__complete
+
+    async def body(self):
+        """
+        Iterate over the message body. Every iteration returns all body data
+        received since the previous one. An exception is raised if the
+        connection is lost (or a parse error occurs) before the end of the
+        body.
+        """
+        while True:
+            if self.__chunks:
+                yield self.__take()
+            elif self.__complete or self.__discarded:
+                return
+            elif self.__exception is not None:
+                raise self.__exception
+            else:
+                self.__waiter = asyncio.get_running_loop().create_future()
+                try:
+                    await self.__waiter
+                finally:
+                    self.__waiter = None
+
+    async def read(self):
+        """
+        Read the whole message body.
+
+        :returns: bytes
+        """
+        return b"".join([data async for data in self.body()])
+
+    def discard(self):
+        """
+        Drop all unread body data including the data received later.
+        """
+        self.__discarded = True
+        if self.__chunks:
+            self.__take()
+        self.__wake()
+
+    def feed_data(self, data):
+        """
+        Append a given piece of body data (called by the reader).
+
+        :param data: body data
+        :type data: bytes or memoryview
+        """
+        if self.__discarded:
+            self.__reader.body_data_processed(len(data))
+            return
+        self.__chunks.append(bytes(data))
+        self.__size += len(data)
+        self.__wake()
+
+    def feed_eof(self, trailers):
+        """
+        Signal the message end (called by the reader).
+
+        :param trailers: trailer fields
+        :type trailers: HeaderFields
+        """
+        self.trailers = trailers
+        self.__complete = True
+        self.__wake()
+
+    def set_exception(self, exc):
+        """
+        Signal that the message cannot be completed (called by the reader).
+
+        :param exc: exception raised by body()
+        :type exc: Exception
+        """
+        self.__exception = exc
+        self.__wake()
+
+    def __take(self):
+        """
+        Take all buffered body data.
+        """
+        chunks = self.__chunks
+        data = chunks[0] if len(chunks) == 1 else b"".join(chunks)
+        size = self.__size
+        chunks.clear()
+        self.__size = 0
+        self.__reader.body_data_processed(size)
+        return data
+
+    def __wake(self):
+        waiter = self.__waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+
+class StreamMixin:
+    """
+    Reader mixin providing the async iterator API. The mixin must precede the
+    class implementing header_received(), body_data_received(),
+    message_end_received(), parse_error() and connection_lost() in the MRO
+    (see streaming()).
+    """
+
+    # high-water mark of body data waiting for the consumer
+    stream_buffer_limit = 65536
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.__messages = deque()
+        self.__current = None
+        self.__waiter = None
+        self.__closed = False
+
+        self.set_body_buffer_limits(self.stream_buffer_limit)
+
+    def recycle(self):
+        super().recycle()
+        self.__messages.clear()
+        self.__current = None
+        self.__waiter = None
+        self.__closed = False
+        self.set_body_buffer_limits(self.stream_buffer_limit)
+
+    async def messages(self):
+        """
+        Iterate over received messages. A message is returned as soon as its
+        header is received. Its body must be read before the next message is
+        requested, the rest of the body is discarded otherwise. The iteration
+        ends when the connection is lost or a fatal parse error occurs (see
+        HttpLikeMessageReader.is_discarding()).
+        """
+        messages = self.__messages
+        previous = None
+        while True:
+            if previous is not None:
+                previous.discard()
+                previous = None
+            if messages:
+                previous = messages.popleft()
+                yield previous
+            elif self.__closed:
+                return
+            else:
+                self.__waiter = asyncio.get_running_loop().create_future()
+                try:
+                    await self.__waiter
+                finally:
+                    self.__waiter = None
+
+    def header_received(self):
+        super().header_received()
+        if self.__closed:
+            return
+        first_line = {name: getattr(self, name, None) for name in self.first_line_re.groupindex}
+        headers = HeaderFields()
+        headers.extend(field for _, field in self.get_headers())
+        message = self.__current = StreamMessage(self, first_line, headers)
+        self.__messages.append(message)
+        self.__wake()
+
+    def body_data_received(self, data):
+        super().body_data_received(data)
+        if self.__current is not None:
+            self.__current.feed_data(data)
+        else:
+            self.body_data_processed(len(data))
+
+    def message_end_received(self):
+        super().message_end_received()
+        message = self.__current
+        if message is not None:
+            self.__current = None
+            trailers = HeaderFields()
+            trailers.extend(field for _, field in self.get_trailers())
+            message.feed_eof(trailers)
+
+    def parse_error(self, msg):
+        super().parse_error(msg)
+        # the reader keeps parsing after non-fatal errors, the stream is
+        # closed only if the message boundaries are unknown
+        if self.is_discarding():
+            self.__close(ParseError(msg))
+
+    def connection_lost(self, exc):
+        super().connection_lost(exc)
+        self.__close(exc or ConnectionResetError("connection lost before the message end"))
+
+    def __close(self, exc):
+        """
+        End the iteration and fail the current message with a given exception.
+        """
+        self.__closed = True
+        message = self.__current
+        if message is not None:
+            self.__current = None
+            message.set_exception(exc)
+        self.__wake()
+
+    def __wake(self):
+        waiter = self.__waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+
+# streaming classes created for the given reader classes
+_streaming_classes = {}
+
+
+def streaming(reader_class, buffer_limit=65536):
+    """
+    Get a streaming version of a given reader class.
+
+    :param reader_class: reader class (e.g. HttpRequestReader or its subclass)
+    :type reader_class: type
+    :param buffer_limit: high-water mark of body data waiting for the consumer
+    :type buffer_limit: int
+    :returns: reader class
+    """
+    key = (reader_class, buffer_limit)
+    cls = _streaming_classes.get(key)
+    if cls is None:
+        cls = type(reader_class.__name__, (StreamMixin, reader_class), {'stream_buffer_limit': buffer_limit})
+        _streaming_classes[key] = cls
+    return cls
@@ -0,0 +1,157 @@
+"""
+Hashed timer wheel shared by many connections.
+
+Scheduling and cancelling a timer is O(1) and the whole wheel needs only a
+single event loop handle (which exists only while there are any timers), so
+per-connection deadlines do not load the event loop scheduler.
+"""
+
+import asyncio
+import math
+import weakref
+
+
+class Timer:
+    """
+    Timer scheduled in a TimerWheel.
+    """
+
+    __slots__ = ('wheel', 'deadline', 'callback')
+
+    def __init__(self, wheel, deadline, callback):
+        self.wheel = wheel
+        self.deadline = deadline
+        self.callback = callback
+
+    def cancel(self):
+        """
+        Cancel the timer (it does nothing if the timer has already fired).
+        """
+        if self.wheel is not None:
+            self.wheel.cancel(self)
+
+
+class TimerWheel:
+    """
+    Timer wheel with a given resolution. Timers fire at most one resolution
+    step late and never early.
+    """
+
+    def __init__(self, resolution=0.25, slots=1024, loop=None):
+        """
+        Create a new timer wheel.
+
+        :param resolution: time step in seconds
+        :type resolution: float
+        :param slots: number of wheel slots
+        :type slots: int
+        :param loop: event loop (None means the running loop)
+        :type loop: asyncio.AbstractEventLoop
+        """
+        self.__resolution = resolution
+        self.__slots = [set() for _ in range(slots)]
+        self.__loop = loop
+        self.__handle = None
+        self.__current = 0
+        self.__count = 0
+
+    def __len__(self):
+        return self.__count
+
+    def schedule(self, delay, callback):
+        """
+        Call a given callback after a given delay.
+
+        :param delay: delay in seconds
+        :type delay: float
+        :param callback: callback without arguments
+        :type callback: callable
+        :returns: Timer
+        """
+        loop = self.__get_loop()
+        now = loop.time()
+        if self.__count == 0:
+            self.__current = math.floor(now / self.__resolution)
+
+        deadline = max(math.ceil((now + delay) / self.__resolution), self.__current + 1)
+        timer = Timer(self, deadline, callback)
+        self.__slots[deadline % len(self.__slots)].add(timer)
+        self.__count += 1
+
+        if self.__handle is None:
+            self.__handle = loop.call_at((self.__current + 1) * self.__resolution, self.__tick)
+
+        return timer
+
+    def cancel(self, timer):
+        """
+        Cancel a given timer.
+
+        :param timer: timer
+        :type timer: Timer
+        """
+        slot = self.__slots[timer.deadline % len(self.__slots)]
+        if timer in slot:
+            slot.remove(timer)
+            self.__count -= 1
+        timer.wheel = None
+
+    def __get_loop(self):
+        if self.__loop is None:
+            self.__loop = asyncio.get_running_loop()
+        return self.__loop
+
+    def __tick(self):
+        """
+        Fire all expired timers.
+        """
+        self.__handle = None
+
+        loop = self.__loop
+        slots = self.__slots
+        now = math.floor(loop.time() / self.__resolution)
+        # every slot is visited at most once even if the loop was blocked for a long time
+        last = min(now, self.__current + len(slots))
+
+        expired = []
+        for tick in range(self.__current + 1, last + 1):
+            slot = slots[tick % len(slots)]
+            due = [timer for timer in slot if timer.deadline <= now]
+            if due:
+                slot.difference_update(due)
+                expired += due
+        self.__current = max(now, self.__current)
+        self.__count -= len(expired)
+
+        for timer in expired:
+            timer.wheel = None
+            try:
+                timer.callback()
+            except Exception as ex:
+                loop.call_exception_handler({
+                    'message': 'timer callback failed',
+                    'exception': ex,
+                })
+
+        if self.__count > 0 and self.__handle is None:
+            self.__handle = loop.call_at((self.__current + 1) * self.__resolution, self.__tick)
+
+
+# default timer wheels of event loops
+_default_wheels = weakref.WeakKeyDictionary()
+
+
+def get_timer_wheel(loop=None):
+    """
+    Get the default timer wheel of a given event loop.
+
+    :param loop: event loop (None means the running loop)
+    :type loop: asyncio.AbstractEventLoop
+    :returns: TimerWheel
+    """
+    if loop is None:
+        loop = asyncio.get_running_loop()
+    wheel = _default_wheels.get(loop)
+    if wheel is None:
+        wheel = _default_wheels[loop] = TimerWheel(loop=loop)
+    return wheel
@@ -1,5 +1,20 @@
+import asyncio
+import gzip
+import os
+import re
+import socket
+import zlib
+
+from protocolparser.http import BufferedHttpRequestReader
 from protocolparser.http import HttpRequestReader
 from protocolparser.http import HttpResponseReader
+from protocolparser.protocol import splice_header
+from protocolparser.timers import TimerWheel
+
+
+# the library readers have no __dict__, hooks are replaced on subclass instances
+class PatchedRequestReader(HttpRequestReader):
+    pass
 
 
 class TestRequest:
@@ -62,3 +77,703 @@ class TestResponse:
     def test_header_value(self):
         hdr = self.hrr.get_header(b'Test').value
         assert hdr == b'foobar'
+
+
+class TestZeroCopy:
+
+    class Reader(HttpRequestReader):
+
+        def __init__(self):
+            super().__init__(zero_copy=True)
+            self.chunks = []
+            self.messages = 0
+
+        def body_data_received(self, data):
+            self.chunks.append((type(data), bytes(data)))
+
+        def message_end_received(self):
+            self.messages += 1
+
+    def setup_method(self):
+        stream = bytes(b'POST /a HTTP/1.1\r\n'
+                       b'Content-Length: 5\r\n'
+                       b'\r\n'
+                       b'hello'
+                       b'POST /b HTTP/1.1\r\n'
+                       b'Content-Length: 5\r\n'
+                       b'\r\n'
+                       b'world')
+        self.hrr = self.Reader()
+        self.hrr.data_received(stream)
+
+    def test_messages_count(self):
+        assert self.hrr.messages == 2
+
+    def test_body_views(self):
+        assert self.hrr.chunks == [(memoryview, b'hello'), (memoryview, b'world')]
+
+
+class TestBufferedRequest:
+
+    class Reader(BufferedHttpRequestReader):
+
+        def __init__(self):
+            super().__init__(read_buffer_size=16)
+            self.body = b''
+            self.urls = []
+
+        def header_received(self):
+            self.urls.append(self.url)
+
+        def body_data_received(self, data):
+            self.body += data
+
+    def setup_method(self):
+        stream = bytes(b'POST /a HTTP/1.1\r\n'
+                       b'Content-Length: 26\r\n'
+                       b'\r\n'
+                       b'abcdefghijklmnopqrstuvwxyz'
+                       b'GET /b HTTP/1.1\r\n'
+                       b'\r\n')
+        self.hrr = self.Reader()
+        while stream:
+            buf = self.hrr.get_buffer(-1)
+            size = min(len(buf), len(stream))
+            buf[:size] = stream[:size]
+            stream = stream[size:]
+            self.hrr.buffer_updated(size)
+
+    def test_buffered_protocol(self):
+        assert isinstance(self.hrr, asyncio.BufferedProtocol)
+
+    def test_urls(self):
+        assert self.hrr.urls == ['/a', '/b']
+
+    def test_body(self):
+        assert self.hrr.body == b'abcdefghijklmnopqrstuvwxyz'
+
+
+class TestHeaderBlock:
+
+    stream = bytes(b'GET /test HTTP/1.1\r\n'
+                   b'Host: example.com\r\n'
+                   b'Test: foo\r\n bar\r\n'
+                   b'Invalid\r\n'
+                   b'\r\n')
+
+    class Reader(HttpRequestReader):
+
+        def __init__(self):
+            super().__init__()
+            self.errors = []
+            self.headers = None
+
+        def header_received(self):
+            self.headers = sorted((k, v.name, v.value) for k, v in self.get_headers())
+
+        def parse_error(self, msg):
+            self.errors.append(msg)
+
+    def parse(self, chunks):
+        reader = self.Reader()
+        for chunk in chunks:
+            reader.data_received(chunk)
+        return reader
+
+    def test_block_equals_fragmented(self):
+        block = self.parse([self.stream])
+        fragmented = self.parse([self.stream[i:i + 1] for i in range(len(self.stream))])
+        assert block.url == fragmented.url == '/test'
+        assert block.headers == fragmented.headers
+        assert block.errors == fragmented.errors == ['header field line does not contain ":"']
+
+    def test_long_line_in_block(self):
+        reader = PatchedRequestReader(max_line_length=32)
+        errors = []
+        reader.parse_error = errors.append
+        reader.data_received(b'GET / HTTP/1.1\r\nX-Long: ' + b'x' * 64 + b'\r\n\r\n')
+        assert errors[0] == 'line length exceeded'
+
+
+class TestRepeatedHeaders:
+
+    def setup_method(self):
+        stream = bytes(b'HTTP/1.1 401 Unauthorized\r\n'
+                       b'WWW-Authenticate: Digest realm="cam"\r\n'
+                       b'Content-Length: 10\r\n'
+                       b'www-authenticate: Basic realm="cam"\r\n'
+                       b'\r\n')
+        self.hrr = HttpResponseReader()
+        self.hrr.data_received(stream)
+
+    def test_headers_count(self):
+        assert len(self.hrr.get_headers()) == 3
+
+    def test_header_order(self):
+        names = [name for name, _ in self.hrr.get_headers()]
+        assert names == [b'www-authenticate', b'content-length', b'www-authenticate']
+
+    def test_last_header_value(self):
+        assert self.hrr.get_header(b'WWW-Authenticate').value == b'Basic realm="cam"'
+
+    def test_all_header_values(self):
+        values = [h.value for h in self.hrr.get_all_headers(b'WWW-Authenticate')]
+        assert values == [b'Digest realm="cam"', b'Basic realm="cam"']
+
+
+class TestFramingHeaders:
+
+    class Reader(HttpResponseReader):
+
+        def __init__(self):
+            super().__init__()
+            self.framing = []
+
+        def header_received(self):
+            self.framing.append((self.get_content_length(), self.is_chunked(), self.is_persistent()))
+
+        def close_connection(self):
+            self.framing.append('close')
+
+    def test_framing(self):
+        hrr = self.Reader()
+        hrr.data_received(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nab'
+                          b'HTTP/1.1 200 OK\r\nTransfer-Encoding: Chunked\r\nConnection: Close\r\n\r\n0\r\n\r\n')
+        assert hrr.framing == [(2, False, True), (None, True, False), 'close']
+        assert hrr.get_content_length() is None
+
+    def test_interned_names(self):
+        hrr = HttpResponseReader()
+        hrr.data_received(b'HTTP/1.1 200 OK\r\nContent-Type: a\r\nCONTENT-TYPE: b\r\nX-Foo: c\r\n\r\n')
+        keys = [key for key, _ in hrr.get_headers()]
+        assert keys == [b'content-type', b'content-type', b'x-foo']
+        assert keys[0] is keys[1]
+
+
+class TestFirstLine:
+
+    def test_request_line(self):
+        hrr = HttpRequestReader()
+        hrr.first_line_received(b'GET /caf%C3%A9?a=b HTTP/1.1')
+        assert (hrr.method, hrr.url, hrr.version) == ('GET', '/caf%C3%A9?a=b', '1.1')
+
+    def test_status_line(self):
+        hrr = HttpResponseReader()
+        hrr.first_line_received(b'HTTP/1.0 404 Not Found')
+        assert (hrr.version, hrr.status_code, hrr.reason_phrase) == ('1.0', 404, 'Not Found')
+
+    def test_invalid_first_line(self):
+        errors = []
+        hrr = PatchedRequestReader()
+        hrr.parse_error = errors.append
+        hrr.first_line_received(b'GET /a  HTTP/1.1')
+        assert errors == ['invalid first line']
+
+    def test_custom_first_line_re(self):
+
+        class Reader(HttpRequestReader):
+            first_line_re = re.compile(r"^(?P<method>\S+) (?P<url>\S*) HTTP/(?P<version>\d)$")
+
+        hrr = Reader()
+        hrr.first_line_received(b'GET / HTTP/2')
+        assert (hrr.method, hrr.url, hrr.version) == ('GET', '/', '2')
+
+
+class TestPipelined:
+
+    stream = bytes(b'GET /a HTTP/1.1\r\n'
+                   b'Host: example.com\r\n'
+                   b'\r\n'
+                   b'POST /b HTTP/1.1\r\n'
+                   b'Content-Length: 3\r\n'
+                   b'\r\n'
+                   b'abc'
+                   b'POST /c HTTP/1.1\r\n'
+                   b'Transfer-Encoding: chunked\r\n'
+                   b'\r\n'
+                   b'2\r\nde\r\n1\r\nf\r\n0\r\n\r\n'
+                   b'GET /d HTTP/1.1\r\n')
+
+    def test_parse_all(self):
+        hrr = HttpRequestReader()
+        messages = hrr.parse_all(self.stream)
+        assert [(m.method, m.url, m.body) for m in messages] == [
+            ('GET', '/a', b''),
+            ('POST', '/b', b'abc'),
+            ('POST', '/c', b'def'),
+        ]
+        assert messages[0].get_header(b'host').value == b'example.com'
+        assert hrr.parse_all(b'\r\n')[0].url == '/d'
+
+    def test_message_end_without_body(self):
+        ends = []
+        hrr = PatchedRequestReader()
+        hrr.message_end_received = lambda: ends.append(hrr.url)
+        hrr.data_received(b'GET /a HTTP/1.1\r\n\r\n')
+        assert ends == ['/a']
+
+
+class TestBodyLimits:
+
+    class Reader(HttpResponseReader):
+
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            self.errors = []
+            self.body = b''
+
+        def body_data_received(self, data):
+            self.body += data
+
+        def parse_error(self, msg):
+            self.errors.append(msg)
+
+    def test_content_length(self):
+        hrr = self.Reader(max_body_size=4)
+        hrr.data_received(b'HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\n12345')
+        assert hrr.errors == ['max body size exceeded']
+        assert hrr.body == b''
+
+    def test_conflicting_content_length(self):
+        hrr = self.Reader()
+        hrr.data_received(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\nContent-Length: 2\r\n\r\nab')
+        assert hrr.errors == [] and hrr.body == b'ab'
+        hrr.data_received(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\nContent-Length: 9\r\n\r\nab'
+                          b'HTTP/1.1 200 OK\r\nContent-Length: 1\r\n\r\nc')
+        assert hrr.errors == ['conflicting content length']
+        assert hrr.body == b'ab'
+
+    def test_unknown_length(self):
+        hrr = self.Reader(max_body_size=4)
+        hrr.data_received(b'HTTP/1.1 200 OK\r\n\r\n123')
+        hrr.data_received(b'45')
+        hrr.data_received(b'67')
+        assert hrr.errors == ['max body size exceeded']
+        assert hrr.body == b'123'
+
+    def test_chunk_size(self):
+        hrr = self.Reader(max_chunk_size=4)
+        hrr.data_received(b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n'
+                          b'4\r\n1234\r\n5\r\n12345\r\n0\r\n\r\n')
+        assert hrr.errors == ['max chunk size exceeded']
+        assert hrr.body == b'1234'
+
+    def test_chunked_body_size(self):
+        hrr = self.Reader(max_body_size=6)
+        hrr.data_received(b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n'
+                          b'4\r\n1234\r\n4\r\n1234\r\n0\r\n\r\n')
+        assert hrr.errors == ['max body size exceeded']
+        assert hrr.body == b'1234'
+
+
+class TestBodyFlowControl:
+
+    class Transport:
+
+        def __init__(self):
+            self.paused = False
+
+        def pause_reading(self):
+            self.paused = True
+
+        def resume_reading(self):
+            self.paused = False
+
+    def test_pause_and_resume(self):
+        transport = self.Transport()
+        hrr = HttpResponseReader()
+        hrr.connection_made(transport)
+        hrr.set_body_buffer_limits(8, 2)
+        hrr.data_received(b'HTTP/1.1 200 OK\r\n\r\n1234')
+        assert not transport.paused
+        hrr.data_received(b'5678')
+        assert transport.paused
+        hrr.body_data_processed(5)
+        assert transport.paused
+        hrr.body_data_processed(1)
+        assert not transport.paused
+        assert hrr.get_pending_body_size() == 2
+
+
+class TestChunked:
+
+    class Reader(HttpResponseReader):
+
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            self.events = []
+
+        def body_data_received(self, data):
+            self.events.append(bytes(data))
+
+        def message_end_received(self):
+            self.events.append(('end', [(n, f.value) for n, f in self.get_trailers()]))
+
+        def parse_error(self, msg):
+            self.events.append(('error', msg))
+
+    header = b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n'
+
+    def test_coalesced(self):
+        hrr = self.Reader()
+        hrr.data_received(self.header + b'3\r\nabc\r\n2;name=value\r\nde\r\n1\r\nf\r\n0\r\n\r\n')
+        assert hrr.events == [b'abcdef', ('end', [])]
+
+    def test_zero_copy(self):
+        hrr = self.Reader(zero_copy=True)
+        hrr.data_received(self.header + b'3\r\nabc\r\n2\r\nde\r\n0\r\n\r\n')
+        assert hrr.events == [b'abc', b'de', ('end', [])]
+
+    def test_byte_at_a_time(self):
+        hrr = self.Reader()
+        for b in self.header + b'A\r\n0123456789\r\n3 ; ext\r\nabc\r\n0\r\nX-Sum: 1\r\n 2\r\n\r\n':
+            hrr.data_received(bytes([b]))
+        assert b''.join(e for e in hrr.events if isinstance(e, bytes)) == b'0123456789abc'
+        assert hrr.events[-1] == ('end', [(b'x-sum', b'12')])
+
+    def test_invalid_chunk_size(self):
+        hrr = self.Reader()
+        hrr.data_received(self.header + b'3\r\nabc\r\n0x2\r\nde\r\n0\r\n\r\n')
+        assert hrr.events == [b'abc', ('error', 'unable to decode chunk size')]
+
+
+class TestBudgets:
+
+    class Loop:
+
+        def __init__(self):
+            self.now = 0.0
+            self.handles = []
+
+        def time(self):
+            return self.now
+
+        def call_at(self, when, callback):
+            self.handles.append((when, callback))
+
+        def advance(self, seconds):
+            self.now += seconds
+            while True:
+                due = [h for h in self.handles if h[0] <= self.now]
+                if not due:
+                    break
+                for handle in due:
+                    self.handles.remove(handle)
+                    handle[1]()
+
+    class Reader(HttpRequestReader):
+
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            self.errors = []
+            self.closed = False
+
+        def parse_error(self, msg):
+            self.errors.append(msg)
+
+        def close_connection(self):
+            self.closed = True
+
+    def setup_method(self):
+        self.loop = self.Loop()
+        self.wheel = TimerWheel(resolution=0.5, slots=8, loop=self.loop)
+
+    def test_timer_wheel(self):
+        fired = []
+        self.wheel.schedule(1.2, lambda: fired.append(1))
+        self.wheel.schedule(10, lambda: fired.append(2))
+        self.wheel.schedule(3, lambda: fired.append(3)).cancel()
+        self.loop.advance(1.0)
+        assert fired == []
+        self.loop.advance(0.5)
+        assert fired == [1]
+        self.loop.advance(20)
+        assert fired == [1, 2]
+        assert len(self.wheel) == 0 and self.loop.handles == []
+
+    def test_header_timeout(self):
+        hrr = self.Reader()
+        hrr.set_time_limits(header_timeout=2, timer_wheel=self.wheel)
+        hrr.data_received(b'GET / HTTP/1.1\r\n\r\nGET / HTTP/1.1\r\n')
+        self.loop.advance(1)
+        hrr.data_received(b'Host: a\r\n')
+        assert hrr.errors == []
+        self.loop.advance(1.5)
+        assert hrr.errors == ['header timeout exceeded'] and hrr.closed
+
+    def test_header_completed_in_time(self):
+        hrr = self.Reader()
+        hrr.set_time_limits(header_timeout=2, timer_wheel=self.wheel)
+        hrr.data_received(b'GET / HTTP/1.1\r\n')
+        self.loop.advance(1)
+        hrr.data_received(b'\r\n')
+        self.loop.advance(5)
+        assert hrr.errors == [] and len(self.wheel) == 0
+
+    def test_min_data_rate(self):
+        hrr = self.Reader()
+        hrr.set_time_limits(min_data_rate=10, rate_window=1, timer_wheel=self.wheel)
+        hrr.data_received(b'POST / HTTP/1.1\r\nContent-Length: 100\r\n\r\n')
+        for _ in range(3):
+            hrr.data_received(b'x' * 10)
+            self.loop.advance(1)
+        assert hrr.errors == []
+        hrr.data_received(b'x' * 5)
+        self.loop.advance(1)
+        assert hrr.errors == ['minimum data rate not reached'] and hrr.closed
+
+    def test_max_header_size(self):
+        for chunks in ([b'GET / HTTP/1.1\r\nA: 12345678\r\n\r\n'], [b'GET / HTTP/1.1\r\n', b'A: 12345678\r\n']):
+            hrr = self.Reader(max_header_size=24)
+            for chunk in chunks:
+                hrr.data_received(chunk)
+            assert hrr.errors == ['max header size exceeded']
+
+    def test_max_header_size_discards_rest(self):
+        headers = []
+        hrr = self.Reader(max_header_size=24)
+        hrr.header_received = lambda: headers.append(hrr.url)
+        hrr.data_received(b'GET / HTTP/1.1\r\nA: 12345678\r\n\r\nGET /smuggled HTTP/1.1\r\n\r\n')
+        hrr.data_received(b'GET /smuggled HTTP/1.1\r\n\r\n')
+        assert hrr.errors == ['max header size exceeded']
+        assert headers == []
+
+    def test_max_continuation_lines(self):
+        hrr = self.Reader(max_continuation_lines=2)
+        hrr.data_received(b'GET / HTTP/1.1\r\nA: 1\r\n 2\r\n 3\r\nB: 1\r\n 2\r\n 3\r\n\r\n')
+        assert hrr.errors == []
+        hrr.data_received(b'GET / HTTP/1.1\r\nA: 1\r\n 2\r\n 3\r\n 4\r\n\r\n')
+        assert hrr.errors == ['max continuation lines exceeded']
+
+
+class TestRelay:
+
+    class Transport:
+
+        def __init__(self):
+            self.data = bytearray()
+
+        def write(self, data):
+            self.data += data
+
+        def writelines(self, list_of_data):
+            for data in list_of_data:
+                self.data += data
+
+    class Reader(HttpRequestReader):
+
+        keep_raw_header = True
+
+        def __init__(self, transport, **kwargs):
+            super().__init__(**kwargs)
+            self.transport = transport
+            self.events = []
+
+        def header_received(self):
+            if self.get_header(b'X-Relay') is not None:
+                self.relay(self.transport)
+
+        def body_data_received(self, data):
+            self.events.append(bytes(data))
+
+        def message_end_received(self):
+            self.events.append(('end', self.get_raw_header()))
+
+    header = b'POST /a HTTP/1.1\r\nx-relay: 1\r\nHost: A\r\nHOST: B\r\n'
+    stream = bytes(header + b'Content-Length: 3\r\n\r\nabc'
+                   + header + b'Transfer-Encoding: chunked\r\n\r\n3;x\r\nabc\r\n0\r\nT: 1\r\n\r\n'
+                   + b'POST /b HTTP/1.1\r\nContent-Length: 2\r\n\r\nde')
+
+    def test_relay(self):
+        for zero_copy in (False, True):
+            for size in (len(self.stream), 1):
+                transport = self.Transport()
+                hrr = self.Reader(transport, zero_copy=zero_copy)
+                for i in range(0, len(self.stream), size):
+                    hrr.data_received(self.stream[i:i + size])
+                end = self.stream.index(b'POST /b')
+                assert transport.data == self.stream[:end]
+                assert b''.join(e for e in hrr.events if isinstance(e, bytes)) == b'de'
+                assert hrr.events[-1] == ('end', self.stream[end:-2])
+
+    def test_buffered_relay_over_sockets(self):
+        class Reader(BufferedHttpRequestReader):
+
+            keep_raw_header = True
+
+            def __init__(self, target, sink):
+                super().__init__(read_buffer_size=4096)
+                self.target = target
+                self.sink = sink
+
+            def header_received(self):
+                self.relay(self.target)
+
+            def message_end_received(self):
+                self.target.close()
+                self.sink.transport.resume_reading()
+
+        class Sink(asyncio.Protocol):
+
+            def __init__(self, done):
+                self.data = bytearray()
+                self.done = done
+
+            def connection_made(self, transport):
+                # the relayed data are queued by the target transport until the whole message is received
+                self.transport = transport
+                transport.pause_reading()
+
+            def data_received(self, data):
+                self.data += data
+
+            def connection_lost(self, exc):
+                self.done.set_result(bytes(self.data))
+
+        body = os.urandom(1 << 22)
+        message = b'POST / HTTP/1.1\r\nContent-Length: %d\r\n\r\n' % len(body) + body
+
+        async def main():
+            loop = asyncio.get_running_loop()
+            client, server = socket.socketpair()
+            relay, sink = socket.socketpair()
+            done = loop.create_future()
+            _, receiver = await loop.connect_accepted_socket(lambda: Sink(done), sink)
+            target, _ = await loop.connect_accepted_socket(asyncio.Protocol, relay)
+            transport, _ = await loop.connect_accepted_socket(lambda: Reader(target, receiver), server)
+            client.setblocking(False)
+            await loop.sock_sendall(client, message)
+            try:
+                return await asyncio.wait_for(done, 10)
+            finally:
+                transport.close()
+                client.close()
+
+        assert asyncio.run(main()) == message
+
+    def test_splice_header(self):
+        raw = b'GET / HTTP/1.1\r\nHost: a\r\nVia: 1\r\n  2\r\nhost: b\r\nX-A: 1\r\n\r\n'
+        segments = splice_header(raw, replace={b'HOST': b'c', b'Y': b'2'}, remove=[b'via'], append=[(b'Z', b'3')])
+        assert b''.join(segments) == b'GET / HTTP/1.1\r\nHost: c\r\nX-A: 1\r\nY: 2\r\nZ: 3\r\n\r\n'
+        assert b''.join(splice_header(raw)) == raw
+
+
+class TestTunnel:
+
+    class Reader(HttpResponseReader):
+
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            self.events = []
+
+        def body_data_received(self, data):
+            self.events.append(('body', bytes(data)))
+
+        def tunnel_data_received(self, data):
+            self.events.append(('tunnel', bytes(data)))
+
+        def close_connection(self):
+            self.events.append('close')
+
+    def test_switching_protocols(self):
+        hrr = self.Reader()
+        hrr.push_request('GET')
+        hrr.data_received(b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n\r\n'
+                          b'\x81\x02hi')
+        hrr.data_received(b'HTTP/1.1 200 OK\r\n\r\n')
+        hrr.eof_received()
+        assert hrr.is_tunnel()
+        assert hrr.events == [('tunnel', b'\x81\x02hi'), ('tunnel', b'HTTP/1.1 200 OK\r\n\r\n')]
+
+    def test_connect(self):
+        for method, tunnel in (('CONNECT', True), ('GET', False)):
+            hrr = self.Reader()
+            hrr.push_request(method)
+            hrr.data_received(b'HTTP/1.0 200 Connection established\r\n\r\nabc')
+            assert hrr.is_tunnel() == tunnel
+            assert hrr.events == ([('tunnel', b'abc')] if tunnel else [('body', b'abc')])
+
+    def test_start_tunnel(self):
+        class Reader(HttpRequestReader):
+            def header_received(self):
+                if self.is_upgrade_requested():
+                    self.start_tunnel()
+
+        hrr = Reader()
+        hrr.data_received(b'GET / HTTP/1.1\r\nContent-Length: 1\r\n\r\nx')
+        assert not hrr.is_tunnel()
+        hrr.data_received(b'CONNECT a:443 HTTP/1.1\r\nHost: a:443\r\n\r\n')
+        assert hrr.is_tunnel()
+
+
+class TestContentDecoding:
+
+    class Reader(HttpResponseReader):
+
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            self.raw = bytearray()
+            self.decoded = []
+            self.errors = []
+
+        def body_data_received(self, data):
+            self.raw += data
+
+        def decoded_body_data_received(self, data):
+            self.decoded.append(data)
+
+        def parse_error(self, msg):
+            self.errors.append(msg)
+
+    content = b'0123456789' * 1000
+
+    def response(self, encoding, body):
+        chunks = b''.join(b'%x\r\n%s\r\n' % (len(body[i:i + 100]), body[i:i + 100]) for i in range(0, len(body), 100))
+        return (b'HTTP/1.1 200 OK\r\nContent-Encoding: ' + encoding + b'\r\nTransfer-Encoding: chunked\r\n\r\n'
+                + chunks + b'0\r\n\r\n')
+
+    def test_gzip(self):
+        body = gzip.compress(self.content)
+        hrr = self.Reader()
+        hrr.set_content_decoding(window=1024)
+        for b in self.response(b'gzip', body):
+            hrr.data_received(bytes([b]))
+        assert hrr.errors == []
+        assert bytes(hrr.raw) == body
+        assert b''.join(hrr.decoded) == self.content
+        assert max(map(len, hrr.decoded)) <= 1024
+
+    def test_stacked(self):
+        deflate = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+        body = gzip.compress(deflate.compress(self.content) + deflate.flush())
+        hrr = self.Reader()
+        hrr.set_content_decoding()
+        hrr.data_received(self.response(b'deflate, gzip', body))
+        assert hrr.errors == []
+        assert b''.join(hrr.decoded) == self.content
+
+    def test_deflate_byte_by_byte(self):
+        for wbits in (zlib.MAX_WBITS, -zlib.MAX_WBITS):
+            deflate = zlib.compressobj(wbits=wbits)
+            body = deflate.compress(self.content) + deflate.flush()
+            hrr = self.Reader()
+            hrr.set_content_decoding()
+            for b in self.response(b'deflate', body):
+                hrr.data_received(bytes([b]))
+            assert hrr.errors == []
+            assert b''.join(hrr.decoded) == self.content
+
+    def test_max_decoded_size(self):
+        hrr = self.Reader()
+        hrr.set_content_decoding(max_decoded_size=5000, window=1024)
+        hrr.data_received(self.response(b'gzip', gzip.compress(self.content)))
+        assert hrr.errors == ['max decoded body size exceeded']
+        assert sum(map(len, hrr.decoded)) <= 5000
+
+    def test_disabled_and_unsupported(self):
+        hrr = self.Reader()
+        hrr.data_received(self.response(b'gzip', gzip.compress(self.content)))
+        hrr.set_content_decoding()
+        hrr.data_received(self.response(b'br', b'abc'))
+        assert hrr.decoded == []
+        assert hrr.errors == ['unsupported content encoding: br']
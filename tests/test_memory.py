@@ -0,0 +1,41 @@
+import gc
+import tracemalloc
+
+import pytest
+
+from protocolparser.http import BufferedHttpRequestReader
+from protocolparser.http import HttpRequestReader
+from protocolparser.http import HttpResponseReader
+from protocolparser.rtsp import RtspRequestReader
+from protocolparser.rtsp import RtspResponseReader
+
+# maximum memory taken by a reader waiting for the next message
+IDLE_READER_BUDGET = 1024
+
+
+class TestIdleFootprint:
+
+    @pytest.mark.parametrize('reader_class, message', [
+        (HttpRequestReader, b'POST / HTTP/1.1\r\nHost: a\r\nContent-Length: 2\r\n\r\nab'),
+        (BufferedHttpRequestReader, b'GET / HTTP/1.1\r\nHost: a\r\n\r\n'),
+        (HttpResponseReader, b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n2\r\nab\r\n0\r\n\r\n'),
+        (RtspRequestReader, b'OPTIONS * RTSP/1.0\r\nCSeq: 1\r\n\r\n'),
+        (RtspResponseReader, b'RTSP/1.0 200 OK\r\nCSeq: 1\r\n\r\n$\x00\x00\x01x'),
+    ])
+    def test_idle_reader(self, reader_class, message):
+        count = 1000
+        gc.collect()
+        tracemalloc.start()
+        try:
+            readers = []
+            for _ in range(count):
+                reader = reader_class()
+                if isinstance(reader, (HttpResponseReader, RtspResponseReader)):
+                    reader.push_request('GET')
+                reader.data_received(message)
+                readers.append(reader)
+            size = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        assert all(reader.is_message_start() for reader in readers)
+        assert size / count < IDLE_READER_BUDGET
@@ -0,0 +1,71 @@
+import asyncio
+import gc
+
+from protocolparser.http import HttpRequestReader
+from protocolparser.metrics import MetricsRegistry
+from protocolparser.metrics import instrumented
+from protocolparser.metrics import start_metrics_server
+
+
+class TestMetrics:
+
+    def setup_method(self):
+        self.registry = MetricsRegistry(sample_interval=1)
+        self.reader = instrumented(HttpRequestReader, self.registry)(max_line_length=64)
+
+    def test_counters(self):
+        data = (b'POST /a HTTP/1.1\r\nHost: a\r\nContent-Length: 3\r\n\r\nabc'
+                b'GET /b HTTP/1.1\r\nHost: b\r\nX-Long: 1\r\n 2\r\n\t3\r\n\r\n')
+        self.reader.data_received(data)
+        metrics = self.reader.metrics
+        assert metrics.bytes == len(data)
+        assert metrics.messages == 2
+        # first lines, header fields and continuation lines
+        assert metrics.header_lines == 8
+        assert metrics.body_bytes == 3
+        assert metrics.raw_mode_switches == 1
+        histograms = self.registry.get_histograms()
+        assert histograms[('header_phase_seconds', 'HttpRequestReader')].count == 2
+        assert histograms[('body_phase_seconds', 'HttpRequestReader')].count == 2
+
+    def test_parse_errors(self):
+        self.reader.data_received(b'GET /a HTTP/1.1\r\nX: ' + b'a' * 100 + b'\r\n')
+        self.reader.data_received(b'x\r\n')
+        assert self.reader.metrics.line_length_exceeded == 1
+        assert self.reader.metrics.parse_errors['line length exceeded'] == 1
+
+    def test_aggregation(self):
+        self.reader.data_received(b'GET /a HTTP/1.1\r\n\r\n')
+        cls = type(self.reader)
+        other = cls()
+        other.data_received(b'GET /b HTTP/1.1\r\n\r\n')
+        del other
+        gc.collect()
+        assert self.registry.collect()['HttpRequestReader'].messages == 2
+        assert instrumented(HttpRequestReader, self.registry) is cls
+
+    def test_not_instrumented(self):
+        assert not hasattr(HttpRequestReader(), 'metrics')
+
+    def test_export(self):
+        self.reader.data_received(b'BAD\r\n')
+        text = self.registry.export_prometheus()
+        assert 'protocolparser_messages_total{reader="HttpRequestReader"} 0\n' in text
+        assert 'protocolparser_parse_errors_total{reader="HttpRequestReader",reason="invalid first line"} 1\n' in text
+
+    def test_metrics_server(self):
+        async def scrape():
+            server = await start_metrics_server(self.registry, port=0)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b'GET /metrics HTTP/1.0\r\n\r\n')
+            response = await reader.read()
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return response
+
+        self.reader.data_received(b'GET /a HTTP/1.1\r\n\r\n')
+        response = asyncio.run(scrape())
+        assert response.startswith(b'HTTP/1.1 200 OK\r\n')
+        assert b'protocolparser_messages_total{reader="HttpRequestReader"} 1\n' in response
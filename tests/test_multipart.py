@@ -0,0 +1,92 @@
+from protocolparser.http import HttpResponseReader
+from protocolparser.multipart import MultipartMixin
+from protocolparser.multipart import get_boundary
+
+
+class EventReader(HttpResponseReader):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.events = []
+
+    def body_data_received(self, data):
+        self.events.append(('body', bytes(data)))
+
+    def part_received(self, headers, payload):
+        field = headers.get(b'content-type')
+        self.events.append(('part', field.value if field else None, type(payload), bytes(payload)))
+
+    def parse_error(self, msg):
+        self.events.append(('error', msg))
+
+
+class Reader(MultipartMixin, EventReader):
+    pass
+
+
+class TestMultipart:
+
+    stream = bytes(b'HTTP/1.0 200 OK\r\n'
+                   b'Content-Type: multipart/x-mixed-replace; boundary="frame"\r\n'
+                   b'\r\n'
+                   b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n'
+                   b'Content-Length: 6\r\n'
+                   b'\r\n'
+                   b'\xff\xd8ab\xff\xd9'
+                   b'\r\n--frame  \r\n'
+                   b'Content-Type: image/jpeg\r\n'
+                   b'\r\n'
+                   b'x\r\n--fram'
+                   b'\r\n--frame\r\n'
+                   b'\r\n'
+                   b'last'
+                   b'\r\n--frame--\r\n'
+                   b'epilogue')
+
+    expected = [('part', b'image/jpeg', memoryview, b'\xff\xd8ab\xff\xd9'),
+                ('part', b'image/jpeg', memoryview, b'x\r\n--fram'),
+                ('part', None, memoryview, b'last')]
+
+    def test_get_boundary(self):
+        assert get_boundary(b'multipart/x-mixed-replace;boundary=--abc') == b'--abc'
+        assert get_boundary(b'Multipart/Mixed; charset=x; Boundary="a b"') == b'a b'
+        assert get_boundary(b'image/jpeg; boundary=abc') is None
+
+    def test_single_read(self):
+        reader = Reader()
+        reader.data_received(self.stream)
+        reader.connection_lost(None)
+        assert reader.events == self.expected
+
+    def test_fragmented(self):
+        reader = Reader()
+        for i in range(len(self.stream)):
+            reader.data_received(self.stream[i:i + 1])
+        reader.connection_lost(None)
+        assert reader.events == self.expected
+
+    def test_dashed_boundary(self):
+        reader = Reader()
+        reader.data_received(b'HTTP/1.0 200 OK\r\n'
+                             b'Content-Type: multipart/x-mixed-replace;boundary=--frame\r\n'
+                             b'\r\n'
+                             b'--frame\r\n\r\nab\r\n--frame\r\n\r\ncd\r\n')
+        assert reader.events == [('part', None, memoryview, b'ab')]
+
+    def test_max_part_size(self):
+        reader = Reader(max_part_size=4)
+        reader.data_received(b'HTTP/1.0 200 OK\r\n'
+                             b'Content-Type: multipart/mixed; boundary=frame\r\n'
+                             b'\r\n'
+                             b'--frame\r\n\r\n123')
+        reader.data_received(b'456\r\n--frame\r\n\r\nab\r\n--frame--')
+        assert reader.events == [('error', 'max part size exceeded')]
+
+    def test_other_body(self):
+        reader = Reader()
+        reader.data_received(b'HTTP/1.1 200 OK\r\n'
+                             b'Content-Length: 4\r\n'
+                             b'\r\n'
+                             b'body')
+        assert reader.events == [('body', b'body')]
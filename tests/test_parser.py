@@ -0,0 +1,56 @@
+from protocolparser.http import HttpRequestReader
+from protocolparser.http import HttpResponseReader
+from protocolparser.parser import BodyChunk
+from protocolparser.parser import ConnectionClose
+from protocolparser.parser import Header
+from protocolparser.parser import InterleavedFrame
+from protocolparser.parser import MessageEnd
+from protocolparser.parser import Parser
+from protocolparser.parser import RequestLine
+from protocolparser.parser import StatusLine
+from protocolparser.rtsp import RtspConnectionReader
+from protocolparser.rtsp import RtspResponseReader
+
+
+class TestParser:
+
+    def test_request(self):
+        parser = Parser(HttpRequestReader)
+        events = parser.feed(b'POST /a HTTP/1.1\r\nContent-Length: 3\r\n\r\nab')
+        events += parser.feed(b'c')
+        assert events == [RequestLine('POST', '/a', '1.1'),
+                          Header(b'Content-Length', b'3'),
+                          BodyChunk(b'ab'),
+                          BodyChunk(b'c'),
+                          MessageEnd()]
+
+    def test_response_until_close(self):
+        parser = Parser(HttpResponseReader)
+        parser.push_request('GET')
+        events = parser.feed(b'HTTP/1.0 200 OK\r\n\r\nbody')
+        assert events == [StatusLine('1.0', 200, 'OK'), BodyChunk(b'body')]
+        assert parser.close() == [MessageEnd(), ConnectionClose()]
+
+    def test_head_response(self):
+        parser = Parser(HttpResponseReader)
+        parser.push_request('HEAD')
+        events = parser.feed(b'HTTP/1.1 200 OK\r\nContent-Length: 10\r\n\r\n')
+        assert events == [StatusLine('1.1', 200, 'OK'), Header(b'Content-Length', b'10'), MessageEnd()]
+
+    def test_rtsp_interleaved(self):
+        parser = Parser(RtspResponseReader, zero_copy=True)
+        assert parser.feed(b'$\x01\x00\x02ab') == [InterleavedFrame(1, b'ab')]
+
+    def test_rtsp_connection(self):
+        parser = Parser(RtspConnectionReader)
+        parser.push_request('OPTIONS', 1)
+        events = parser.feed(b'RTSP/1.0 200 OK\r\nCSeq: 1\r\n\r\n'
+                             b'SET_PARAMETER rtsp://a RTSP/1.0\r\nCSeq: 5\r\nContent-Length: 2\r\n\r\nab')
+        assert events == [StatusLine('1.0', 200, 'OK'),
+                          Header(b'CSeq', b'1'),
+                          MessageEnd(),
+                          RequestLine('SET_PARAMETER', 'rtsp://a', '1.0'),
+                          Header(b'CSeq', b'5'),
+                          Header(b'Content-Length', b'2'),
+                          BodyChunk(b'ab'),
+                          MessageEnd()]
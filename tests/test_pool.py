@@ -0,0 +1,52 @@
+from protocolparser.http import HttpRequestReader
+from protocolparser.pool import ReaderPool
+from protocolparser.protocol import HeaderFields
+from protocolparser.rtsp import RtspResponseReader
+
+
+def state(reader):
+    names = {'_%s%s' % (cls.__name__.lstrip('_'), name) if name.startswith('__') else name
+             for cls in type(reader).__mro__ for name in getattr(cls, '__slots__', ())}
+    names.update(getattr(reader, '__dict__', ()))
+    values = {name: getattr(reader, name, None) for name in names}
+    return {name: list(value) if isinstance(value, HeaderFields) else value for name, value in values.items()}
+
+
+class Transport:
+
+    def pause_reading(self):
+        pass
+
+
+class TestReaderPool:
+
+    def test_reuse(self):
+        pool = ReaderPool(HttpRequestReader, max_headers=8)
+        reader = pool()
+        reader.connection_made(Transport())
+        reader.connection_lost(None)
+        assert len(pool) == 1
+        assert pool() is reader
+        assert len(pool) == 0
+
+    def test_scrub(self):
+        pool = ReaderPool(RtspResponseReader, max_size=1)
+        fresh = state(pool())
+
+        reader = pool()
+        reader.connection_made(Transport())
+        reader.set_body_buffer_limits(4, 2)
+        reader.push_request('DESCRIBE')
+        reader.push_request('PLAY')
+        reader.data_received(b'RTSP/1.0 200 OK\r\nCSeq: 1\r\nContent-Length: 10\r\n\r\n12345$\x00\x00')
+        reader.connection_lost(None)
+
+        assert pool() is reader
+        assert state(reader) == fresh
+
+    def test_max_size(self):
+        pool = ReaderPool(HttpRequestReader, max_size=1)
+        readers = [pool(), pool()]
+        for reader in readers:
+            reader.connection_lost(None)
+        assert len(pool) == 1
@@ -0,0 +1,66 @@
+from protocolparser.protocol import LineReader
+
+
+class Reader(LineReader):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lines = []
+        self.raw = []
+        self.exceeded = 0
+
+    def line_received(self, line):
+        self.lines.append(line)
+        if line == b'RAW':
+            self.set_raw_mode(True)
+
+    def line_length_exceeded(self):
+        self.exceeded += 1
+
+    def raw_data_received(self, data):
+        self.raw.append(bytes(data))
+        return len(data)
+
+
+class TestLineReader:
+
+    def test_byte_at_a_time(self):
+        reader = Reader()
+        for b in b'first\r\nsecond\r\n\r\nthird':
+            reader.data_received(bytes([b]))
+        assert reader.lines == [b'first', b'second', b'']
+
+    def test_split_delimiter(self):
+        reader = Reader(delimiter=b'\r\n\r\n')
+        reader.data_received(b'abc\r\n\r')
+        reader.data_received(b'\ndef\r\n')
+        reader.data_received(b'\r\n')
+        assert reader.lines == [b'abc', b'def']
+
+    def test_raw_mode(self):
+        reader = Reader()
+        reader.data_received(b'a\r\nRAW\r\nb\r\n')
+        assert reader.lines == [b'a', b'RAW']
+        assert reader.raw == [b'b\r\n']
+
+    def test_raw_mode_with_buffered_data(self):
+        reader = Reader()
+        reader.data_received(b'partial')
+        reader.set_raw_mode(True)
+        assert reader.raw == [b'partial']
+
+    def test_line_length_exceeded(self):
+        reader = Reader(buffer_limit=8)
+        reader.data_received(b'123456\r\n')
+        reader.data_received(b'1234567\r\n')
+        assert reader.lines == [b'123456']
+        assert reader.exceeded == 1
+
+    def test_fragmented_line_length_exceeded(self):
+        reader = Reader(buffer_limit=8)
+        reader.data_received(b'1234')
+        reader.data_received(b'5678')
+        assert reader.exceeded == 0
+        reader.data_received(b'9')
+        assert reader.exceeded == 1
+        assert reader.lines == []
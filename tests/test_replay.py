@@ -0,0 +1,58 @@
+import json
+import struct
+
+from protocolparser.replay import main
+
+
+def pcap_packet(src, sport, dst, dport, seq, flags, payload=b''):
+    tcp = struct.pack('!HHIIBBHHH', sport, dport, seq, 0, 5 << 4, flags, 65535, 0, 0) + payload
+    ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(tcp), 0, 0, 64, 6, 0, bytes(src), bytes(dst)) + tcp
+    frame = b'\x00' * 12 + b'\x08\x00' + ip
+    return struct.pack('<IIII', 0, 0, len(frame), len(frame)) + frame
+
+
+def read_records(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+class TestReplay:
+
+    def test_stream_files(self, tmp_path):
+        stream = tmp_path / 'stream.bin'
+        stream.write_bytes(b'RTSP/1.0 200 OK\r\nCSeq: 1\r\nContent-Length: 3\r\n\r\nabc'
+                           b'$\x00\x00\x02xy'
+                           b'RTSP/1.0 200 OK\r\nCSeq: 2\r\n\r\n'
+                           b'RTSP/1.0 200')
+        output = tmp_path / 'out.jsonl'
+        main(['--reader', 'rtsp-response', '-j', '1', '-o', str(output), str(stream)])
+        records = read_records(output)
+        assert [r['first_line'] for r in records[:3]] == ['RTSP/1.0 200 OK', 'RTSP/1.0 200 OK', None]
+        assert records[0]['headers'] == [['CSeq', '1'], ['Content-Length', '3']]
+        assert records[0]['body_size'] == 3
+        assert records[2]['incomplete'] and records[2]['errors'] == ['incomplete message']
+        assert records[3]['summary'] and records[3]['messages'] == 2 and records[3]['interleaved_frames'] == 1
+
+    def test_pcap(self, tmp_path):
+        client, server = (10, 0, 0, 1), (10, 0, 0, 2)
+        request = b'HEAD / HTTP/1.1\r\nHost: a\r\n\r\n'
+        response = b'HTTP/1.1 200 OK\r\nContent-Length: 10\r\n\r\nHTTP/1.1 204 No Content\r\n\r\n'
+        capture = struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 65535, 1)
+        capture += pcap_packet(client, 5000, server, 80, 99, 0x02)
+        capture += pcap_packet(server, 80, client, 5000, 499, 0x12)
+        capture += pcap_packet(client, 5000, server, 80, 100, 0x18, request)
+        # out of order and retransmitted segments
+        capture += pcap_packet(server, 80, client, 5000, 520, 0x18, response[20:])
+        capture += pcap_packet(server, 80, client, 5000, 500, 0x18, response[:20])
+        capture += pcap_packet(server, 80, client, 5000, 500, 0x18, response[:30])
+        path = tmp_path / 'capture.pcap'
+        path.write_bytes(capture)
+        output = tmp_path / 'out.jsonl'
+        main(['--pcap', '-j', '2', '-o', str(output), str(path), str(path)])
+        records = read_records(output)
+        assert len(records) == 10
+        assert records[0]['stream'] == '10.0.0.1:5000-10.0.0.2:80 request'
+        assert records[0]['first_line'] == 'HEAD / HTTP/1.1'
+        assert [r.get('first_line') for r in records[2:4]] == ['HTTP/1.1 200 OK', 'HTTP/1.1 204 No Content']
+        assert records[4]['bytes'] == len(response) and not records[2]['errors']
+        assert records[5:] == records[:5]
@@ -0,0 +1,225 @@
+import re
+
+from protocolparser.rtsp import RtspConnectionReader
+from protocolparser.rtsp import RtspRequestReader
+from protocolparser.rtsp import RtspResponseReader
+from protocolparser.timers import TimerWheel
+
+
+class Reader(RtspResponseReader):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.events = []
+
+    def header_received(self):
+        self.events.append(('header', self.status_code))
+
+    def body_data_received(self, data):
+        self.events.append(('body', bytes(data)))
+
+    def interleaved_data_received(self, channel, data):
+        self.events.append(('frame', channel, type(data), bytes(data)))
+
+    def parse_error(self, msg):
+        self.events.append(('error', msg))
+
+
+# the library readers have no __dict__, hooks are replaced on subclass instances
+class PatchedRequestReader(RtspRequestReader):
+    pass
+
+
+class TestInterleaved:
+
+    stream = bytes(b'RTSP/1.0 200 OK\r\n'
+                   b'CSeq: 4\r\n'
+                   b'Content-Length: 4\r\n'
+                   b'\r\n'
+                   b'body'
+                   b'$\x00\x00\x03abc'
+                   b'$\x01\x00\x00'
+                   b'RTSP/1.0 200 OK\r\n'
+                   b'CSeq: 5\r\n'
+                   b'Content-Length: 0\r\n'
+                   b'\r\n'
+                   b'$\x00\x00\x02de')
+
+    expected = [('header', 200),
+                ('body', b'body'),
+                ('frame', 0, bytes, b'abc'),
+                ('frame', 1, bytes, b''),
+                ('header', 200),
+                ('frame', 0, bytes, b'de')]
+
+    def test_single_read(self):
+        reader = Reader()
+        reader.data_received(self.stream)
+        assert reader.events == self.expected
+
+    def test_fragmented(self):
+        reader = Reader()
+        for i in range(len(self.stream)):
+            reader.data_received(self.stream[i:i + 1])
+        events = []
+        for event in reader.events:
+            if event[0] == 'body' and events and events[-1][0] == 'body':
+                events[-1] = ('body', events[-1][1] + event[1])
+            else:
+                events.append(event)
+        assert events == self.expected
+
+    def test_zero_copy(self):
+        reader = Reader(zero_copy=True)
+        reader.data_received(self.stream[:-2])
+        reader.data_received(self.stream[-2:])
+        frames = [e[1:] for e in reader.events if e[0] == 'frame']
+        assert frames == [(0, memoryview, b'abc'), (1, memoryview, b''), (0, memoryview, b'de')]
+
+
+class TestInterleavedRequest:
+
+    def test_frame_before_request(self):
+        received = []
+        reader = PatchedRequestReader()
+        reader.interleaved_data_received = lambda channel, data: received.append((channel, data))
+        reader.data_received(b'$\x02\x00\x01xOPTIONS * RTSP/1.0\r\nCSeq: 1\r\n\r\n')
+        assert received == [(2, b'x')]
+        assert reader.method == 'OPTIONS'
+
+    def test_frame_after_fragmented_response(self):
+        reader = Reader()
+        reader.data_received(b'RTSP')
+        reader.data_received(b'/1.0 200 OK\r\nCSeq: 4\r\n\r\n$\x00\x00\x01x')
+        assert reader.events == [('header', 200), ('frame', 0, bytes, b'x')]
+
+
+class TestRtspHeaders:
+
+    def test_cseq_and_session(self):
+        values = []
+        reader = Reader()
+        reader.header_received = lambda: values.append((reader.get_cseq(), reader.get_session()))
+        reader.data_received(b'RTSP/1.0 200 OK\r\nCSeq: 3\r\nSession: 12345678;timeout=60\r\n\r\n'
+                             b'RTSP/1.0 200 OK\r\nCSeq: x\r\n\r\n')
+        assert values == [(3, b'12345678'), (None, None)]
+
+
+class TestConnectionReader:
+
+    class Loop:
+
+        def __init__(self):
+            self.now = 0.0
+            self.handles = []
+
+        def time(self):
+            return self.now
+
+        def call_at(self, when, callback):
+            self.handles.append((when, callback))
+
+        def advance(self, seconds):
+            self.now += seconds
+            for handle in sorted(h for h in self.handles if h[0] <= self.now):
+                self.handles.remove(handle)
+                handle[1]()
+
+    class Reader(RtspConnectionReader):
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.events = []
+
+        def header_received(self):
+            if self.is_response():
+                self.events.append(('response', self.get_cseq(), self.status_code, self.get_request_method()))
+            else:
+                self.events.append(('request', self.get_cseq(), self.method, self.url))
+
+        def body_data_received(self, data):
+            self.events.append(('body', bytes(data)))
+
+        def request_timeout_expired(self, cseq, method):
+            self.events.append(('timeout', cseq, method))
+
+    def test_out_of_order_responses(self):
+        reader = self.Reader()
+        reader.push_request('setup', 1)
+        reader.push_request('SETUP', 2)
+        reader.push_request('PLAY', 3)
+        reader.data_received(b'RTSP/1.0 200 OK\r\nCSeq: 2\r\n\r\n'
+                             b'ANNOUNCE rtsp://a/b RTSP/1.0\r\nCSeq: 7\r\nContent-Length: 3\r\n\r\nsdp'
+                             b'RTSP/1.0 200 OK\r\nCSeq: 1\r\n\r\n'
+                             b'RTSP/1.0 200 OK\r\nCSeq: 9\r\n\r\n')
+        assert reader.events == [('response', 2, 200, 'SETUP'),
+                                 ('request', 7, 'ANNOUNCE', 'rtsp://a/b'),
+                                 ('body', b'sdp'),
+                                 ('response', 1, 200, 'SETUP'),
+                                 ('response', 9, 200, None)]
+        assert reader.get_pending_requests() == [3]
+
+    def test_request_timeout(self):
+        loop = self.Loop()
+        reader = self.Reader()
+        reader.set_request_timeout(2, TimerWheel(resolution=0.5, slots=8, loop=loop))
+        reader.push_request('DESCRIBE', 1)
+        reader.push_request('OPTIONS', 2)
+        loop.advance(1)
+        reader.data_received(b'RTSP/1.0 200 OK\r\nCSeq: 2\r\nContent-Length: 4\r\n\r\nab')
+        loop.advance(2)
+        # expirations are checked again once the response being received ends
+        assert reader.events == [('response', 2, 200, 'OPTIONS'), ('body', b'ab')]
+        reader.data_received(b'cd')
+        assert reader.events[2:] == [('body', b'cd'), ('timeout', 1, 'DESCRIBE')]
+        assert reader.get_pending_requests() == []
+        assert loop.handles == []
+
+    def test_timeout_while_receiving_response_header(self):
+        loop = self.Loop()
+        reader = self.Reader()
+        reader.set_request_timeout(2, TimerWheel(resolution=0.5, slots=8, loop=loop))
+        reader.push_request('SETUP', 1)
+        reader.push_request('SETUP', 2)
+        reader.data_received(b'RTSP/1.0 200 OK\r\nSession: 1\r\n')
+        loop.advance(3)
+        assert reader.events == []
+        reader.data_received(b'CSeq: 1\r\n\r\n')
+        # the other request is expired once the response ends
+        assert reader.events == [('response', 1, 200, 'SETUP'), ('timeout', 2, 'SETUP')]
+        assert reader.get_pending_requests() == []
+
+    def test_custom_first_line_re(self):
+
+        class Reader(self.Reader):
+            first_line_re = re.compile(r"^(?:(?P<method>\S+) (?P<url>\S*) )?RTSP/(?P<version>\d)"
+                                       r"(?: (?P<status_code>\d{3}) (?P<reason_phrase>.*))?$")
+
+        reader = Reader()
+        reader.push_request('PLAY', 1)
+        reader.data_received(b'RTSP/2 200 OK\r\nCSeq: 1\r\n\r\n'
+                             b'REDIRECT rtsp://b RTSP/2\r\nCSeq: 2\r\n\r\n')
+        assert reader.events == [('response', 1, 200, 'PLAY'), ('request', 2, 'REDIRECT', 'rtsp://b')]
+
+    def test_timeout_while_receiving_invalid_response(self):
+        loop = self.Loop()
+        reader = self.Reader()
+        reader.set_request_timeout(2, TimerWheel(resolution=0.5, slots=8, loop=loop))
+        reader.push_request('SETUP', 1)
+        reader.push_request('SETUP', 2)
+        reader.data_received(b'RTSP/1.0 200 OK\r\nCSeq: 1\r\n')
+        loop.advance(3)
+        assert reader.events == []
+        reader.data_received(b'Content-Length: 1\r\nContent-Length: 2\r\n\r\n')
+        assert sorted(reader.events) == [('timeout', 1, 'SETUP'), ('timeout', 2, 'SETUP')]
+        assert reader.get_pending_requests() == []
+
+    def test_timeout_while_receiving_response_before_connection_lost(self):
+        loop = self.Loop()
+        reader = self.Reader()
+        reader.set_request_timeout(2, TimerWheel(resolution=0.5, slots=8, loop=loop))
+        reader.push_request('PLAY', 1)
+        reader.data_received(b'RTSP/1.0 200 OK\r\nCSeq: 1\r\n')
+        loop.advance(3)
+        reader.connection_lost(None)
+        assert reader.events == [('timeout', 1, 'PLAY')]
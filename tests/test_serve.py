@@ -0,0 +1,107 @@
+import os
+import signal
+import socket
+import threading
+import time
+
+import pytest
+
+from protocolparser.http import HttpRequestReader
+from protocolparser.http import HttpResponseReader
+from protocolparser.serve import MultiProcessServer, is_reuse_port_supported
+
+
+class Responder(HttpRequestReader):
+
+    def connection_made(self, transport):
+        super().connection_made(transport)
+        self.transport = transport
+
+    def message_end_received(self):
+        body = str(os.getpid()).encode()
+        if not self.transport.is_closing():
+            self.transport.write(b'HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s' % (len(body), body))
+
+
+class Client(HttpResponseReader):
+
+    def __init__(self):
+        super().__init__()
+        self.bodies = []
+
+    def body_data_received(self, data):
+        self.bodies[-1] += data
+
+    def header_received(self):
+        self.bodies.append(b'')
+
+
+def request(port, count=1):
+    """
+    Send given number of pipelined requests and return the response bodies.
+    """
+    client = Client()
+    with socket.create_connection(('127.0.0.1', port), timeout=5) as sock:
+        sock.sendall(b'GET / HTTP/1.1\r\nHost: a\r\n\r\n' * count)
+        for _ in range(count):
+            client.push_request('GET')
+        while len(client.bodies) < count or not client.is_message_start():
+            data = sock.recv(65536)
+            if not data:
+                break
+            client.data_received(data)
+    return client.bodies
+
+
+@pytest.mark.parametrize('reuse_port', [False, pytest.param(True, marks=pytest.mark.skipif(
+    not is_reuse_port_supported(), reason='SO_REUSEPORT is not supported'))])
+class TestMultiProcessServer:
+
+    def test_serve_and_restart(self, reuse_port):
+        server = MultiProcessServer(Responder, workers=2, reuse_port=reuse_port, stats_interval=0.1,
+                                    restart_delay=0, drain_timeout=1)
+        server.start()
+        try:
+            pids = {int(body) for _ in range(10) for body in request(server.get_port(), 3)}
+            assert pids <= {stats['pid'] for stats in server.get_worker_stats()}
+
+            os.kill(server.get_worker_stats()[0]['pid'], signal.SIGKILL)
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline:
+                server.poll(0.1)
+                stats = server.get_worker_stats()[0]
+                if stats['restarts'] == 1 and stats['ready']:
+                    break
+            else:
+                pytest.fail('the worker has not been restarted')
+            pids = {int(body) for _ in range(10) for body in request(server.get_port())}
+            assert pids <= {stats['pid'] for stats in server.get_worker_stats()}
+        finally:
+            server.stop()
+
+        assert all(stats['pid'] is None for stats in server.get_worker_stats())
+        # the last snapshots of the killed worker may be lost
+        assert server.registry.collect()['Responder'].messages >= 1
+
+    def test_drain(self, reuse_port):
+        server = MultiProcessServer(Responder, workers=1, reuse_port=reuse_port, stats_interval=0.1, drain_timeout=5)
+        server.start()
+        with socket.create_connection(('127.0.0.1', server.get_port()), timeout=5) as sock:
+            sock.sendall(b'GET / HTTP/1.1\r\nHost: a\r\n')
+            # the worker handles the connection before it is asked to stop
+            while server.get_worker_stats()[0]['connections'] == 0:
+                server.poll(0.1)
+            stopping = threading.Thread(target=server.stop)
+            stopping.start()
+            time.sleep(0.3)
+            # the message in progress is finished and the idle connection is closed
+            sock.sendall(b'\r\n')
+            data = b''
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                data += chunk
+            stopping.join()
+        assert data.startswith(b'HTTP/1.1 200 OK')
+        assert server.registry.collect()['Responder'].messages == 1
@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+
+from protocolparser.http import HttpRequestReader
+from protocolparser.rtsp import RtspResponseReader
+from protocolparser.streams import ParseError, streaming
+
+
+class Transport:
+
+    def __init__(self):
+        self.paused = False
+
+    def pause_reading(self):
+        self.paused = True
+
+    def resume_reading(self):
+        self.paused = False
+
+
+class TestStreams:
+
+    def setup_method(self):
+        self.transport = Transport()
+
+    def reader(self, reader_class, buffer_limit=65536, **kwargs):
+        reader = streaming(reader_class, buffer_limit)(**kwargs)
+        reader.connection_made(self.transport)
+        return reader
+
+    def test_messages(self):
+        reader = self.reader(HttpRequestReader)
+
+        async def consume():
+            result = []
+            async for message in reader.messages():
+                result.append((message.method, message.get_header(b'host').value, await message.read()))
+            return result
+
+        async def main():
+            task = asyncio.ensure_future(consume())
+            reader.data_received(b'GET /a HTTP/1.1\r\nHost: a\r\n\r\n'
+                                 b'POST /b HTTP/1.1\r\nHost: b\r\nTransfer-Encoding: chunked\r\n\r\n3\r\nabc\r\n')
+            await asyncio.sleep(0)
+            reader.data_received(b'2\r\nde\r\n0\r\n\r\nPUT /c HTTP/1.1\r\nHost: c\r\nContent-Length: 1\r\n\r\n')
+            await asyncio.sleep(0)
+            reader.data_received(b'f')
+            reader.connection_lost(None)
+            return await task
+
+        assert asyncio.run(main()) == [('GET', b'a', b''), ('POST', b'b', b'abcde'), ('PUT', b'c', b'f')]
+
+    def test_backpressure(self):
+        reader = self.reader(RtspResponseReader, buffer_limit=8, zero_copy=True)
+        reader.push_request('DESCRIBE')
+
+        async def main():
+            reader.data_received(b'RTSP/1.0 200 OK\r\nCSeq: 1\r\nContent-Length: 12\r\n\r\n1234')
+            reader.data_received(b'5678')
+            assert self.transport.paused
+            messages = reader.messages()
+            message = await messages.__anext__()
+            assert message.status_code == 200
+            body = message.body()
+            # everything buffered is returned at once
+            assert await body.__anext__() == b'12345678'
+            assert not self.transport.paused
+            reader.data_received(b'9abc')
+            assert [data async for data in body] == [b'9abc']
+            assert message.is_complete()
+
+        asyncio.run(main())
+
+    def test_connection_lost(self):
+        reader = self.reader(HttpRequestReader)
+
+        async def main():
+            reader.data_received(b'POST / HTTP/1.1\r\nContent-Length: 5\r\n\r\nab')
+            async for message in reader.messages():
+                body = message.body()
+                assert await body.__anext__() == b'ab'
+                reader.connection_lost(None)
+                with pytest.raises(ConnectionResetError):
+                    await body.__anext__()
+
+        asyncio.run(main())
+
+    def test_parse_error(self):
+        reader = self.reader(HttpRequestReader)
+
+        async def main():
+            reader.data_received(b'POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n2\r\nab\r\n')
+            messages = []
+            async for message in reader.messages():
+                messages.append(message)
+                body = message.body()
+                assert await body.__anext__() == b'ab'
+                reader.data_received(b'x\r\n')
+                with pytest.raises(ParseError):
+                    await body.__anext__()
+            assert len(messages) == 1
+
+        asyncio.run(asyncio.wait_for(main(), 5))
+
+    def test_non_fatal_parse_error(self):
+        reader = self.reader(HttpRequestReader)
+
+        async def main():
+            reader.data_received(b'POST /a HTTP/1.1\r\nbad line\r\nContent-Length: 2\r\n\r\nabGET /b HTTP/1.1\r\n\r\n')
+            reader.connection_lost(None)
+            messages = []
+            async for message in reader.messages():
+                messages.append((message.url, await message.read()))
+            assert messages == [('/a', b'ab'), ('/b', b'')]
+
+        asyncio.run(asyncio.wait_for(main(), 5))
+
+    def test_unread_body_is_discarded(self):
+        reader = self.reader(HttpRequestReader)
+
+        async def main():
+            reader.data_received(b'POST /a HTTP/1.1\r\nContent-Length: 3\r\n\r\na')
+            urls = []
+            async for message in reader.messages():
+                urls.append(message.url)
+                if len(urls) == 1:
+                    reader.data_received(b'bcGET /b HTTP/1.1\r\n\r\n')
+                    reader.connection_lost(None)
+            assert urls == ['/a', '/b']
+            assert reader.get_pending_body_size() == 0
+
+        asyncio.run(main())